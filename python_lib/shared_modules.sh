@@ -0,0 +1,55 @@
+#!/usr/bin/env bash
+set -euo pipefail
+
+# Modules of the wire formats shared by the client, raboshka and the server daemons.
+# python_lib is the source, the copies are committed (like gened_proto) and must stay byte-identical.
+SRC_DIR="python_lib/src/stoilo/low_level"
+COPIES=(
+    "result_codec.py:workers/src/raboshka/result_codec.py"
+    "result_codec.py:server/daemons/result_codec/codec.py"
+    "compression.py:workers/src/raboshka/compression.py"
+    "compression.py:server/daemons/result_codec/compression.py"
+    "pickle_container.py:workers/src/raboshka/pickle_container.py"
+)
+
+
+sync() {
+    echo "Copying shared modules..."
+    for COPY in "${COPIES[@]}"; do
+        echo "  $SRC_DIR/${COPY%%:*} -> ${COPY#*:}"
+        cp "$SRC_DIR/${COPY%%:*}" "${COPY#*:}"
+    done
+    echo "Successfully copied shared modules!"
+}
+
+
+check() {
+    STATUS=0
+    for COPY in "${COPIES[@]}"; do
+        if ! cmp -s "$SRC_DIR/${COPY%%:*}" "${COPY#*:}"; then
+            echo "${COPY#*:} differs from $SRC_DIR/${COPY%%:*}, run make sync-shared-modules"
+            STATUS=1
+        fi
+    done
+    exit $STATUS
+}
+
+
+if [[ ${#@} -eq 0 ]]; then
+    echo "Usage: $0 [--sync|--check]"
+    exit 1
+fi
+
+case "$1" in
+    --sync)
+    sync
+    ;;
+    --check)
+    check
+    ;;
+    *)
+    echo "Unknown option: $1"
+    echo "Usage: $0 [--sync|--check]"
+    exit 1
+    ;;
+esac
@@ -39,11 +39,41 @@ class TaskServiceStub(object):
                 request_serializer=task__service_dot_task__service__pb2.CreateTaskRequest.SerializeToString,
                 response_deserializer=task__service_dot_task__service__pb2.CreateTaskResponse.FromString,
                 _registered_method=True)
+        self.CreateTasks = channel.unary_unary(
+                '/task_service.TaskService/CreateTasks',
+                request_serializer=task__service_dot_task__service__pb2.CreateTasksRequest.SerializeToString,
+                response_deserializer=task__service_dot_task__service__pb2.CreateTasksResponse.FromString,
+                _registered_method=True)
         self.PollTask = channel.unary_unary(
                 '/task_service.TaskService/PollTask',
                 request_serializer=task__service_dot_task__service__pb2.PollTaskRequest.SerializeToString,
                 response_deserializer=task__service_dot_task__service__pb2.PollTaskResponse.FromString,
                 _registered_method=True)
+        self.PollTasks = channel.unary_unary(
+                '/task_service.TaskService/PollTasks',
+                request_serializer=task__service_dot_task__service__pb2.PollTasksRequest.SerializeToString,
+                response_deserializer=task__service_dot_task__service__pb2.PollTasksResponse.FromString,
+                _registered_method=True)
+        self.WatchTasks = channel.unary_stream(
+                '/task_service.TaskService/WatchTasks',
+                request_serializer=task__service_dot_task__service__pb2.WatchTasksRequest.SerializeToString,
+                response_deserializer=task__service_dot_task__service__pb2.PollTaskResponse.FromString,
+                _registered_method=True)
+        self.GetStats = channel.unary_unary(
+                '/task_service.TaskService/GetStats',
+                request_serializer=task__service_dot_task__service__pb2.GetStatsRequest.SerializeToString,
+                response_deserializer=task__service_dot_task__service__pb2.GetStatsResponse.FromString,
+                _registered_method=True)
+        self.UploadBlob = channel.stream_unary(
+                '/task_service.TaskService/UploadBlob',
+                request_serializer=task__service_dot_task__service__pb2.BlobChunk.SerializeToString,
+                response_deserializer=task__service_dot_task__service__pb2.UploadBlobResponse.FromString,
+                _registered_method=True)
+        self.FetchResult = channel.unary_stream(
+                '/task_service.TaskService/FetchResult',
+                request_serializer=task__service_dot_task__service__pb2.FetchResultRequest.SerializeToString,
+                response_deserializer=task__service_dot_task__service__pb2.BlobChunk.FromString,
+                _registered_method=True)
 
 
 class TaskServiceServicer(object):
@@ -55,12 +85,51 @@ class TaskServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def CreateTasks(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def PollTask(self, request, context):
         """Missing associated documentation comment in .proto file."""
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def PollTasks(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def WatchTasks(self, request, context):
+        """Streams a PollTaskResponse for every task as soon as it is finished (or not found), ends when all are sent
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def GetStats(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def UploadBlob(self, request_iterator, context):
+        """Stores a payload sent chunk by chunk, it is then referenced by its digest, e.g. in CreateTaskRequest.call_spec_digest
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def FetchResult(self, request, context):
+        """Streams the returned object of a task FINISHED with SUCCESS chunk by chunk
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_TaskServiceServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -69,11 +138,41 @@ def add_TaskServiceServicer_to_server(servicer, server):
                     request_deserializer=task__service_dot_task__service__pb2.CreateTaskRequest.FromString,
                     response_serializer=task__service_dot_task__service__pb2.CreateTaskResponse.SerializeToString,
             ),
+            'CreateTasks': grpc.unary_unary_rpc_method_handler(
+                    servicer.CreateTasks,
+                    request_deserializer=task__service_dot_task__service__pb2.CreateTasksRequest.FromString,
+                    response_serializer=task__service_dot_task__service__pb2.CreateTasksResponse.SerializeToString,
+            ),
             'PollTask': grpc.unary_unary_rpc_method_handler(
                     servicer.PollTask,
                     request_deserializer=task__service_dot_task__service__pb2.PollTaskRequest.FromString,
                     response_serializer=task__service_dot_task__service__pb2.PollTaskResponse.SerializeToString,
             ),
+            'PollTasks': grpc.unary_unary_rpc_method_handler(
+                    servicer.PollTasks,
+                    request_deserializer=task__service_dot_task__service__pb2.PollTasksRequest.FromString,
+                    response_serializer=task__service_dot_task__service__pb2.PollTasksResponse.SerializeToString,
+            ),
+            'WatchTasks': grpc.unary_stream_rpc_method_handler(
+                    servicer.WatchTasks,
+                    request_deserializer=task__service_dot_task__service__pb2.WatchTasksRequest.FromString,
+                    response_serializer=task__service_dot_task__service__pb2.PollTaskResponse.SerializeToString,
+            ),
+            'GetStats': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetStats,
+                    request_deserializer=task__service_dot_task__service__pb2.GetStatsRequest.FromString,
+                    response_serializer=task__service_dot_task__service__pb2.GetStatsResponse.SerializeToString,
+            ),
+            'UploadBlob': grpc.stream_unary_rpc_method_handler(
+                    servicer.UploadBlob,
+                    request_deserializer=task__service_dot_task__service__pb2.BlobChunk.FromString,
+                    response_serializer=task__service_dot_task__service__pb2.UploadBlobResponse.SerializeToString,
+            ),
+            'FetchResult': grpc.unary_stream_rpc_method_handler(
+                    servicer.FetchResult,
+                    request_deserializer=task__service_dot_task__service__pb2.FetchResultRequest.FromString,
+                    response_serializer=task__service_dot_task__service__pb2.BlobChunk.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'task_service.TaskService', rpc_method_handlers)
@@ -112,6 +211,33 @@ class TaskService(object):
             metadata,
             _registered_method=True)
 
+    @staticmethod
+    def CreateTasks(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/task_service.TaskService/CreateTasks',
+            task__service_dot_task__service__pb2.CreateTasksRequest.SerializeToString,
+            task__service_dot_task__service__pb2.CreateTasksResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
     @staticmethod
     def PollTask(request,
             target,
@@ -138,3 +264,138 @@ class TaskService(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def PollTasks(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/task_service.TaskService/PollTasks',
+            task__service_dot_task__service__pb2.PollTasksRequest.SerializeToString,
+            task__service_dot_task__service__pb2.PollTasksResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def WatchTasks(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/task_service.TaskService/WatchTasks',
+            task__service_dot_task__service__pb2.WatchTasksRequest.SerializeToString,
+            task__service_dot_task__service__pb2.PollTaskResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def GetStats(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/task_service.TaskService/GetStats',
+            task__service_dot_task__service__pb2.GetStatsRequest.SerializeToString,
+            task__service_dot_task__service__pb2.GetStatsResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def UploadBlob(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_unary(
+            request_iterator,
+            target,
+            '/task_service.TaskService/UploadBlob',
+            task__service_dot_task__service__pb2.BlobChunk.SerializeToString,
+            task__service_dot_task__service__pb2.UploadBlobResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def FetchResult(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/task_service.TaskService/FetchResult',
+            task__service_dot_task__service__pb2.FetchResultRequest.SerializeToString,
+            task__service_dot_task__service__pb2.BlobChunk.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
@@ -11,7 +11,8 @@ logger = logging.getLogger(__name__)
 class DPBGDTrainer:
     def __init__(self, conn, model, loss_fn, optimizer_class, optimizer_kwargs,
                  flavor='44814764c91bf9ef426c4aa899df974f',
-                 redundancy_options=None):
+                 redundancy_options=None,
+                 result_format=low_level.result_codec.FORMAT_JSON):
         self._conn = conn
         self._model = model
         self._loss_fn = loss_fn
@@ -27,6 +28,9 @@ class DPBGDTrainer:
                 self._grad_shapes = grad_shapes
             
             def _check_grad_shape(self, grad_list, shape):
+                if hasattr(grad_list, 'shape'):
+                    # numpy array of a binary result
+                    return tuple(grad_list.shape) == shape
                 if not shape:
                     return isinstance(grad_list, float)
                 if not isinstance(grad_list, list) or len(grad_list) != shape[0]:
@@ -54,6 +58,12 @@ class DPBGDTrainer:
 
             def _compare_nested(self, a, b):
                 import math
+                if hasattr(a, 'shape') and hasattr(b, 'shape'):
+                    # numpy arrays of binary results
+                    import numpy
+                    return a.shape == b.shape and bool(numpy.allclose(a, b, rtol=self._rel_tol, atol=self._abs_tol))
+                if isinstance(a, dict):
+                    return a.keys() == b.keys() and all(self._compare_nested(a[key], b[key]) for key in a)
                 if isinstance(a, list):
                     return all(self._compare_nested(x, y) for x, y in zip(a, b))
                 else:
@@ -74,6 +84,9 @@ class DPBGDTrainer:
                 delay_bound=600
             )
         self._redundancy_options = redundancy_options
+        # the default flavor has no msgpack, raboshka would fall back to json anyway;
+        # FORMAT_MSGPACK sends gradients as raw tensor buffers with a flavor re-frozen with msgpack
+        self._result_format = result_format
     
     async def epoch_create_work(self, data_loader):
         def worker_func(kwargs):
@@ -90,8 +103,9 @@ class DPBGDTrainer:
             loss = loss_fn(output, target)
             loss.backward()
 
+            # tensors are sent as raw buffers with the msgpack result format, as nested lists with json
             grads = {
-                name: param.grad.detach().cpu().tolist()
+                name: param.grad.detach().cpu()
                 for name, param in model.named_parameters()
                 if param.grad is not None
             }
@@ -111,11 +125,12 @@ class DPBGDTrainer:
                 compare_valid_func=self._compare_valid_func,
                 flavor=self._flavor,
                 redundancy_options=self._redundancy_options,
+                result_format=self._result_format,
             )
             tasks.append(task)
         print(f"Created {len(tasks)} tasks")
 
-        return await asyncio.gather(*(t.submit() for t in tasks))
+        return await self._conn.submit_many(tasks)
 
     async def epoch_aggregate_results(self, works):
         results = await asyncio.gather(*(t.result() for t in works))
@@ -128,7 +143,7 @@ class DPBGDTrainer:
             if isinstance(result, low_level.UserError) or isinstance(result, low_level.SystemError):
                 raise result
             for name, partial_grad_raw in result['grads'].items():
-                partial_grad = torch.tensor(partial_grad_raw)
+                partial_grad = torch.as_tensor(partial_grad_raw)
                 # print(f"partial_grad mean: {partial_grad.mean()}")
                 p = param_dict[name]
                 if p.grad is None:
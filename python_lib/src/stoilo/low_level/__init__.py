@@ -1,12 +1,16 @@
 from stoilo.low_level.connection import Connection, connect
 from stoilo.low_level.task import StagedTask, SubmittedTask
 from stoilo.low_level.task_result import TaskResult, UserError, SystemError
+from stoilo.low_level.object_ref import ObjectRef
 from . import redundancy
 from . import flavors
+from . import result_codec
+from . import compression
 
 __all__ = [
     "Connection", "connect",
     "StagedTask", "SubmittedTask",
     "TaskResult", "UserError", "SystemError",
-    "redundancy", "flavors",
+    "ObjectRef",
+    "redundancy", "flavors", "result_codec", "compression",
 ]
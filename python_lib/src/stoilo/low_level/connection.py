@@ -1,26 +1,62 @@
 import grpc
-from typing import Any, Dict, List, Optional, Callable
+import zlib
+import asyncio
+import hashlib
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional, Callable, Tuple
 from dataclasses import dataclass, field
 
 from gened_proto.task_service import task_service_pb2, task_service_pb2_grpc
 
 from .task import StagedTask, SubmittedTask
+from .object_ref import ObjectRef, dumps_object
+from .compression import CODECS, compress
+from .fusion import AdaptiveChunker
+from .task_result import TaskResult
+from .watcher import TaskWatcher
+
+logger = logging.getLogger(__name__)
 
 
 @dataclass
 class PollingConfig:
-    """Configuration for the task polling mechanism."""
+    """Configuration for the task polling mechanism, used when the WatchTasks stream is unavailable."""
     max_attempts:  int   = 100    # Maximum number of polling attempts
     initial_delay: float = 15     # Initial delay between polls in seconds
     max_delay:     float = 60     # Maximum delay between polls in seconds
     multiplier:    float = 1.1    # Multiplier for delay after each poll attempt
 
 
+@dataclass
+class SubmitConfig:
+    """Configuration for batched task submission."""
+    batch_size:  int = 1000                # Maximum number of tasks in one CreateTasks request
+    batch_bytes: int = 256 * 1024 * 1024   # Maximum total size of serialized tasks in one CreateTasks request
+
+
+@dataclass
+class StreamingConfig:
+    """Configuration for chunked transfer of large payloads with UploadBlob and FetchResult."""
+    chunk_size:       int = 1024 * 1024        # Size of uploaded chunks
+    upload_threshold: int = 4 * 1024 * 1024    # call_spec larger than this is uploaded chunk by chunk
+
+
+@dataclass
+class FusionConfig:
+    """Configuration for fusing many small tasks into one work unit, see Connection.submit_many(fuse=True)."""
+    target_duration:    float = 300.0   # Desired runtime of a fused work unit in seconds
+    initial_chunk_size: int   = 10      # Tasks per work unit until runtimes of finished tasks are known
+    max_chunk_size:     int   = 1000    # Maximum number of tasks in one work unit
+
+
 @dataclass
 class NetworkConfig:
     """Network configuration for the connection."""
-    timeout: float         = 30.0                                  # RPC timeout in seconds
-    polling: PollingConfig = field(default_factory=PollingConfig)  # Polling configuration
+    timeout:   float           = 30.0                                    # RPC timeout in seconds
+    polling:   PollingConfig   = field(default_factory=PollingConfig)    # Polling configuration
+    submit:    SubmitConfig    = field(default_factory=SubmitConfig)     # Batched submission configuration
+    streaming: StreamingConfig = field(default_factory=StreamingConfig)  # Chunked transfer configuration
+    fusion:    FusionConfig    = field(default_factory=FusionConfig)     # Task fusion configuration
 
 
 class Connection:
@@ -29,6 +65,12 @@ class Connection:
         self.channel = None
         self.stub = None
         self.network_config = network_config or NetworkConfig()
+        self._watcher = TaskWatcher(self)
+        self._uploaded_objects: Dict[str, ObjectRef] = {}
+        fusion_config = self.network_config.fusion
+        self._chunker = AdaptiveChunker(
+            fusion_config.target_duration, fusion_config.initial_chunk_size, fusion_config.max_chunk_size
+        )
 
     async def connect(self) -> None:
         if self.channel is None:
@@ -42,6 +84,7 @@ class Connection:
             self.stub = task_service_pb2_grpc.TaskServiceStub(self.channel)
     
     async def close(self) -> None:
+        await self._watcher.close()
         if self.channel is not None:
             await self.channel.close()
             self.channel = None
@@ -53,18 +96,152 @@ class Connection:
         timeout = self.network_config.timeout
         return await self.stub.CreateTask(request, timeout=timeout)
     
+    async def _create_tasks(self, request: task_service_pb2.CreateTasksRequest) -> task_service_pb2.CreateTasksResponse:
+        """Create many tasks on the server in one request."""
+        await self.connect()
+        timeout = self.network_config.timeout
+        return await self.stub.CreateTasks(request, timeout=timeout)
+    
     async def _poll_task(self, request: task_service_pb2.PollTaskRequest) -> task_service_pb2.PollTaskResponse:
         """Poll for task status and results."""
         await self.connect()
         timeout = self.network_config.timeout
         return await self.stub.PollTask(request, timeout=timeout)
     
+    async def _poll_tasks(self, request: task_service_pb2.PollTasksRequest) -> task_service_pb2.PollTasksResponse:
+        """Poll for statuses and results of many tasks in one request."""
+        await self.connect()
+        timeout = self.network_config.timeout
+        return await self.stub.PollTasks(request, timeout=timeout)
+
+    def _watch_tasks(self, request: task_service_pb2.WatchTasksRequest):
+        """Open a stream of responses for tasks, one for each as soon as it finishes."""
+        return self.stub.WatchTasks(request)
+
+    async def _upload_blob(self, data: bytes) -> str:
+        """Upload the payload chunk by chunk, return its digest on the server."""
+        await self.connect()
+        chunk_size = self.network_config.streaming.chunk_size
+        view = memoryview(data)
+
+        async def chunks():
+            for begin in range(0, len(view), chunk_size):
+                chunk = bytes(view[begin:begin + chunk_size])
+                yield task_service_pb2.BlobChunk(data=chunk, crc32=zlib.crc32(chunk))
+
+        response = await self.stub.UploadBlob(chunks())
+        if response.digest != hashlib.sha256(data).hexdigest() or response.size != len(data):
+            raise RuntimeError("Uploaded payload does not match its digest on the server")
+        return response.digest
+
+    async def _fetch_result(self, task_id: str) -> bytearray:
+        """
+        Download the returned object of a finished task chunk by chunk.
+        It is joined into a bytearray, so that decoded arrays and tensors can share its memory.
+        """
+        await self.connect()
+        chunks = []
+        async for chunk in self.stub.FetchResult(task_service_pb2.FetchResultRequest(task_id=task_id)):
+            if zlib.crc32(chunk.data) != chunk.crc32:
+                raise RuntimeError(f"Checksum mismatch in a result chunk of task {task_id}")
+            chunks.append(chunk.data)
+        return bytearray().join(chunks)
+
+    async def get_stats(self) -> Dict[str, float]:
+        """Service metrics by name, e.g. "work_pipeline.queue_depth"."""
+        await self.connect()
+        timeout = self.network_config.timeout
+        response = await self.stub.GetStats(task_service_pb2.GetStatsRequest(), timeout=timeout)
+        return dict(response.stats)
+
+    async def put(self, obj: Any, compression: Optional[str] = None,
+                  compression_level: Optional[int] = None) -> ObjectRef:
+        """
+        Upload the object once and return a reference to it, to be placed in the kwargs of many tasks.
+        Objects are content-addressed, putting an equal object again costs no upload.
+        compression and compression_level are the codec and its level as in StagedTask.
+        """
+        if compression is not None and compression not in CODECS:
+            raise ValueError(f"compression must be one of {CODECS} or None")
+        data = dumps_object(obj)
+        if compression is not None:
+            data = compress(data, compression, compression_level)
+        digest = hashlib.sha256(data).hexdigest()
+        ref = self._uploaded_objects.get(digest)
+        if ref is None:
+            await self._upload_blob(data)
+            ref = ObjectRef(digest=digest, size=len(data))
+            self._uploaded_objects[digest] = ref
+        return ref
+
     def create_task(self, **kwargs) -> StagedTask:
         return StagedTask(self, **kwargs)
 
+    def create_tasks(self, kwargs_list: List[Dict[str, Any]], **kwargs) -> List[StagedTask]:
+        """Create a task for each element of kwargs_list, all other arguments are shared."""
+        return [StagedTask(self, kwargs=task_kwargs, **kwargs) for task_kwargs in kwargs_list]
+
+    async def submit_many(self, tasks: List[StagedTask], fuse: bool = False) -> List[SubmittedTask]:
+        """
+        Submit many tasks using as few CreateTasks requests as the SubmitConfig allows.
+        With fuse=True, tasks of the same flavor and redundancy are fused into work units that run
+        for about FusionConfig.target_duration, the number of tasks per work unit adapts to the runtimes
+        of finished tasks. Results are still reported per task.
+        """
+        if fuse:
+            return await self._submit_fused_many(tasks)
+        submit_config = self.network_config.submit
+        submitted = []
+        batch, batch_bytes = [], 0
+        for task in tasks:
+            request = await task._to_request()
+            request_bytes = request.ByteSize()
+            if batch and (len(batch) >= submit_config.batch_size
+                          or batch_bytes + request_bytes > submit_config.batch_bytes):
+                submitted.extend(await self._submit_batch(batch))
+                batch, batch_bytes = [], 0
+            batch.append(request)
+            batch_bytes += request_bytes
+        if batch:
+            submitted.extend(await self._submit_batch(batch))
+        return submitted
+
+    async def _submit_fused_many(self, tasks: List[StagedTask]) -> List[SubmittedTask]:
+        requests = [await task._to_request() for task in tasks]
+        groups: Dict[Tuple[str, bytes], List[int]] = {}
+        for index, request in enumerate(requests):
+            key = (request.flavor, request.redundancy_options.SerializeToString())
+            groups.setdefault(key, []).append(index)
+
+        submitted: List[Optional[SubmittedTask]] = [None] * len(requests)
+        for indices in groups.values():
+            chunk_size = min(self._chunker.chunk_size(), self.network_config.submit.batch_size)
+            for begin in range(0, len(indices), chunk_size):
+                chunk = indices[begin:begin + chunk_size]
+                fused = await self._submit_batch([requests[index] for index in chunk], fused=True)
+                for index, task in zip(chunk, fused):
+                    submitted[index] = task
+        return submitted
+
+    async def _submit_batch(self, batch: List[task_service_pb2.CreateTaskRequest],
+                            fused: bool = False) -> List[SubmittedTask]:
+        response = await self._create_tasks(task_service_pb2.CreateTasksRequest(tasks=batch, fused=fused))
+        failed = sum(1 for task in response.tasks if not task.task_id)
+        if failed:
+            logger.warning(f"Failed to create {failed} of {len(batch)} tasks on the server")
+        return [SubmittedTask(self, task_id=task.task_id) for task in response.tasks]
+
     def restore_task(self, task_id: str) -> SubmittedTask:
         return SubmittedTask(self, task_id)
 
+    async def as_completed(self, tasks: List[SubmittedTask]) -> AsyncIterator[Tuple[SubmittedTask, TaskResult]]:
+        """Iterate over (task, result) pairs in the order the tasks finish."""
+        async def with_task(task):
+            return task, await task.result()
+
+        for next_completed in asyncio.as_completed([with_task(task) for task in tasks]):
+            yield await next_completed
+
 
 async def connect(address: str, network_config: Optional[NetworkConfig] = None) -> Connection:
     conn = Connection(address, network_config)
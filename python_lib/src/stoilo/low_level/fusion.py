@@ -0,0 +1,34 @@
+import threading
+
+
+class AdaptiveChunker:
+    """
+    Chooses how many tasks to fuse into one work unit so that the work unit runs for about target_duration
+    seconds. The estimate of a task runtime is an exponential moving average of the runtimes reported
+    by finished fused tasks.
+    """
+    def __init__(self, target_duration: float, initial_chunk_size: int, max_chunk_size: int,
+                 smoothing: float = 0.2):
+        self.target_duration = target_duration
+        self.initial_chunk_size = initial_chunk_size
+        self.max_chunk_size = max_chunk_size
+        self.smoothing = smoothing
+        self._avg_runtime = None
+        self._lock = threading.Lock()
+
+    def observe(self, runtime: float) -> None:
+        """Account a runtime in seconds reported for a finished task."""
+        if runtime <= 0:
+            return
+        with self._lock:
+            if self._avg_runtime is None:
+                self._avg_runtime = runtime
+            else:
+                self._avg_runtime += self.smoothing * (runtime - self._avg_runtime)
+
+    def chunk_size(self) -> int:
+        with self._lock:
+            avg_runtime = self._avg_runtime
+        if avg_runtime is None:
+            return self.initial_chunk_size
+        return max(1, min(self.max_chunk_size, int(self.target_duration / avg_runtime)))
@@ -0,0 +1,57 @@
+from dataclasses import dataclass
+from typing import Any, List, Tuple
+
+import cloudpickle
+
+from .pickle_container import dumps, reduce_tensor
+
+# must be the same as in workers/src/raboshka/main.py
+OBJECT_REF_PID = 'stoilo.ObjectRef'
+
+
+@dataclass(frozen=True)
+class ObjectRef:
+    """
+    Reference to an object uploaded once with Connection.put.
+    It can be placed anywhere in the kwargs of any number of tasks, raboshka replaces it with the object.
+    """
+    digest: str  # sha256 hex digest of the pickled object
+    size:   int  # Size of the pickled object in bytes
+
+
+class _ObjectPickler(cloudpickle.CloudPickler):
+    """Pickles torch tensors as numpy arrays, so that their memory is passed out-of-band like that of arrays."""
+    def reducer_override(self, obj: Any):
+        reduced = reduce_tensor(obj)
+        if reduced is not None:
+            return reduced
+        return super().reducer_override(obj)
+
+
+class _CallSpecPickler(_ObjectPickler):
+    """Pickles every ObjectRef as a persistent id, the index of the ref among the refs of the call_spec."""
+    def __init__(self, file, **kwargs):
+        super().__init__(file, **kwargs)
+        self.refs: List[ObjectRef] = []
+
+    def persistent_id(self, obj: Any):
+        if not isinstance(obj, ObjectRef):
+            return None
+        if obj not in self.refs:
+            self.refs.append(obj)
+        return (OBJECT_REF_PID, self.refs.index(obj))
+
+
+def dumps_call_spec(call_spec: Any) -> Tuple[bytes, List[ObjectRef]]:
+    """
+    Pickle the call_spec into a pickle container (see pickle_container),
+    return it with the referenced objects in the order of their indices.
+    """
+    data, pickler = dumps(call_spec, _CallSpecPickler)
+    return data, pickler.refs
+
+
+def dumps_object(obj: Any) -> bytes:
+    """Pickle an object shared with Connection.put into a pickle container."""
+    data, _ = dumps(obj, _ObjectPickler)
+    return data
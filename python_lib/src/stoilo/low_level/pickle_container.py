@@ -0,0 +1,128 @@
+"""
+Container of a pickle with protocol 5 out-of-band buffers, the format of call_specs and shared objects:
+
+    MAGIC | version (1 byte) | 3 zero bytes | pickle size (uint64 LE) | number of buffers (uint64 LE)
+    | (offset, size) of every buffer (uint64 LE each) | pickle | buffers
+
+Buffers of numpy arrays (and of torch tensors, pickled as numpy arrays) start at offsets aligned to ALIGNMENT,
+so raboshka maps the staged file into memory and unpickles the arrays over the mapping without copying them.
+Small buffers stay in the pickle, where the alignment padding would cost more than the copy.
+
+Loading (in raboshka) maps the file into memory copy-on-write and passes out-of-band buffers to the unpickler
+as views of the mapping, so arrays and tensors are reconstructed over the page cache instead of being copied
+into the heap, their pages are only read from disk when touched and copied only when written.
+Plain pickles (of older clients) are loaded as before. Compressed files (see compression) are decompressed
+into memory first, the buffers are then views of the decompressed payload.
+"""
+import io
+import sys
+import mmap
+import pickle
+import struct
+from typing import Any, Callable, List, Tuple
+
+from . import compression
+
+# python_lib is the source of this module, make sync-shared-modules copies it into raboshka
+MAGIC = b'\x00SPC'  # pickles of protocol 2+ start with the PROTO opcode b'\x80'
+VERSION = 1
+PREAMBLE = struct.Struct('<4sB3xQQ')
+BUFFER_ENTRY = struct.Struct('<QQ')
+ALIGNMENT = 64
+
+OUT_OF_BAND_MIN_BYTES = 64 * 1024
+
+
+def dumps(obj: Any, pickler_factory: Callable[..., pickle.Pickler]) -> Tuple[bytes, pickle.Pickler]:
+    """
+    Pickle obj into the container, pickler_factory(file, protocol, buffer_callback) creates the pickler.
+    Returns the container and the pickler, e.g. to read the object refs it collected.
+    """
+    buffers: List[pickle.PickleBuffer] = []
+
+    def buffer_callback(buffer: pickle.PickleBuffer) -> bool:
+        # a false value means the buffer is passed out-of-band
+        if buffer.raw().nbytes < OUT_OF_BAND_MIN_BYTES:
+            return True
+        buffers.append(buffer)
+        return False
+
+    with io.BytesIO() as f:
+        pickler = pickler_factory(f, protocol=5, buffer_callback=buffer_callback)
+        pickler.dump(obj)
+        data = f.getbuffer()
+
+        offset = PREAMBLE.size + BUFFER_ENTRY.size * len(buffers) + data.nbytes
+        chunks = [None, None, data]
+        entries = []
+        for buffer in buffers:
+            raw = buffer.raw()
+            padding = -offset % ALIGNMENT
+            chunks.append(bytes(padding))
+            offset += padding
+            entries.append(BUFFER_ENTRY.pack(offset, raw.nbytes))
+            chunks.append(raw)
+            offset += raw.nbytes
+        chunks[0] = PREAMBLE.pack(MAGIC, VERSION, data.nbytes, len(buffers))
+        chunks[1] = b''.join(entries)
+        container = b''.join(chunks)
+        # the exported buffer must be released before the BytesIO is closed
+        del chunks, data
+    return container, pickler
+
+
+def reduce_tensor(obj: Any):
+    """
+    Reduction of a torch tensor into a numpy array of its memory, which protocol 5 passes out-of-band.
+    None if the tensor has to be pickled by torch: it is not a dense CPU tensor, requires grad, or its dtype
+    has no numpy equivalent. Parameters are rebuilt from their data with the same requires_grad.
+    """
+    torch = sys.modules.get('torch')
+    if torch is None or not isinstance(obj, torch.Tensor):
+        return None
+    if type(obj) is torch.nn.Parameter:
+        return torch.nn.Parameter, (obj.detach(), obj.requires_grad)
+    if (type(obj) is not torch.Tensor or obj.requires_grad or obj.device.type != 'cpu'
+            or obj.layout != torch.strided or not obj.is_contiguous()):
+        return None
+    try:
+        array = obj.numpy()
+    except (TypeError, RuntimeError):
+        return None
+    return torch.from_numpy, (array,)
+
+
+def load_file(path: str, unpickler_factory: Callable[..., pickle.Unpickler]) -> Any:
+    """Unpickle the file, unpickler_factory(file, buffers) creates the unpickler."""
+    with open(path, "rb") as infile:
+        head = infile.read(len(MAGIC))
+        if head == compression.MAGIC:
+            infile.seek(0)
+            return loads(compression.decompress(infile.read()), unpickler_factory)
+        if head != MAGIC:
+            infile.seek(0)
+            return unpickler_factory(infile, None).load()
+        # the mapping stays valid after the file is closed
+        mapping = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_COPY)
+    return loads(memoryview(mapping), unpickler_factory)
+
+
+def loads(data: Any, unpickler_factory: Callable[..., pickle.Unpickler]) -> Any:
+    """
+    Unpickle a container or a plain pickle, possibly compressed, given as a bytes-like object.
+    Buffers are views of data, or of the decompressed payload.
+    """
+    view = memoryview(compression.decompress(data))
+    if view[:len(MAGIC)] != MAGIC:
+        return unpickler_factory(io.BytesIO(view), None).load()
+    magic, version, pickle_size, n_buffers = PREAMBLE.unpack_from(view)
+    if version != VERSION:
+        raise ValueError(f"Unsupported pickle container version {version}")
+    buffers = []
+    for index in range(n_buffers):
+        offset, size = BUFFER_ENTRY.unpack_from(view, PREAMBLE.size + index * BUFFER_ENTRY.size)
+        if offset + size > len(view):
+            raise ValueError("Buffer is out of the pickle container")
+        buffers.append(view[offset:offset + size])
+    pickle_start = PREAMBLE.size + n_buffers * BUFFER_ENTRY.size
+    return unpickler_factory(io.BytesIO(view[pickle_start:pickle_start + pickle_size]), buffers).load()
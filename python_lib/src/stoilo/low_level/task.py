@@ -1,16 +1,43 @@
 import asyncio
-import cloudpickle
-import json
 import logging
-from typing import Any, Dict, Callable, Optional
+from typing import Any, Dict, Callable, Optional, Union
 
 from gened_proto.task_service import task_service_pb2
 
 import stoilo
 from stoilo.low_level.task_result import TaskResult, UserError, SystemError
+from stoilo.low_level.object_ref import dumps_call_spec
+from stoilo.low_level.result_codec import FORMAT_JSON, FORMATS, decode
+from stoilo.low_level.compression import CODECS, compress, decompress
+from stoilo.low_level.validators import TRIVIAL_INIT_VALIDATOR, TRIVIAL_COMPARE_VALIDATOR, dumps_validator
 
 logger = logging.getLogger(__name__)
 
+# must be the same as in workers/src/raboshka/main.py
+RESULT_FORMAT_KEY = 'result_format'
+RESULT_COMPRESSION_KEY = 'result_compression'
+
+
+def decode_returned(returned: Union[bytes, bytearray]) -> TaskResult:
+    """
+    Decode the returned object of either result format. numpy arrays and torch tensors of binary payloads
+    are not copied: they share the memory of a bytearray payload (see Connection._fetch_result)
+    or of the decompressed payload, tensors of read-only bytes payloads are copied.
+    """
+    return decode(decompress(returned))
+
+
+def decode_result(poll_response: task_service_pb2.PollTaskResponse) -> TaskResult:
+    """Decode the result of a finished task, its returned object must be inline (not fetch_result)."""
+    if poll_response.result_status == task_service_pb2.ResultStatus.SUCCESS:
+        return decode_returned(poll_response.returned)
+    elif poll_response.result_status == task_service_pb2.ResultStatus.USER_ERROR:
+        return UserError(poll_response.error_message)
+    elif poll_response.result_status == task_service_pb2.ResultStatus.SYSTEM_ERROR:
+        return SystemError(poll_response.error_message)
+    raise ValueError(f"Unknown result status: {poll_response.result_status}")
+
+
 class SubmittedTask:
     def __init__(self,
                  connection: 'Connection',
@@ -23,35 +50,11 @@ class SubmittedTask:
         return self._task_id
 
     async def result(self) -> TaskResult:
-        polling_config = self._connection.network_config.polling
-        delay = polling_config.initial_delay
-        attempts = 0
-        request = task_service_pb2.PollTaskRequest(task_id=self._task_id)
-
-        while attempts < polling_config.max_attempts:
-            poll_response = await self._connection._poll_task(request)
-
-            if not poll_response.found:
-                logger.warning(f"Task {self._task_id} not found on the server")
-
-            elif poll_response.task_status == task_service_pb2.TaskStatus.FINISHED:
-                if poll_response.result_status == task_service_pb2.ResultStatus.SUCCESS:
-                    return json.loads(poll_response.returned.decode('utf-8'))
-                elif poll_response.result_status == task_service_pb2.ResultStatus.USER_ERROR:
-                    return UserError(poll_response.error_message)
-                elif poll_response.result_status == task_service_pb2.ResultStatus.SYSTEM_ERROR:
-                    return SystemError(poll_response.error_message)
-                raise ValueError(f"Unknown result status: {poll_response.result_status}")
-            
-            await asyncio.sleep(delay)
-            
-            delay = min(
-                delay * polling_config.multiplier,
-                polling_config.max_delay
-            )
-            attempts += 1
-
-        return SystemError(f"Task polling timed out after {attempts} attempts")
+        if not self._task_id:
+            return SystemError("Task was not created on the server")
+        # all outstanding tasks of the connection are waited for by a single watcher,
+        # shield the shared future from cancellation of this particular waiter
+        return await asyncio.shield(self._connection._watcher.watch(self._task_id))
 
 
 class StagedTask:
@@ -62,43 +65,71 @@ class StagedTask:
                  init_valid_func: Optional[Callable[[Any], bool]] = None,
                  compare_valid_func: Optional[Callable[[Any, Any], bool]] = None,
                  flavor: Optional[str] = None,
-                 redundancy_options: Optional[task_service_pb2.RedundancyOptions] = None):
+                 redundancy_options: Optional[task_service_pb2.RedundancyOptions] = None,
+                 result_format: str = FORMAT_JSON,
+                 compression: Optional[str] = None,
+                 compression_level: Optional[int] = None):
+        """
+        result_format: how the worker serializes the returned object,
+        FORMAT_JSON - JSON text, numpy arrays and torch tensors are converted into nested lists;
+        FORMAT_MSGPACK - binary, numpy arrays and torch tensors are sent as raw buffers and decoded without
+        copies, dict keys keep their types. Workers of flavors without msgpack fall back to FORMAT_JSON.
+        compression: codec of the call_spec and of the returned object, one of compression.CODECS
+        ('zstd' needs zstandard, 'lz4' needs lz4) or None to send them uncompressed, compression_level
+        is the level of the codec (its default if None). Workers of flavors without the codec
+        return the object uncompressed.
+        """
         if kwargs is None:
             kwargs = {}
         if func is None:
             raise ValueError("func must be provided")
-        if init_valid_func is None:
-            init_valid_func = lambda _: True
-        if compare_valid_func is None:
-            compare_valid_func = lambda x, y: x == y
         if flavor is None:
             flavor = stoilo.low_level.flavors.DEFAULT
         if redundancy_options is None:
             redundancy_options = stoilo.low_level.redundancy.CreateOptions()
+        if result_format not in FORMATS:
+            raise ValueError(f"result_format must be one of {FORMATS}")
+        if compression is not None and compression not in CODECS:
+            raise ValueError(f"compression must be one of {CODECS} or None")
 
         self._connection = connection
         self._flavor = flavor
-        self._call_spec = cloudpickle.dumps({
+        self._call_spec, self._object_refs = dumps_call_spec({
             "kwargs": kwargs,
             "func": func,
+            RESULT_FORMAT_KEY: result_format,
+            RESULT_COMPRESSION_KEY: None if compression is None else (compression, compression_level),
         })
-        self._init_valid_func = cloudpickle.dumps(init_valid_func)
-        self._compare_valid_func = cloudpickle.dumps(compare_valid_func)
+        if compression is not None:
+            self._call_spec = compress(self._call_spec, compression, compression_level)
+        self._init_valid_func = dumps_validator(init_valid_func, TRIVIAL_INIT_VALIDATOR)
+        self._compare_valid_func = dumps_validator(compare_valid_func, TRIVIAL_COMPARE_VALIDATOR)
         self._redundancy_options = redundancy_options
+        self._call_spec_digest: Optional[str] = None
 
     @property
     def task_id(self) -> Optional[str]:
         return None
 
-    async def submit(self) -> SubmittedTask:
+    async def _to_request(self) -> task_service_pb2.CreateTaskRequest:
+        """The CreateTask request, call_spec above the upload threshold is uploaded (once) and sent by digest."""
         request = task_service_pb2.CreateTaskRequest(
             flavor=self._flavor,
-            call_spec=self._call_spec,
             init_valid_func=self._init_valid_func,
             compare_valid_func=self._compare_valid_func,
             redundancy_options=self._redundancy_options,
+            object_digests=[ref.digest for ref in self._object_refs],
         )
-        response = await self._connection._create_task(request)
+        if len(self._call_spec) > self._connection.network_config.streaming.upload_threshold:
+            if self._call_spec_digest is None:
+                self._call_spec_digest = await self._connection._upload_blob(self._call_spec)
+            request.call_spec_digest = self._call_spec_digest
+        else:
+            request.call_spec = self._call_spec
+        return request
+
+    async def submit(self) -> SubmittedTask:
+        response = await self._connection._create_task(await self._to_request())
         return SubmittedTask(self._connection, task_id=response.task_id)
 
     async def result(self) -> TaskResult:
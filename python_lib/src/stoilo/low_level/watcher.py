@@ -0,0 +1,155 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional, Set
+
+import grpc
+
+from gened_proto.task_service import task_service_pb2
+
+from stoilo.low_level.task import decode_result, decode_returned
+from stoilo.low_level.task_result import TaskResult, SystemError
+
+logger = logging.getLogger(__name__)
+
+
+def to_task_result(poll_response: task_service_pb2.PollTaskResponse) -> Optional[TaskResult]:
+    """Convert a poll response with an inline result into the task result, None if the task is not finished yet."""
+    if not poll_response.found:
+        return SystemError(f"Task {poll_response.task_id} not found on the server")
+    if poll_response.task_status != task_service_pb2.TaskStatus.FINISHED:
+        return None
+    return decode_result(poll_response)
+
+
+class TaskWatcher:
+    """
+    Waits for all outstanding tasks of a connection over a single WatchTasks stream.
+
+    The stream is reopened with the full set of watched tasks whenever a new task is watched.
+    If the stream fails, the watcher falls back to a PollTasks round and retries the stream
+    with the backoff from PollingConfig. Results too large to be sent inline are fetched with
+    FetchResult in the background, the stream keeps serving the other tasks meanwhile.
+    """
+    def __init__(self, connection: 'Connection'):
+        self._connection = connection
+        self._futures: Dict[str, asyncio.Future] = {}
+        self._fetching: Dict[str, asyncio.Future] = {}
+        self._fetches: Set[asyncio.Task] = set()
+        self._changed = asyncio.Event()
+        self._runner: Optional[asyncio.Task] = None
+
+    def watch(self, task_id: str) -> asyncio.Future:
+        """Return the future that is resolved with the result of the task."""
+        future = self._futures.get(task_id) or self._fetching.get(task_id)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._futures[task_id] = future
+            self._changed.set()
+            if self._runner is None or self._runner.done():
+                self._runner = asyncio.create_task(self._run())
+        return future
+
+    async def close(self) -> None:
+        for fetch in list(self._fetches):
+            fetch.cancel()
+        if self._runner is not None:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+            self._runner = None
+
+    async def _run(self) -> None:
+        polling_config = self._connection.network_config.polling
+        delay = polling_config.initial_delay
+        attempts = 0
+        while self._futures:
+            self._changed.clear()
+            task_ids = list(self._futures)
+            try:
+                await self._watch(task_ids)
+                if self._changed.is_set() or not any(task_id in self._futures for task_id in task_ids):
+                    delay = polling_config.initial_delay
+                    attempts = 0
+                    continue
+                logger.warning("WatchTasks stream ended before all tasks finished, falling back to polling")
+            except grpc.aio.AioRpcError as e:
+                logger.warning(f"WatchTasks stream failed, falling back to polling: {e.code()} {e.details()}")
+
+            try:
+                await self._poll(task_ids)
+            except grpc.aio.AioRpcError as e:
+                logger.warning(f"PollTasks request failed: {e.code()} {e.details()}")
+
+            attempts += 1
+            if attempts >= polling_config.max_attempts:
+                for task_id in list(self._futures):
+                    self._resolve(task_id, SystemError(f"Task polling timed out after {attempts} attempts"))
+                return
+            await asyncio.sleep(delay)
+            delay = min(
+                delay * polling_config.multiplier,
+                polling_config.max_delay
+            )
+
+    async def _watch(self, task_ids: List[str]) -> None:
+        """Consume a WatchTasks stream until it ends or the set of watched tasks changes."""
+        await self._connection.connect()
+        call = self._connection._watch_tasks(task_service_pb2.WatchTasksRequest(task_ids=task_ids))
+        reader = asyncio.create_task(self._read(call))
+        changed = asyncio.create_task(self._changed.wait())
+        try:
+            await asyncio.wait({reader, changed}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            changed.cancel()
+            if not reader.done():
+                call.cancel()
+                reader.cancel()
+                try:
+                    await reader
+                except asyncio.CancelledError:
+                    pass
+        if not reader.cancelled():
+            reader.result()
+
+    async def _read(self, call) -> None:
+        async for poll_response in call:
+            self._complete(poll_response)
+
+    async def _poll(self, task_ids: List[str]) -> None:
+        response = await self._connection._poll_tasks(task_service_pb2.PollTasksRequest(task_ids=task_ids))
+        for poll_response in response.tasks:
+            self._complete(poll_response)
+
+    def _complete(self, poll_response: task_service_pb2.PollTaskResponse) -> None:
+        """Resolve the task if it is finished, fetching its returned object first if it is not inline."""
+        if poll_response.found and poll_response.runtime > 0:
+            self._connection._chunker.observe(poll_response.runtime)
+        if not (poll_response.found and poll_response.fetch_result):
+            self._resolve(poll_response.task_id, to_task_result(poll_response))
+            return
+        future = self._futures.pop(poll_response.task_id, None)
+        if future is None:
+            return
+        self._fetching[poll_response.task_id] = future
+        fetch = asyncio.create_task(self._fetch(poll_response.task_id, future))
+        self._fetches.add(fetch)
+        fetch.add_done_callback(self._fetches.discard)
+
+    async def _fetch(self, task_id: str, future: asyncio.Future) -> None:
+        try:
+            result = decode_returned(await self._connection._fetch_result(task_id))
+        except (grpc.aio.AioRpcError, RuntimeError) as e:
+            result = SystemError(f"Failed to fetch the result of task {task_id}: {e}")
+        finally:
+            self._fetching.pop(task_id, None)
+        if not future.done():
+            future.set_result(result)
+
+    def _resolve(self, task_id: str, result: Optional[TaskResult]) -> None:
+        if result is None:
+            return
+        future = self._futures.pop(task_id, None)
+        if future is not None and not future.done():
+            future.set_result(result)
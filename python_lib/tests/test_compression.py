@@ -0,0 +1,63 @@
+import os
+
+import pytest
+
+from stoilo.low_level.compression import (
+    CODECS, HEADER, MAGIC, available, compress, compress_chunks, decompress, is_compressed,
+)
+
+PAYLOAD = b'stoilo ' * 10000 + os.urandom(1000)
+
+
+@pytest.fixture(params=CODECS)
+def codec(request):
+    if not available(request.param):
+        pytest.skip(f"{request.param} is not installed")
+    return request.param
+
+
+def test_round_trip(codec):
+    frame = compress(PAYLOAD, codec)
+
+    assert is_compressed(frame) and len(frame) < len(PAYLOAD)
+    payload = decompress(frame)
+    assert isinstance(payload, bytearray) and payload == PAYLOAD
+    assert decompress(memoryview(frame)) == PAYLOAD
+
+
+def test_levels_and_empty_payloads(codec):
+    assert decompress(compress(PAYLOAD, codec, level=1)) == PAYLOAD
+    assert decompress(compress(b'', codec)) == b''
+
+
+def test_chunks_are_compressed_as_their_concatenation(codec):
+    chunks = [PAYLOAD[:10], memoryview(PAYLOAD)[10:50000], bytearray(PAYLOAD[50000:])]
+    frame = compress_chunks(chunks, codec)
+    assert decompress(b''.join(frame)) == PAYLOAD
+
+
+def test_payloads_that_are_not_compressed_are_returned_as_they_are():
+    for payload in (PAYLOAD, b'', '{"a": 1}', memoryview(b'\x00STR')):
+        assert not is_compressed(payload)
+        assert decompress(payload) is payload
+
+
+def test_corrupt_frames_are_value_errors(codec):
+    frame = compress(PAYLOAD, codec)
+    with pytest.raises(ValueError):
+        decompress(frame[:len(frame) // 2])
+    corrupt = bytearray(frame)
+    corrupt[HEADER.size:] = bytes(len(frame) - HEADER.size)
+    with pytest.raises(ValueError):
+        decompress(corrupt)
+    frame = bytearray(frame)
+    HEADER.pack_into(frame, 0, MAGIC, HEADER.unpack_from(frame)[1], len(PAYLOAD) + 1)
+    with pytest.raises(ValueError, match=f'holds {len(PAYLOAD)} bytes instead of {len(PAYLOAD) + 1}'):
+        decompress(frame)
+
+
+def test_unknown_codecs():
+    with pytest.raises(ValueError, match='Unknown compression codec: brotli'):
+        compress(PAYLOAD, 'brotli')
+    with pytest.raises(ValueError, match='Unknown compression codec id 9'):
+        decompress(HEADER.pack(MAGIC, 9, 0))
@@ -0,0 +1,32 @@
+import pytest
+
+from stoilo.low_level.fusion import AdaptiveChunker
+
+
+def test_initial_chunk_size_until_a_runtime_is_observed():
+    chunker = AdaptiveChunker(target_duration=60.0, initial_chunk_size=10, max_chunk_size=1000)
+    assert chunker.chunk_size() == 10
+    chunker.observe(0.0)  # tasks of old servers report no runtime
+    assert chunker.chunk_size() == 10
+
+
+def test_chunk_size_fills_the_target_duration():
+    chunker = AdaptiveChunker(target_duration=60.0, initial_chunk_size=10, max_chunk_size=1000)
+    chunker.observe(0.5)
+    assert chunker.chunk_size() == 120
+
+
+def test_runtime_is_an_exponential_moving_average():
+    chunker = AdaptiveChunker(target_duration=100.0, initial_chunk_size=10, max_chunk_size=1000, smoothing=0.5)
+    chunker.observe(1.0)
+    chunker.observe(3.0)  # average 2.0
+    assert chunker.chunk_size() == 50
+    chunker.observe(2.0)
+    assert chunker.chunk_size() == 50
+
+
+@pytest.mark.parametrize('runtime, chunk_size', [(1e-6, 1000), (3600.0, 1)])
+def test_chunk_size_is_bounded(runtime, chunk_size):
+    chunker = AdaptiveChunker(target_duration=60.0, initial_chunk_size=10, max_chunk_size=1000)
+    chunker.observe(runtime)
+    assert chunker.chunk_size() == chunk_size
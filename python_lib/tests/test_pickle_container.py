@@ -0,0 +1,119 @@
+import mmap
+import pickle
+
+import numpy as np
+import pytest
+
+from stoilo.low_level import compression
+from stoilo.low_level.pickle_container import (
+    ALIGNMENT, OUT_OF_BAND_MIN_BYTES, PREAMBLE, BUFFER_ENTRY, dumps, loads, load_file, reduce_tensor,
+)
+
+
+class TensorPickler(pickle.Pickler):
+    def reducer_override(self, obj):
+        reduced = reduce_tensor(obj)
+        return NotImplemented if reduced is None else reduced
+
+
+def unpickler(file, buffers):
+    return pickle.Unpickler(file, buffers=buffers)
+
+
+def buffer_entries(container):
+    _, _, _, n_buffers = PREAMBLE.unpack_from(container)
+    return [BUFFER_ENTRY.unpack_from(container, PREAMBLE.size + index * BUFFER_ENTRY.size)
+            for index in range(n_buffers)]
+
+
+def memory_owner(array):
+    base = array
+    while isinstance(base, np.ndarray):
+        base = base.base
+    return base.obj if isinstance(base, memoryview) else base
+
+
+def large_array(dtype=np.float64):
+    return np.arange(OUT_OF_BAND_MIN_BYTES // np.dtype(dtype).itemsize * 2, dtype=dtype)
+
+
+def test_large_buffers_are_out_of_band_at_aligned_offsets():
+    obj = {'small': np.arange(10), 'weights': large_array(), 'bias': large_array(np.int8), 'name': 'model'}
+    container, _ = dumps(obj, pickle.Pickler)
+
+    entries = buffer_entries(container)
+    assert [size for _, size in entries] == [obj['weights'].nbytes, obj['bias'].nbytes]
+    assert all(offset % ALIGNMENT == 0 for offset, _ in entries)
+
+    loaded = loads(container, unpickler)
+    assert loaded.keys() == obj.keys() and loaded['name'] == 'model'
+    for key in ('small', 'weights', 'bias'):
+        assert loaded[key].dtype == obj[key].dtype and np.array_equal(loaded[key], obj[key])
+    assert np.shares_memory(loaded['weights'], np.frombuffer(container, dtype=np.uint8))
+
+
+def test_files_are_loaded_over_a_copy_on_write_mapping(tmp_path):
+    array = large_array()
+    container, _ = dumps(array, pickle.Pickler)
+    path = tmp_path / 'ref_0'
+    path.write_bytes(container)
+
+    loaded = load_file(str(path), unpickler)
+
+    assert np.array_equal(loaded, array)
+    assert isinstance(memory_owner(loaded), mmap.mmap)
+    assert loaded.ctypes.data % ALIGNMENT == 0
+    loaded[0] = -1.0  # written pages are private copies
+    assert path.read_bytes() == container
+
+
+def test_plain_pickles_are_loaded(tmp_path):
+    obj = {'a': [1, 2, 3], 'array': large_array()}
+    data = pickle.dumps(obj, protocol=4)
+    path = tmp_path / 'plain'
+    path.write_bytes(data)
+
+    for loaded in (loads(data, unpickler), load_file(str(path), unpickler)):
+        assert loaded['a'] == [1, 2, 3] and np.array_equal(loaded['array'], obj['array'])
+
+
+@pytest.mark.parametrize('codec', compression.CODECS)
+def test_compressed_containers_are_loaded(tmp_path, codec):
+    if not compression.available(codec):
+        pytest.skip(f"{codec} is not installed")
+    obj = {'array': large_array(), 'name': 'model'}
+    container, _ = dumps(obj, pickle.Pickler)
+    frame = compression.compress(container, codec)
+    path = tmp_path / 'compressed'
+    path.write_bytes(frame)
+
+    for loaded in (loads(frame, unpickler), load_file(str(path), unpickler)):
+        assert loaded['name'] == 'model' and np.array_equal(loaded['array'], obj['array'])
+
+
+def test_unsupported_versions_are_rejected():
+    container = bytearray(dumps([1], pickle.Pickler)[0])
+    container[4] = 99
+    with pytest.raises(ValueError, match='Unsupported pickle container version 99'):
+        loads(container, unpickler)
+
+
+def test_tensors_are_pickled_as_out_of_band_arrays():
+    torch = pytest.importorskip('torch')
+    tensor = torch.arange(OUT_OF_BAND_MIN_BYTES // 4 * 2, dtype=torch.float32).reshape(2, -1)
+    parameter = torch.nn.Parameter(torch.ones(3))
+    container, _ = dumps({'tensor': tensor, 'parameter': parameter}, TensorPickler)
+
+    assert [size for _, size in buffer_entries(container)] == [tensor.nbytes]
+    loaded = loads(bytearray(container), unpickler)
+    assert type(loaded['tensor']) is torch.Tensor and torch.equal(loaded['tensor'], tensor)
+    assert isinstance(loaded['parameter'], torch.nn.Parameter) and loaded['parameter'].requires_grad
+    assert torch.equal(loaded['parameter'].detach(), parameter.detach())
+
+
+def test_tensors_torch_has_to_pickle_are_not_reduced():
+    torch = pytest.importorskip('torch')
+    assert reduce_tensor(torch.ones(3, requires_grad=True)) is None
+    assert reduce_tensor(torch.ones(3, 3).t()) is None
+    assert reduce_tensor(torch.ones(3, dtype=torch.bfloat16)) is None
+    assert reduce_tensor(np.ones(3)) is None
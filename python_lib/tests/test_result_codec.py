@@ -0,0 +1,83 @@
+import json
+
+import numpy as np
+import pytest
+
+from stoilo.low_level.result_codec import (
+    FORMAT_JSON, FORMAT_MSGPACK, ALIGNMENT, encode, encode_chunks, decode, is_binary,
+)
+
+
+def test_json_keeps_the_order_of_dict_keys():
+    returned = {'b': 1, 'a': [1, 2.5, None, 'x'], 'c': {'z': True, 'y': False}}
+    payload = encode(returned, FORMAT_JSON)
+
+    assert not is_binary(payload)
+    assert list(json.loads(payload)) == ['b', 'a', 'c']
+    decoded = decode(payload)
+    assert decoded == returned and list(decoded) == ['b', 'a', 'c'] and list(decoded['c']) == ['z', 'y']
+    assert decode(payload.decode('utf-8')) == returned
+    assert decode(memoryview(payload)) == returned
+
+
+def test_json_encodes_arrays_and_tensors_as_lists():
+    torch = pytest.importorskip('torch')
+    payload = encode({'array': np.arange(3), 'scalar': np.float32(0.5), 'tensor': torch.ones(2, 2)}, FORMAT_JSON)
+    assert decode(payload) == {'array': [0, 1, 2], 'scalar': 0.5, 'tensor': [[1.0, 1.0], [1.0, 1.0]]}
+
+
+def test_msgpack_round_trips_arrays_and_tensors():
+    torch = pytest.importorskip('torch')
+    returned = {
+        'loss': 0.5,
+        'array': np.arange(12, dtype=np.float32).reshape(3, 4),
+        'strided': np.arange(10)[::2],
+        'tensors': [torch.arange(5, dtype=torch.int16), torch.zeros(0)],
+        'scalar': np.int64(7),
+        'name': 'model',
+    }
+    payload = encode(returned, FORMAT_MSGPACK)
+
+    assert is_binary(payload)
+    decoded = decode(payload)
+    assert list(decoded) == list(returned)
+    assert decoded['loss'] == 0.5 and decoded['name'] == 'model' and decoded['scalar'] == 7
+    assert decoded['array'].dtype == np.float32 and np.array_equal(decoded['array'], returned['array'])
+    assert np.array_equal(decoded['strided'], [0, 2, 4, 6, 8])
+    assert torch.equal(decoded['tensors'][0], returned['tensors'][0])
+    assert decoded['tensors'][1].shape == (0,)
+
+
+def test_buffers_are_aligned_and_not_copied():
+    array = np.arange(100, dtype=np.float64)
+    chunks = encode_chunks({'a': np.arange(3, dtype=np.int8), 'b': array}, FORMAT_MSGPACK)
+    assert any(isinstance(chunk, memoryview) and np.shares_memory(chunk, array) for chunk in chunks)
+
+    payload = bytearray(b''.join(chunks))
+    decoded = decode(payload)
+    address = np.frombuffer(payload, dtype=np.uint8).ctypes.data
+    for value in decoded.values():
+        assert (value.ctypes.data - address) % ALIGNMENT == 0
+        assert np.shares_memory(value, np.frombuffer(payload, dtype=np.uint8))
+
+
+def test_arrays_over_read_only_payloads_are_read_only():
+    torch = pytest.importorskip('torch')
+    payload = encode({'array': np.arange(3), 'tensor': torch.arange(3)}, FORMAT_MSGPACK)
+
+    decoded = decode(payload)
+    assert not decoded['array'].flags.writeable
+    decoded['tensor'][0] = 10  # tensors are copied from read-only payloads
+
+    decoded = decode(bytearray(payload))
+    assert decoded['array'].flags.writeable
+
+
+def test_arrays_of_objects_are_not_encoded():
+    with pytest.raises(TypeError):
+        encode(np.array([{}, []], dtype=object), FORMAT_MSGPACK)
+
+
+def test_unknown_format():
+    with pytest.raises(ValueError, match='Unknown result format'):
+        encode({}, 'pickle')
@@ -0,0 +1,21 @@
+from pathlib import Path
+
+import pytest
+
+REPO_DIR = Path(__file__).resolve().parents[2]
+SRC_DIR = REPO_DIR / 'python_lib' / 'src' / 'stoilo' / 'low_level'
+
+# must be the same as COPIES in shared_modules.sh
+COPIES = [
+    ('result_codec.py', 'workers/src/raboshka/result_codec.py'),
+    ('result_codec.py', 'server/daemons/result_codec/codec.py'),
+    ('compression.py', 'workers/src/raboshka/compression.py'),
+    ('compression.py', 'server/daemons/result_codec/compression.py'),
+    ('pickle_container.py', 'workers/src/raboshka/pickle_container.py'),
+]
+
+
+@pytest.mark.parametrize('source, copy', COPIES)
+def test_copies_are_identical_to_the_source(source, copy):
+    assert (REPO_DIR / copy).read_bytes() == (SRC_DIR / source).read_bytes(), \
+        f"{copy} differs from {source}, run make sync-shared-modules"
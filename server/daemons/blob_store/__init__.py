@@ -0,0 +1,18 @@
+import os
+
+from .base import BlobStore, BlobWriter, BlobNotFoundError, CHUNK_SIZE
+from .local import LocalBlobStore
+
+__all__ = ['BlobStore', 'BlobWriter', 'BlobNotFoundError', 'CHUNK_SIZE', 'LocalBlobStore', 'open_blob_store']
+
+
+def open_blob_store(project_dir: str) -> BlobStore:
+    """
+    Blob store configured by the environment:
+    BLOB_STORE_DIR - root directory, PROJECT_DIR/blob_store by default. It should be on the same file system
+        as the BOINC upload directory, so that result files are hard linked instead of copied
+    BLOB_STORE_COMPRESSION - 'none' (default) or 'zstd', compression of newly stored blobs at rest
+    """
+    root = os.getenv('BLOB_STORE_DIR', os.path.join(project_dir, 'blob_store'))
+    compression = os.getenv('BLOB_STORE_COMPRESSION', 'none')
+    return LocalBlobStore(root, compression)
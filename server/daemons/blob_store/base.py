@@ -0,0 +1,79 @@
+import io
+import hashlib
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Iterator
+
+# Size of chunks blobs are hashed, stored and read in
+CHUNK_SIZE = 1024 * 1024
+
+
+class BlobNotFoundError(KeyError):
+    pass
+
+
+class BlobWriter(ABC):
+    """Incremental writer of a single blob, the blob becomes visible on commit."""
+    size: int
+
+    @abstractmethod
+    def write(self, data: bytes) -> None:
+        pass
+
+    @abstractmethod
+    def commit(self) -> str:
+        """Store the written content and return its digest."""
+
+    @abstractmethod
+    def abort(self) -> None:
+        """Drop the written content, no-op after commit."""
+
+
+class BlobStore(ABC):
+    """
+    Content-addressed blob store: a blob is stored once under the sha256 hex digest of its content.
+    Blobs are immutable, so storing the same content again only refreshes the time it was stored at.
+    """
+    @abstractmethod
+    def put_file(self, path: str) -> str:
+        """Store the content of the file and return its digest. The file may be hard linked, it must not change."""
+
+    @abstractmethod
+    def open_writer(self) -> BlobWriter:
+        """Writer of a blob whose content is not known in advance, e.g. received chunk by chunk."""
+
+    @abstractmethod
+    def exists(self, digest: str) -> bool:
+        pass
+
+    @abstractmethod
+    def delete(self, digest: str, older_than: float = 0.0) -> bool:
+        """
+        Delete the blob unless it was stored, or stored again, in the last older_than seconds.
+        True if it was deleted, False if it is missing or too recent.
+        """
+
+    @abstractmethod
+    def read_chunks(self, digest: str, offset: int = 0, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        """Content of the blob starting at offset, chunk by chunk. Raises BlobNotFoundError."""
+
+    def read(self, digest: str, offset: int = 0) -> bytes:
+        return b''.join(self.read_chunks(digest, offset))
+
+    def put_stream(self, stream: BinaryIO) -> str:
+        """Store everything read from the binary stream and return its digest."""
+        writer = self.open_writer()
+        try:
+            while chunk := stream.read(CHUNK_SIZE):
+                writer.write(chunk)
+            return writer.commit()
+        except BaseException:
+            writer.abort()
+            raise
+
+    def put_bytes(self, data: bytes) -> str:
+        return self.put_stream(io.BytesIO(data))
+
+    @staticmethod
+    def file_digest(path: str) -> str:
+        with open(path, 'rb') as f:
+            return hashlib.file_digest(f, 'sha256').hexdigest()
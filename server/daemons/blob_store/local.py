@@ -0,0 +1,155 @@
+import os
+import time
+import uuid
+import shutil
+import hashlib
+import logging
+import importlib.util
+from typing import Iterator
+
+from .base import BlobStore, BlobWriter, BlobNotFoundError, CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIONS = ('none', 'zstd')
+ZSTD_SUFFIX = '.zst'
+
+
+class LocalBlobStore(BlobStore):
+    """
+    Blob store in a local directory, blob <digest> is the file <root>/<digest[:2]>/<digest>,
+    or <digest>.zst if it is compressed with zstd.
+
+    Uncompressed files are stored by a hard link when possible, so storing a result file costs no copy.
+    Blobs are first written under <root>/tmp and renamed into place, readers never see partial blobs.
+    Both compressed and uncompressed blobs are readable whatever the current compression setting is.
+    Storing an existing blob again refreshes its modification time, the time delete() checks.
+    """
+    def __init__(self, root: str, compression: str = 'none'):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown blob compression '{compression}', expected one of {COMPRESSIONS}")
+        if compression == 'zstd' and importlib.util.find_spec('zstandard') is None:
+            raise ImportError("zstandard is required for the zstd blob compression")
+        self.root = root
+        self.compression = compression
+        self.tmp_dir = os.path.join(root, 'tmp')
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def put_file(self, path: str) -> str:
+        digest = self.file_digest(path)
+        if self._touch(digest):
+            return digest
+        if self.compression == 'none':
+            tmp_path = self._tmp_path()
+            try:
+                os.link(path, tmp_path)
+            except OSError as e:
+                # e.g. the store is on another file system
+                logger.debug(f"Failed to hard link {path} into the blob store, copying: {e}")
+                shutil.copyfile(path, tmp_path)
+            self._commit(tmp_path, digest)
+            return digest
+        with open(path, 'rb') as f:
+            return self.put_stream(f)
+
+    def open_writer(self) -> BlobWriter:
+        return _LocalBlobWriter(self)
+
+    def exists(self, digest: str) -> bool:
+        path = self._path(digest)
+        return os.path.exists(path) or os.path.exists(path + ZSTD_SUFFIX)
+
+    def delete(self, digest: str, older_than: float = 0.0) -> bool:
+        path = self._path(digest)
+        for candidate in (path, path + ZSTD_SUFFIX):
+            try:
+                if time.time() - os.stat(candidate).st_mtime < older_than:
+                    return False
+                os.remove(candidate)
+                return True
+            except FileNotFoundError:
+                continue
+        return False
+
+    def read_chunks(self, digest: str, offset: int = 0, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        path = self._path(digest)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                while chunk := f.read(chunk_size):
+                    yield chunk
+        elif os.path.exists(path + ZSTD_SUFFIX):
+            import zstandard
+            with open(path + ZSTD_SUFFIX, 'rb') as f, zstandard.ZstdDecompressor().stream_reader(f) as reader:
+                while offset > 0:
+                    skipped = reader.read(min(offset, chunk_size))
+                    if not skipped:
+                        return
+                    offset -= len(skipped)
+                while chunk := reader.read(chunk_size):
+                    yield chunk
+        else:
+            raise BlobNotFoundError(digest)
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    def _touch(self, digest: str) -> bool:
+        """Refresh the modification time of the blob, which delete() goes by; False if it is missing."""
+        path = self._path(digest)
+        for candidate in (path, path + ZSTD_SUFFIX):
+            try:
+                os.utime(candidate)
+                return True
+            except FileNotFoundError:
+                continue
+        return False
+
+    def _tmp_path(self) -> str:
+        return os.path.join(self.tmp_dir, uuid.uuid4().hex)
+
+    def _commit(self, tmp_path: str, digest: str) -> None:
+        path = self._path(digest)
+        if self.compression == 'zstd':
+            path += ZSTD_SUFFIX
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+
+
+class _LocalBlobWriter(BlobWriter):
+    def __init__(self, store: LocalBlobStore):
+        self._store = store
+        self._tmp_path = store._tmp_path()
+        self._file = open(self._tmp_path, 'wb')
+        self._sha256 = hashlib.sha256()
+        self._writer = self._file
+        if store.compression == 'zstd':
+            import zstandard
+            self._writer = zstandard.ZstdCompressor().stream_writer(self._file, closefd=False)
+        self.size = 0
+
+    def write(self, data: bytes) -> None:
+        self._sha256.update(data)
+        self._writer.write(data)
+        self.size += len(data)
+
+    def commit(self) -> str:
+        self._close()
+        digest = self._sha256.hexdigest()
+        if self._store._touch(digest):
+            os.remove(self._tmp_path)
+        else:
+            self._store._commit(self._tmp_path, digest)
+        return digest
+
+    def abort(self) -> None:
+        self._close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+    def _close(self) -> None:
+        if self._file.closed:
+            return
+        if self._writer is not self._file:
+            self._writer.close()
+        self._file.close()
@@ -0,0 +1,56 @@
+import os
+import time
+
+import pytest
+
+from blob_store import LocalBlobStore, BlobNotFoundError
+
+
+@pytest.fixture(params=['none', 'zstd'])
+def blob_store(tmp_path, request):
+    return LocalBlobStore(str(tmp_path / 'blob_store'), request.param)
+
+
+def age(blob_store, digest, seconds):
+    path = blob_store._path(digest)
+    if not os.path.exists(path):
+        path += '.zst'
+    stored_at = time.time() - seconds
+    os.utime(path, (stored_at, stored_at))
+
+
+def test_round_trip(blob_store, tmp_path):
+    data = os.urandom(3 * 1024 * 1024 + 5)
+    digest = blob_store.put_bytes(data)
+
+    assert blob_store.exists(digest)
+    assert blob_store.read(digest) == data
+    assert blob_store.read(digest, offset=1024) == data[1024:]
+    path = tmp_path / 'file'
+    path.write_bytes(data)
+    assert blob_store.put_file(str(path)) == digest
+
+
+def test_old_blobs_are_deleted(blob_store):
+    digest = blob_store.put_bytes(b'result')
+    age(blob_store, digest, 60)
+
+    assert blob_store.delete(digest, older_than=30)
+    assert not blob_store.exists(digest)
+    with pytest.raises(BlobNotFoundError):
+        blob_store.read(digest)
+    assert not blob_store.delete(digest)
+
+
+def test_blobs_stored_again_recently_are_kept(blob_store, tmp_path):
+    digest = blob_store.put_bytes(b'result')
+    age(blob_store, digest, 60)
+    blob_store.put_bytes(b'result')
+    assert not blob_store.delete(digest, older_than=30)
+
+    age(blob_store, digest, 60)
+    path = tmp_path / 'file'
+    path.write_bytes(b'result')
+    blob_store.put_file(str(path))
+    assert not blob_store.delete(digest, older_than=30)
+    assert blob_store.read(digest) == b'result'
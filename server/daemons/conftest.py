@@ -0,0 +1,15 @@
+"""
+Unit tests of the daemons, run from this directory (the working directory of the deployed daemons):
+
+    cd server/daemons && python -m pytest
+
+The database singletons of the daemons connect to MySQL as soon as their modules are imported, so these modules
+are registered here without a connection, tests replace the singleton with a fake where they need one.
+"""
+import sys
+import types
+
+for package in ('raboshka_work_generator', 'raboshka_validator', 'raboshka_assimilator'):
+    module = types.ModuleType(f'{package}.database')
+    module.database = None
+    sys.modules[module.__name__] = module
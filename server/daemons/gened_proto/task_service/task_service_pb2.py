@@ -24,27 +24,51 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x1ftask_service/task_service.proto\x12\x0ctask_service\"\xa8\x01\n\x11RedundancyOptions\x12\x12\n\nmin_quorum\x18\x01 \x01(\x05\x12\x17\n\x0ftarget_nresults\x18\x02 \x01(\x05\x12\x19\n\x11max_error_results\x18\x03 \x01(\x05\x12\x19\n\x11max_total_results\x18\x04 \x01(\x05\x12\x1b\n\x13max_success_results\x18\x05 \x01(\x05\x12\x13\n\x0b\x64\x65lay_bound\x18\x06 \x01(\x03\"\xa8\x01\n\x11\x43reateTaskRequest\x12\x0e\n\x06\x66lavor\x18\x01 \x01(\t\x12\x11\n\tcall_spec\x18\x02 \x01(\x0c\x12\x17\n\x0finit_valid_func\x18\x03 \x01(\x0c\x12\x1a\n\x12\x63ompare_valid_func\x18\x04 \x01(\x0c\x12;\n\x12redundancy_options\x18\x05 \x01(\x0b\x32\x1f.task_service.RedundancyOptions\"%\n\x12\x43reateTaskResponse\x12\x0f\n\x07task_id\x18\x01 \x01(\t\"\"\n\x0fPollTaskRequest\x12\x0f\n\x07task_id\x18\x01 \x01(\t\"\xac\x01\n\x10PollTaskResponse\x12\r\n\x05\x66ound\x18\x01 \x01(\x08\x12-\n\x0btask_status\x18\x02 \x01(\x0e\x32\x18.task_service.TaskStatus\x12\x31\n\rresult_status\x18\x03 \x01(\x0e\x32\x1a.task_service.ResultStatus\x12\x10\n\x08returned\x18\x04 \x01(\x0c\x12\x15\n\rerror_message\x18\x05 \x01(\t*4\n\nTaskStatus\x12\x0b\n\x07PENDING\x10\x00\x12\x0b\n\x07RUNNING\x10\x01\x12\x0c\n\x08\x46INISHED\x10\x02*=\n\x0cResultStatus\x12\x0b\n\x07SUCCESS\x10\x00\x12\x0e\n\nUSER_ERROR\x10\x01\x12\x10\n\x0cSYSTEM_ERROR\x10\x02\x32\xa9\x01\n\x0bTaskService\x12O\n\nCreateTask\x12\x1f.task_service.CreateTaskRequest\x1a .task_service.CreateTaskResponse\x12I\n\x08PollTask\x12\x1d.task_service.PollTaskRequest\x1a\x1e.task_service.PollTaskResponseb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x1ftask_service/task_service.proto\x12\x0ctask_service\"\xa8\x01\n\x11RedundancyOptions\x12\x12\n\nmin_quorum\x18\x01 \x01(\x05\x12\x17\n\x0ftarget_nresults\x18\x02 \x01(\x05\x12\x19\n\x11max_error_results\x18\x03 \x01(\x05\x12\x19\n\x11max_total_results\x18\x04 \x01(\x05\x12\x1b\n\x13max_success_results\x18\x05 \x01(\x05\x12\x13\n\x0b\x64\x65lay_bound\x18\x06 \x01(\x03\"\xda\x01\n\x11\x43reateTaskRequest\x12\x0e\n\x06\x66lavor\x18\x01 \x01(\t\x12\x11\n\tcall_spec\x18\x02 \x01(\x0c\x12\x17\n\x0finit_valid_func\x18\x03 \x01(\x0c\x12\x1a\n\x12\x63ompare_valid_func\x18\x04 \x01(\x0c\x12;\n\x12redundancy_options\x18\x05 \x01(\x0b\x32\x1f.task_service.RedundancyOptions\x12\x18\n\x10\x63\x61ll_spec_digest\x18\x06 \x01(\t\x12\x16\n\x0eobject_digests\x18\x07 \x03(\t\"%\n\x12\x43reateTaskResponse\x12\x0f\n\x07task_id\x18\x01 \x01(\t\"S\n\x12\x43reateTasksRequest\x12.\n\x05tasks\x18\x01 \x03(\x0b\x32\x1f.task_service.CreateTaskRequest\x12\r\n\x05\x66used\x18\x02 \x01(\x08\"F\n\x13\x43reateTasksResponse\x12/\n\x05tasks\x18\x01 \x03(\x0b\x32 .task_service.CreateTaskResponse\"\"\n\x0fPollTaskRequest\x12\x0f\n\x07task_id\x18\x01 \x01(\t\"\xe4\x01\n\x10PollTaskResponse\x12\r\n\x05\x66ound\x18\x01 \x01(\x08\x12-\n\x0btask_status\x18\x02 \x01(\x0e\x32\x18.task_service.TaskStatus\x12\x31\n\rresult_status\x18\x03 \x01(\x0e\x32\x1a.task_service.ResultStatus\x12\x10\n\x08returned\x18\x04 \x01(\x0c\x12\x15\n\rerror_message\x18\x05 \x01(\t\x12\x0f\n\x07task_id\x18\x06 \x01(\t\x12\x14\n\x0c\x66\x65tch_result\x18\x07 \x01(\x08\x12\x0f\n\x07runtime\x18\x08 \x01(\x01\"$\n\x10PollTasksRequest\x12\x10\n\x08task_ids\x18\x01 \x03(\t\"B\n\x11PollTasksResponse\x12-\n\x05tasks\x18\x01 \x03(\x0b\x32\x1e.task_service.PollTaskResponse\"%\n\x11WatchTasksRequest\x12\x10\n\x08task_ids\x18\x01 \x03(\t\"\x11\n\x0fGetStatsRequest\"z\n\x10GetStatsResponse\x12\x38\n\x05stats\x18\x01 \x03(\x0b\x32).task_service.GetStatsResponse.StatsEntry\x1a,\n\nStatsEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\x01:\x02\x38\x01\"(\n\tBlobChunk\x12\x0c\n\x04\x64\x61ta\x18\x01 \x01(\x0c\x12\r\n\x05\x63rc32\x18\x02 \x01(\r\"2\n\x12UploadBlobResponse\x12\x0e\n\x06\x64igest\x18\x01 \x01(\t\x12\x0c\n\x04size\x18\x02 \x01(\x04\"%\n\x12\x46\x65tchResultRequest\x12\x0f\n\x07task_id\x18\x01 \x01(\t*4\n\nTaskStatus\x12\x0b\n\x07PENDING\x10\x00\x12\x0b\n\x07RUNNING\x10\x01\x12\x0c\n\x08\x46INISHED\x10\x02*=\n\x0cResultStatus\x12\x0b\n\x07SUCCESS\x10\x00\x12\x0e\n\nUSER_ERROR\x10\x01\x12\x10\n\x0cSYSTEM_ERROR\x10\x02\x32\xfe\x04\n\x0bTaskService\x12O\n\nCreateTask\x12\x1f.task_service.CreateTaskRequest\x1a .task_service.CreateTaskResponse\x12R\n\x0b\x43reateTasks\x12 .task_service.CreateTasksRequest\x1a!.task_service.CreateTasksResponse\x12I\n\x08PollTask\x12\x1d.task_service.PollTaskRequest\x1a\x1e.task_service.PollTaskResponse\x12L\n\tPollTasks\x12\x1e.task_service.PollTasksRequest\x1a\x1f.task_service.PollTasksResponse\x12O\n\nWatchTasks\x12\x1f.task_service.WatchTasksRequest\x1a\x1e.task_service.PollTaskResponse0\x01\x12I\n\x08GetStats\x12\x1d.task_service.GetStatsRequest\x1a\x1e.task_service.GetStatsResponse\x12I\n\nUploadBlob\x12\x17.task_service.BlobChunk\x1a .task_service.UploadBlobResponse(\x01\x12J\n\x0b\x46\x65tchResult\x12 .task_service.FetchResultRequest\x1a\x17.task_service.BlobChunk0\x01\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'task_service.task_service_pb2', _globals)
 if not _descriptor._USE_C_DESCRIPTORS:
   DESCRIPTOR._loaded_options = None
-  _globals['_TASKSTATUS']._serialized_start=641
-  _globals['_TASKSTATUS']._serialized_end=693
-  _globals['_RESULTSTATUS']._serialized_start=695
-  _globals['_RESULTSTATUS']._serialized_end=756
+  _globals['_GETSTATSRESPONSE_STATSENTRY']._loaded_options = None
+  _globals['_GETSTATSRESPONSE_STATSENTRY']._serialized_options = b'8\001'
+  _globals['_TASKSTATUS']._serialized_start=1325
+  _globals['_TASKSTATUS']._serialized_end=1377
+  _globals['_RESULTSTATUS']._serialized_start=1379
+  _globals['_RESULTSTATUS']._serialized_end=1440
   _globals['_REDUNDANCYOPTIONS']._serialized_start=50
   _globals['_REDUNDANCYOPTIONS']._serialized_end=218
   _globals['_CREATETASKREQUEST']._serialized_start=221
-  _globals['_CREATETASKREQUEST']._serialized_end=389
-  _globals['_CREATETASKRESPONSE']._serialized_start=391
-  _globals['_CREATETASKRESPONSE']._serialized_end=428
-  _globals['_POLLTASKREQUEST']._serialized_start=430
-  _globals['_POLLTASKREQUEST']._serialized_end=464
-  _globals['_POLLTASKRESPONSE']._serialized_start=467
-  _globals['_POLLTASKRESPONSE']._serialized_end=639
-  _globals['_TASKSERVICE']._serialized_start=759
-  _globals['_TASKSERVICE']._serialized_end=928
+  _globals['_CREATETASKREQUEST']._serialized_end=439
+  _globals['_CREATETASKRESPONSE']._serialized_start=441
+  _globals['_CREATETASKRESPONSE']._serialized_end=478
+  _globals['_CREATETASKSREQUEST']._serialized_start=480
+  _globals['_CREATETASKSREQUEST']._serialized_end=563
+  _globals['_CREATETASKSRESPONSE']._serialized_start=565
+  _globals['_CREATETASKSRESPONSE']._serialized_end=635
+  _globals['_POLLTASKREQUEST']._serialized_start=637
+  _globals['_POLLTASKREQUEST']._serialized_end=671
+  _globals['_POLLTASKRESPONSE']._serialized_start=674
+  _globals['_POLLTASKRESPONSE']._serialized_end=902
+  _globals['_POLLTASKSREQUEST']._serialized_start=904
+  _globals['_POLLTASKSREQUEST']._serialized_end=940
+  _globals['_POLLTASKSRESPONSE']._serialized_start=942
+  _globals['_POLLTASKSRESPONSE']._serialized_end=1008
+  _globals['_WATCHTASKSREQUEST']._serialized_start=1010
+  _globals['_WATCHTASKSREQUEST']._serialized_end=1047
+  _globals['_GETSTATSREQUEST']._serialized_start=1049
+  _globals['_GETSTATSREQUEST']._serialized_end=1066
+  _globals['_GETSTATSRESPONSE']._serialized_start=1068
+  _globals['_GETSTATSRESPONSE']._serialized_end=1190
+  _globals['_GETSTATSRESPONSE_STATSENTRY']._serialized_start=1146
+  _globals['_GETSTATSRESPONSE_STATSENTRY']._serialized_end=1190
+  _globals['_BLOBCHUNK']._serialized_start=1192
+  _globals['_BLOBCHUNK']._serialized_end=1232
+  _globals['_UPLOADBLOBRESPONSE']._serialized_start=1234
+  _globals['_UPLOADBLOBRESPONSE']._serialized_end=1284
+  _globals['_FETCHRESULTREQUEST']._serialized_start=1286
+  _globals['_FETCHRESULTREQUEST']._serialized_end=1323
+  _globals['_TASKSERVICE']._serialized_start=1443
+  _globals['_TASKSERVICE']._serialized_end=2081
 # @@protoc_insertion_point(module_scope)
@@ -1,4 +1,8 @@
-from .assimilator import main
+import sys
 
 if __name__ == '__main__':
+    if sys.argv[1:2] == ['--daemon']:
+        from .daemon import main
+    else:
+        from .assimilator import main
     main()
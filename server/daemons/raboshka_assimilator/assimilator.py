@@ -1,14 +1,72 @@
+import os
 import sys
 import logging
-import json
 
 from gened_proto.task_service.task_service_pb2 import ResultStatus
+from blob_store import open_blob_store
+from result_codec import decode, decompress
 
 from .database import database
+from .task_events import publish_task_events
 from .cli_parser import parse_args, ErrorArgs
+from .utils import get_env_or_die
 
 logger = logging.getLogger(__name__)
 
+# must be the same as in workers/src/raboshka/main.py
+FUSED_RESULT_MARKER = b'F'
+
+
+def split_fused_result(blob_store, task_ids, results):
+    """
+    Per task rows for set_tasks_finished from the results of a fused work unit: every successful result is
+    stored in the blob store in the same format as the result file of a single task.
+    Serialized results are json text, or bytes of binary payloads (see raboshka execute).
+    """
+    if len(results) != len(task_ids):
+        error_message = f"Fused work unit returned {len(results)} results for {len(task_ids)} tasks"
+        return [(task_id, ResultStatus.SYSTEM_ERROR, None, None, error_message, None) for task_id in task_ids]
+
+    rows = []
+    for task_id, (result_status, payload, runtime) in zip(task_ids, results):
+        if result_status == ResultStatus.SUCCESS:
+            if isinstance(payload, str):
+                payload = payload.encode('utf-8')
+            result = str(ResultStatus.SUCCESS).encode() + payload
+            rows.append((task_id, result_status, blob_store.put_bytes(result), len(result), "", runtime))
+        else:
+            rows.append((task_id, result_status, None, None, payload, runtime))
+    return rows
+
+
+def error_rows(task_ids, error_code):
+    """Rows for set_tasks_finished of the tasks of a work unit that BOINC gave up on."""
+    err_msg = f"BOINC error code: {error_code}, see WU_ERROR_* in html/inc/common_defs.inc"
+    return [(task_id, ResultStatus.SYSTEM_ERROR, None, None, err_msg, None) for task_id in task_ids]
+
+
+def result_rows(blob_store, task_id, group_task_ids, result_file):
+    """
+    Rows for set_tasks_finished from the canonical result file of the work unit named task_id,
+    group_task_ids are the tasks of a fused work unit (empty for a single task).
+    Raises if the result file can not be loaded.
+    """
+    with open(result_file, 'rb') as f:
+        marker = f.read(1)
+        if group_task_ids:
+            if marker != FUSED_RESULT_MARKER:
+                raise ValueError(f"result of a fused work unit starts with {marker!r}")
+            return split_fused_result(blob_store, group_task_ids, decode(decompress(f.read())))
+
+        result_status = int(marker)
+        if result_status == ResultStatus.SUCCESS:
+            # The result file is stored as is (compressed or not), PollTask skips the status byte when reading it,
+            # the client decompresses the returned object
+            result_digest = blob_store.put_file(result_file)
+            result_size = os.path.getsize(result_file)
+            return [(task_id, result_status, result_digest, result_size, "", None)]
+        return [(task_id, result_status, None, None, f.read().decode('utf-8'), None)]
+
 
 def main():
     logging.basicConfig(
@@ -20,35 +78,27 @@ def main():
     logger.debug(f"raboshka_assimilator received args: {sys.argv}")
 
     args = parse_args()
+    blob_store = open_blob_store(get_env_or_die('PROJECT_DIR'))
 
     task_id = database.get_task_id_for_workunit(args.wu_id)
 
     logger.debug(f"task_id: {task_id}")
 
-    if isinstance(args, ErrorArgs):
-        err_msg = f"BOINC error code: {args.error_code}, see WU_ERROR_* in html/inc/common_defs.inc"
+    group_task_ids = database.get_group_task_ids(task_id)
+    if group_task_ids is None:
+        sys.exit(1)
+    task_ids = group_task_ids or [task_id]
 
-        success = database.set_task_finished(task_id, ResultStatus.SYSTEM_ERROR, error_message=err_msg)
-
-        if not success:
-            logger.error(f"Failed to set task {task_id} to FAILED: {err_msg}")
-            sys.exit(1)
+    if isinstance(args, ErrorArgs):
+        rows = error_rows(task_ids, args.error_code)
     else:
         try:
-            with open(args.result_file, 'r') as f:
-                result_status = int(f.read(1))
-                serialized_result = f.read()
+            rows = result_rows(blob_store, task_id, group_task_ids, args.result_file)
         except Exception as e:
             logger.error(f"Failed to load result from file {args.result_file}: {e}")
             sys.exit(1)
 
-        if result_status == ResultStatus.SUCCESS:
-            returned = serialized_result.encode('utf-8')
-            success = database.set_task_finished(task_id, result_status, returned=returned)
-        else:
-            error_message = serialized_result
-            success = database.set_task_finished(task_id, result_status, error_message=error_message)
-
-        if not success:
-            logger.error(f"Failed to set task {task_id} to COMPLETED")
-            sys.exit(1)
+    if not database.set_tasks_finished(rows):
+        logger.error(f"Failed to set tasks {task_ids} to COMPLETED")
+        sys.exit(1)
+    publish_task_events()
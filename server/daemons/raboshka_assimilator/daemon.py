@@ -0,0 +1,154 @@
+import os
+import re
+import time
+import hashlib
+import logging
+import xml.etree.ElementTree as ET
+
+from gened_proto.task_service.task_service_pb2 import ResultStatus
+from blob_store import open_blob_store
+
+from .database import database
+from .assimilator import error_rows, result_rows
+from .task_events import publish_task_events
+from .utils import get_env_or_die
+
+logger = logging.getLogger(__name__)
+
+APP_NAME_PREFIX = 'raboshka_'
+
+# see db/boinc_db_types.h in BOINC
+ASSIMILATE_READY = 1
+ASSIMILATE_DONE = 2
+
+OUTPUT_FILE_NAME_RE = re.compile(r'<file_info>\s*<name>([^<]+)</name>')
+
+# errors of a result that can never be loaded: a corrupt or undecodable output (json, msgpack, compression
+# and unicode errors are all ValueError), anything else (e.g. an OSError of the upload or the blob store)
+# may go away and the work unit is retried
+PERMANENT_ERRORS = (ValueError, TypeError)
+MAX_RETRY_DELAY = 3600.0
+
+
+class AssimilatorDaemon:
+    """
+    Assimilates work units of every raboshka app straight from the BOINC database, replacing script_assimilator,
+    which forks an assimilator process for every work unit.
+
+    Work units ready to be assimilated are taken in batches: work unit names, canonical results and fused
+    groups are resolved with one query each, result payloads are moved into the blob store, then the tasks of
+    the whole batch are finished and the work units marked as assimilated in one transaction.
+    The results are the same as with the per work unit script: a work unit with a canonical result finishes
+    its tasks with that result, a work unit without one (its error_mask is the --error code) with SYSTEM_ERROR.
+    A result that can not be decoded finishes the tasks with SYSTEM_ERROR, a work unit whose result fails
+    to load for another reason (e.g. a missing upload or a blob store error) is left unassimilated and retried
+    with an exponential backoff, as BOINC retried the script.
+    """
+    def __init__(self, project_dir, batch_size, idle_interval):
+        self.blob_store = open_blob_store(project_dir)
+        self.batch_size = batch_size
+        self.idle_interval = idle_interval
+        self.upload_dir, self.fanout = self._upload_config(project_dir)
+        self.assimilated = 0
+        self.busy_seconds = 0.0
+        # work unit id -> (failed attempts, time of the next attempt)
+        self.retries = {}
+
+    def run(self):
+        logger.info(f"Assimilator daemon started, batch size {self.batch_size}")
+        while True:
+            if not self.run_once():
+                time.sleep(self.idle_interval)
+
+    def run_once(self):
+        """Assimilate one batch, return the number of work units assimilated."""
+        start = time.perf_counter()
+        app_ids = database.get_app_ids(APP_NAME_PREFIX)
+        if not app_ids:
+            return 0
+        now = time.time()
+        backing_off = [wu_id for wu_id, (_, retry_at) in self.retries.items() if retry_at > now]
+        workunits = database.get_workunits_to_assimilate(app_ids, ASSIMILATE_READY, self.batch_size, backing_off)
+        if not workunits:
+            return 0
+        canonical_results = database.get_results([wu['canonical_resultid'] for wu in workunits
+                                                  if wu['canonical_resultid']])
+        groups = database.get_groups_task_ids([wu['name'] for wu in workunits])
+        if canonical_results is None or groups is None:
+            return 0
+
+        rows, wu_ids, task_ids, received_times = [], [], [], []
+        for wu in workunits:
+            group_task_ids = groups.get(wu['name'], [])
+            canonical = canonical_results.get(wu['canonical_resultid'])
+            try:
+                if canonical is None:
+                    wu_rows = error_rows(group_task_ids or [wu['name']], wu['error_mask'])
+                else:
+                    wu_rows = result_rows(self.blob_store, wu['name'], group_task_ids, self._output_path(canonical))
+                    if canonical['received_time']:
+                        received_times.append(canonical['received_time'])
+            except PERMANENT_ERRORS as e:
+                logger.error(f"Failed to decode the result of work unit {wu['name']}: {e}")
+                wu_rows = [
+                    (task_id, ResultStatus.SYSTEM_ERROR, None, None, f"Failed to load the result: {e}", None)
+                    for task_id in group_task_ids or [wu['name']]
+                ]
+            except Exception as e:
+                attempts = self.retries.get(wu['id'], (0, 0.0))[0] + 1
+                delay = min(self.idle_interval * 2 ** attempts, MAX_RETRY_DELAY)
+                self.retries[wu['id']] = (attempts, time.time() + delay)
+                logger.error(f"Failed to load the result of work unit {wu['name']} (attempt {attempts}), "
+                             f"retrying in {delay:.0f} s: {e}")
+                continue
+            rows.extend(wu_rows)
+            wu_ids.append(wu['id'])
+            task_ids.extend(row[0] for row in wu_rows)
+
+        if not wu_ids or not database.finish_workunits(rows, wu_ids, ASSIMILATE_DONE):
+            return 0
+        for wu_id in wu_ids:
+            self.retries.pop(wu_id, None)
+        publish_task_events()
+
+        elapsed = time.perf_counter() - start
+        self.assimilated += len(wu_ids)
+        self.busy_seconds += elapsed
+        now = time.time()
+        latency = sum(now - received_time for received_time in received_times) / len(received_times) \
+            if received_times else 0.0
+        logger.info(f"Assimilated {len(wu_ids)} work units ({len(task_ids)} tasks) in {elapsed:.3f} s, "
+                    f"{self.assimilated / self.busy_seconds:.1f} work units/sec overall, "
+                    f"{latency:.1f} s on average since the canonical results were received")
+        return len(wu_ids)
+
+    def _output_path(self, result):
+        """Path of the uploaded output file of the result, see dir_hier_path() in BOINC lib/filesys.cpp"""
+        match = OUTPUT_FILE_NAME_RE.search(result['xml_doc_in'] or '')
+        if match is None:
+            raise ValueError(f"No output file in result {result['id']}")
+        file_name = match.group(1).strip()
+        bucket = int(hashlib.md5(file_name.encode()).hexdigest()[1:8], 16) % self.fanout
+        return os.path.join(self.upload_dir, f'{bucket:x}', file_name)
+
+    @staticmethod
+    def _upload_config(project_dir):
+        """Upload directory and its fanout from the project config.xml"""
+        config = ET.parse(os.path.join(project_dir, 'config.xml')).getroot().find('config')
+        upload_dir = config.findtext('upload_dir') or os.path.join(project_dir, 'upload')
+        fanout = int(config.findtext('uldl_dir_fanout') or 1024)
+        return upload_dir, fanout
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(name)s %(levelname)s: %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S"
+    )
+    daemon = AssimilatorDaemon(
+        get_env_or_die('PROJECT_DIR'),
+        batch_size=int(os.getenv('ASSIMILATOR_BATCH_SIZE', '100')),
+        idle_interval=float(os.getenv('ASSIMILATOR_IDLE_INTERVAL', '5.0')),
+    )
+    daemon.run()
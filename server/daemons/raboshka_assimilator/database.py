@@ -1,6 +1,6 @@
 import mysql.connector
 import logging
-from typing import Optional
+from typing import Dict, List, Optional
 from contextlib import contextmanager
 
 from .utils import get_env_or_die
@@ -78,30 +78,139 @@ class Database:
             logger.error(f"Database error when retrieving task_id for workunit {wu_id}: {e}")
             return None
     
-    def set_task_finished(self, task_id: str,
-                          result_status: task_service_pb2.ResultStatus,
-                          returned: bytes = b'',
-                          error_message: str = "") -> bool:
-        task_status = task_service_pb2.TaskStatus.FINISHED
-        status_name = f"FINISHED, {task_service_pb2.ResultStatus.Name(result_status)}"
+    def get_group_task_ids(self, group_id: str) -> List[str]:
+        """Tasks of the fused group in group_index order, empty if group_id is not a fused group."""
+        try:
+            with self.cursor(commit=False) as cursor:
+                query = "SELECT task_id FROM task_data WHERE group_id = %s ORDER BY group_index"
+                cursor.execute(query, (group_id,))
+                task_ids = [row['task_id'] for row in cursor.fetchall()]
+                logger.info(f"Retrieved {len(task_ids)} tasks of fused group {group_id}")
+                return task_ids
+        except mysql.connector.Error as e:
+            logger.error(f"Database error when retrieving tasks of fused group {group_id}: {e}")
+            return None
+
+    def set_tasks_finished(self, results: list) -> bool:
+        """
+        Finish many tasks in one transaction.
+        results: list of (task_id, result_status, result_digest, result_size, error_message, runtime) tuples
+        """
         try:
             with self.cursor() as cursor:
-                query = """
-                UPDATE task_data
-                SET task_status = %s, result_status = %s, returned = %s, error_message = %s
-                WHERE task_id = %s
-                """
-                cursor.execute(query, (task_status, result_status, returned, error_message, task_id))
-                if cursor.rowcount == 0:
-                    logger.warning(f"No task found with task_id {task_id}")
-                    return False
-                logger.info(f"Set task {task_id} to {status_name}")
+                self._set_tasks_finished(cursor, results)
+                logger.info(f"Set {len(results)} tasks to FINISHED")
                 return True
         except mysql.connector.Error as e:
-            logger.error(f"Database error setting task {task_id} to {status_name}: {e}")
+            logger.error(f"Database error setting {len(results)} tasks to FINISHED: {e}")
             return False
         except Exception as e:
-            logger.error(f"Unexpected error setting task {task_id} to {status_name}: {e}")
+            logger.error(f"Unexpected error setting {len(results)} tasks to FINISHED: {e}")
+            return False
+
+    @staticmethod
+    def _set_tasks_finished(cursor, results):
+        task_status = task_service_pb2.TaskStatus.FINISHED
+        query = """
+        UPDATE task_data
+        SET task_status = %s, result_status = %s, result_digest = %s, result_size = %s, error_message = %s,
+            runtime = %s, finished_at = CURRENT_TIMESTAMP(3)
+        WHERE task_id = %s
+        """
+        cursor.executemany(query, [
+            (task_status, result_status, result_digest, result_size, error_message, runtime, task_id)
+            for task_id, result_status, result_digest, result_size, error_message, runtime in results
+        ])
+        # finished tasks no longer keep their objects staged, see task_object
+        query = "DELETE FROM task_object WHERE task_id = %s"
+        cursor.executemany(query, [(row[0],) for row in results])
+        # task finished events for the work generator, committed together with the tasks
+        query = "INSERT INTO task_event (task_id) VALUES (%s)"
+        cursor.executemany(query, [(row[0],) for row in results])
+
+    def get_app_ids(self, name_prefix: str) -> Optional[List[int]]:
+        """Ids of the BOINC apps whose names start with name_prefix."""
+        try:
+            with self.cursor() as cursor:
+                query = "SELECT id FROM app WHERE name LIKE %s AND deprecated = 0"
+                cursor.execute(query, (name_prefix.replace('_', '\\_') + '%',))
+                return [row['id'] for row in cursor.fetchall()]
+        except mysql.connector.Error as e:
+            logger.error(f"Database error when retrieving apps {name_prefix}*: {e}")
+            return None
+
+    def get_workunits_to_assimilate(self, app_ids: List[int], assimilate_state: int, limit: int,
+                                    exclude_ids: List[int] = ()) -> Optional[List[dict]]:
+        """Work units of the apps in the given assimilate_state except exclude_ids, oldest first."""
+        try:
+            with self.cursor() as cursor:
+                exclude = f"AND id NOT IN ({', '.join(['%s'] * len(exclude_ids))})" if exclude_ids else ""
+                query = f"""
+                SELECT id, name, canonical_resultid, error_mask
+                FROM workunit
+                WHERE assimilate_state = %s AND appid IN ({', '.join(['%s'] * len(app_ids))}) {exclude}
+                ORDER BY id
+                LIMIT %s
+                """
+                cursor.execute(query, (assimilate_state,) + tuple(app_ids) + tuple(exclude_ids) + (limit,))
+                return cursor.fetchall()
+        except mysql.connector.Error as e:
+            logger.error(f"Database error when retrieving work units to assimilate: {e}")
+            return None
+
+    def get_results(self, result_ids: List[int]) -> Optional[Dict[int, dict]]:
+        """Dict result_id -> row with xml_doc_in and received_time."""
+        if not result_ids:
+            return {}
+        try:
+            with self.cursor() as cursor:
+                query = f"""
+                SELECT id, xml_doc_in, received_time
+                FROM result
+                WHERE id IN ({', '.join(['%s'] * len(result_ids))})
+                """
+                cursor.execute(query, tuple(result_ids))
+                return {row['id']: row for row in cursor.fetchall()}
+        except mysql.connector.Error as e:
+            logger.error(f"Database error when retrieving {len(result_ids)} results: {e}")
+            return None
+
+    def get_groups_task_ids(self, group_ids: List[str]) -> Optional[Dict[str, List[str]]]:
+        """Dict group_id -> tasks of the fused group in group_index order, only for the fused groups."""
+        try:
+            with self.cursor() as cursor:
+                query = f"""
+                SELECT group_id, task_id
+                FROM task_data
+                WHERE group_id IN ({', '.join(['%s'] * len(group_ids))})
+                ORDER BY group_id, group_index
+                """
+                cursor.execute(query, tuple(group_ids))
+                groups = {}
+                for row in cursor.fetchall():
+                    groups.setdefault(row['group_id'], []).append(row['task_id'])
+                return groups
+        except mysql.connector.Error as e:
+            logger.error(f"Database error when retrieving tasks of {len(group_ids)} fused groups: {e}")
+            return None
+
+    def finish_workunits(self, results: list, wu_ids: List[int], assimilate_state: int) -> bool:
+        """
+        Finish the tasks of many work units and move the work units to assimilate_state in one transaction.
+        results: as in set_tasks_finished
+        """
+        try:
+            with self.cursor() as cursor:
+                self._set_tasks_finished(cursor, results)
+                query = f"""
+                UPDATE workunit SET assimilate_state = %s, transition_time = UNIX_TIMESTAMP()
+                WHERE id IN ({', '.join(['%s'] * len(wu_ids))})
+                """
+                cursor.execute(query, (assimilate_state,) + tuple(wu_ids))
+                logger.info(f"Set {len(results)} tasks of {len(wu_ids)} work units to FINISHED")
+                return True
+        except mysql.connector.Error as e:
+            logger.error(f"Database error finishing {len(wu_ids)} work units: {e}")
             return False
     
     def __del__(self):
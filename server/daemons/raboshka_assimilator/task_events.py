@@ -0,0 +1,27 @@
+import os
+import socket
+import logging
+
+from .utils import get_env_or_die
+
+logger = logging.getLogger(__name__)
+
+# must be the same as in raboshka_work_generator/task_events.py
+SOCKET_NAME = 'raboshka_task_events.sock'
+WAKEUP = b'1'
+
+
+def publish_task_events() -> None:
+    """
+    Wake the work generator up to consume the task_event rows just committed by set_tasks_finished,
+    so that it drops stale cached data and answers waiting clients right away.
+    Best-effort: the events are in the database anyway and are consumed on its next safety poll,
+    so errors are only logged.
+    """
+    socket_path = os.path.join(get_env_or_die('PROJECT_DIR'), SOCKET_NAME)
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.setblocking(False)
+            sock.sendto(WAKEUP, socket_path)
+    except OSError as e:
+        logger.warning(f"Failed to publish task events: {e}")
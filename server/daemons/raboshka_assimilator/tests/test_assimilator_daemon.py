@@ -0,0 +1,164 @@
+import os
+import json
+import time
+
+import pytest
+
+from gened_proto.task_service.task_service_pb2 import ResultStatus
+from raboshka_assimilator import daemon
+from raboshka_assimilator.daemon import AssimilatorDaemon, ASSIMILATE_DONE
+
+WU_ERROR_NO_CANONICAL_RESULT = 32
+
+
+class FakeDatabase:
+    """Work units and results of the BOINC database in memory, the finished tasks are recorded."""
+    def __init__(self):
+        self.workunits = {}
+        self.results = {}
+        self.groups = {}
+        self.rows = []
+        self.assimilated = []
+
+    def get_app_ids(self, prefix):
+        return [1]
+
+    def get_workunits_to_assimilate(self, app_ids, assimilate_state, limit, exclude_ids=()):
+        return [wu for wu_id, wu in self.workunits.items() if wu_id not in exclude_ids][:limit]
+
+    def get_results(self, result_ids):
+        return {result_id: self.results[result_id] for result_id in result_ids if result_id in self.results}
+
+    def get_groups_task_ids(self, wu_names):
+        return {wu_name: self.groups[wu_name] for wu_name in wu_names if wu_name in self.groups}
+
+    def finish_workunits(self, rows, wu_ids, assimilate_state):
+        assert assimilate_state == ASSIMILATE_DONE
+        self.rows.extend(rows)
+        self.assimilated.extend(wu_ids)
+        for wu_id in wu_ids:
+            del self.workunits[wu_id]
+        return True
+
+
+@pytest.fixture
+def database(monkeypatch):
+    database = FakeDatabase()
+    monkeypatch.setattr(daemon, 'database', database)
+    return database
+
+
+@pytest.fixture
+def published(monkeypatch):
+    published = []
+    monkeypatch.setattr(daemon, 'publish_task_events', lambda: published.append(True))
+    return published
+
+
+@pytest.fixture
+def assimilator_daemon(tmp_path, monkeypatch):
+    monkeypatch.delenv('BLOB_STORE_DIR', raising=False)
+    monkeypatch.delenv('BLOB_STORE_COMPRESSION', raising=False)
+    upload_dir = tmp_path / 'upload'
+    (upload_dir / '0').mkdir(parents=True)
+    (tmp_path / 'config.xml').write_text(
+        f'<boinc><config><upload_dir>{upload_dir}</upload_dir><uldl_dir_fanout>1</uldl_dir_fanout></config></boinc>'
+    )
+    return AssimilatorDaemon(str(tmp_path), batch_size=10, idle_interval=1.0)
+
+
+def add_workunit(database, assimilator_daemon, wu_id, content=None, error_mask=0):
+    """Work unit named task<wu_id> with a canonical result of the given content, None if it has no canonical result"""
+    wu = {'id': wu_id, 'name': f'task{wu_id}', 'canonical_resultid': 0, 'error_mask': error_mask}
+    database.workunits[wu_id] = wu
+    if content is None:
+        return wu, None
+    result_id = wu_id * 10
+    file_name = f"{wu['name']}_{result_id}_r0"
+    result = {
+        'id': result_id, 'received_time': time.time(),
+        'xml_doc_in': f'<file_info>\n    <name>{file_name}</name>\n</file_info>',
+    }
+    wu['canonical_resultid'] = result_id
+    database.results[result_id] = result
+    path = assimilator_daemon._output_path(result)
+    with open(path, 'wb') as f:
+        f.write(content)
+    return wu, path
+
+
+def test_canonical_results_are_moved_to_the_blob_store(database, published, assimilator_daemon):
+    add_workunit(database, assimilator_daemon, 1, b'0{"value": 1}')
+    add_workunit(database, assimilator_daemon, 2, b'1Exception is thrown in user function: boom')
+
+    assert assimilator_daemon.run_once() == 2
+
+    (task_id, status, digest, size, error, _), user_error_row = database.rows
+    assert (task_id, status, error) == ('task1', ResultStatus.SUCCESS, '')
+    assert assimilator_daemon.blob_store.read(digest) == b'0{"value": 1}' and size == 13
+    assert user_error_row == ('task2', ResultStatus.USER_ERROR, None, None,
+                              'Exception is thrown in user function: boom', None)
+    assert database.assimilated == [1, 2]
+    assert published == [True]
+
+
+def test_work_units_without_canonical_result_finish_with_system_error(database, published, assimilator_daemon):
+    add_workunit(database, assimilator_daemon, 1, error_mask=WU_ERROR_NO_CANONICAL_RESULT)
+
+    assimilator_daemon.run_once()
+
+    [(task_id, status, _, _, error, _)] = database.rows
+    assert (task_id, status) == ('task1', ResultStatus.SYSTEM_ERROR)
+    assert f'BOINC error code: {WU_ERROR_NO_CANONICAL_RESULT}' in error
+
+
+def test_fused_results_finish_every_task_of_the_group(database, published, assimilator_daemon):
+    results = [[ResultStatus.SUCCESS, '[1]', 0.5], [ResultStatus.USER_ERROR, 'boom', 0.25]]
+    add_workunit(database, assimilator_daemon, 1, b'F' + json.dumps(results).encode())
+    database.groups['task1'] = ['a', 'b']
+
+    assimilator_daemon.run_once()
+
+    assert [(task_id, status, runtime) for task_id, status, _, _, _, runtime in database.rows] == [
+        ('a', ResultStatus.SUCCESS, 0.5), ('b', ResultStatus.USER_ERROR, 0.25),
+    ]
+
+
+def test_undecodable_results_finish_the_tasks_with_system_error(database, published, assimilator_daemon):
+    add_workunit(database, assimilator_daemon, 1, b'x garbage')
+    add_workunit(database, assimilator_daemon, 2, b'0[1]')
+    database.groups['task2'] = ['a', 'b']  # not a fused result
+
+    assert assimilator_daemon.run_once() == 2
+
+    assert [(task_id, status) for task_id, status, *_ in database.rows] == [
+        ('task1', ResultStatus.SYSTEM_ERROR), ('a', ResultStatus.SYSTEM_ERROR), ('b', ResultStatus.SYSTEM_ERROR),
+    ]
+    assert all(row[4].startswith('Failed to load the result') for row in database.rows)
+    assert assimilator_daemon.retries == {}
+
+
+def test_work_units_failing_transiently_are_retried_with_backoff(database, published, assimilator_daemon):
+    _, path = add_workunit(database, assimilator_daemon, 1, b'0[1]')
+    add_workunit(database, assimilator_daemon, 2, b'0[2]')
+    os.remove(path)  # e.g. the upload directory is not mounted
+
+    assert assimilator_daemon.run_once() == 1
+    assert database.assimilated == [2]
+    attempts, retry_at = assimilator_daemon.retries[1]
+    assert attempts == 1 and retry_at == pytest.approx(time.time() + 2.0, abs=1.0)
+
+    # backing off, the work unit is not even fetched
+    assert assimilator_daemon.run_once() == 0
+
+    assimilator_daemon.retries[1] = (attempts, 0.0)
+    assert assimilator_daemon.run_once() == 0
+    attempts, retry_at = assimilator_daemon.retries[1]
+    assert attempts == 2 and retry_at == pytest.approx(time.time() + 4.0, abs=1.0)
+
+    with open(path, 'wb') as f:
+        f.write(b'0[1]')
+    assimilator_daemon.retries[1] = (attempts, 0.0)
+    assert assimilator_daemon.run_once() == 1
+    assert database.assimilated == [2, 1]
+    assert assimilator_daemon.retries == {}
@@ -0,0 +1,71 @@
+import pytest
+
+from blob_store import LocalBlobStore
+from gened_proto.task_service.task_service_pb2 import ResultStatus
+from result_codec import encode, decode, FORMAT_JSON, FORMAT_MSGPACK
+from result_codec.compression import compress
+from raboshka_assimilator.assimilator import split_fused_result, result_rows
+
+
+@pytest.fixture
+def blob_store(tmp_path):
+    return LocalBlobStore(str(tmp_path / 'blob_store'))
+
+
+def test_successful_results_are_stored_as_single_task_result_files(blob_store):
+    results = [
+        [ResultStatus.SUCCESS, '{"value": 1}', 0.5],
+        [ResultStatus.USER_ERROR, 'Exception is thrown in user function: boom', 0.25],
+        [ResultStatus.SUCCESS, '[1, 2]', 0.75],
+    ]
+
+    rows = split_fused_result(blob_store, ['a', 'b', 'c'], results)
+
+    assert [(task_id, status, error, runtime) for task_id, status, _, _, error, runtime in rows] == [
+        ('a', ResultStatus.SUCCESS, '', 0.5),
+        ('b', ResultStatus.USER_ERROR, 'Exception is thrown in user function: boom', 0.25),
+        ('c', ResultStatus.SUCCESS, '', 0.75),
+    ]
+    _, _, digest, size, _, _ = rows[0]
+    stored = blob_store.read(digest)
+    assert stored == b'0{"value": 1}' and size == len(stored)
+    assert rows[1][2] is None
+    assert decode(blob_store.read(rows[2][2], offset=1)) == [1, 2]
+
+
+def test_binary_payloads_are_stored_as_is(blob_store):
+    payload = encode({'loss': 0.5}, FORMAT_MSGPACK)
+    rows = split_fused_result(blob_store, ['a'], [[ResultStatus.SUCCESS, payload, 1.0]])
+    assert decode(blob_store.read(rows[0][2], offset=1)) == {'loss': 0.5}
+
+
+def test_a_wrong_number_of_results_fails_every_task(blob_store):
+    rows = split_fused_result(blob_store, ['a', 'b'], [[ResultStatus.SUCCESS, '1', 0.1]])
+    assert [(task_id, status) for task_id, status, *_ in rows] == [
+        ('a', ResultStatus.SYSTEM_ERROR), ('b', ResultStatus.SYSTEM_ERROR),
+    ]
+    assert rows[0][4] == "Fused work unit returned 1 results for 2 tasks"
+
+
+@pytest.mark.parametrize('result_format', [FORMAT_JSON, FORMAT_MSGPACK])
+@pytest.mark.parametrize('codec', [None, 'zstd', 'lz4'])
+def test_result_file_of_a_fused_work_unit_is_split(blob_store, tmp_path, result_format, codec):
+    # the fused result file as raboshka writes it: the marker, then the (possibly compressed) list of results
+    results = [[ResultStatus.SUCCESS, '{"a": 1}', 0.5], [ResultStatus.SYSTEM_ERROR, 'lost', 0.0]]
+    if result_format == FORMAT_MSGPACK:
+        results[0][1] = encode({'a': 1}, FORMAT_MSGPACK)
+    payload = encode(results, result_format)
+    result_file = tmp_path / 'result'
+    result_file.write_bytes(b'F' + (payload if codec is None else compress(payload, codec)))
+
+    rows = result_rows(blob_store, 'group', ['a', 'b'], str(result_file))
+
+    assert decode(blob_store.read(rows[0][2], offset=1)) == {'a': 1}
+    assert rows[1][1:] == (ResultStatus.SYSTEM_ERROR, None, None, 'lost', 0.0)
+
+
+def test_result_file_of_a_fused_work_unit_must_be_fused(blob_store, tmp_path):
+    result_file = tmp_path / 'result'
+    result_file.write_bytes(b'0[1, 2]')
+    with pytest.raises(ValueError):
+        result_rows(blob_store, 'group', ['a', 'b'], str(result_file))
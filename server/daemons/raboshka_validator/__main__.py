@@ -1,4 +1,8 @@
-from .validator import main
+import sys
 
 if __name__ == '__main__':
+    if sys.argv[1:2] == ['--daemon']:
+        from .daemon import main
+    else:
+        from .validator import main
     main()
@@ -0,0 +1,92 @@
+"""
+Benchmark of validations per second: a validator process per validation (the script_validator path)
+and validations in the process of the validator daemon, which keeps its database connection, caches
+and sandbox workers warm between them.
+
+Run inside the server container, from the daemons directory, on results whose task has validation functions:
+    python3 -m raboshka_validator.benchmark --result-id 42 --file /path/to/upload/result_file --validations 200
+With --other-result-id and --other-file the results are compared instead, as for replicas of a work unit.
+
+Nothing is written to the database except validation times.
+"""
+import os
+import sys
+import time
+import argparse
+import logging
+import subprocess
+
+from .cli_parser import ExitCode
+from .database import database
+from .validator import initial_verdict, comparative_verdict, save_validation_times, validation_stats, sandbox
+
+logger = logging.getLogger(__name__)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark validations per second")
+    parser.add_argument('--result-id', required=True, help='Id of an existing result')
+    parser.add_argument('--file', required=True, help='Output file of the result')
+    parser.add_argument('--other-result-id', help='Id of another result of the same work unit, to compare them')
+    parser.add_argument('--other-file', help='Output file of the other result')
+    parser.add_argument('--validations', type=int, default=200, help='Number of validations per path')
+    args = parser.parse_args()
+    if (args.other_result_id is None) != (args.other_file is None):
+        parser.error("--other-result-id and --other-file go together")
+    return args
+
+
+def bench_processes(argv, validations):
+    failed = 0
+    start = time.perf_counter()
+    for _ in range(validations):
+        completed = subprocess.run([sys.executable, '-m', 'raboshka_validator'] + argv,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if completed.returncode not in (ExitCode.ACCEPTED, ExitCode.REJECTED):
+            failed += 1
+    return time.perf_counter() - start, failed
+
+
+def bench_in_process(verdict, validations):
+    failed = 0
+    start = time.perf_counter()
+    for _ in range(validations):
+        if verdict() not in (ExitCode.ACCEPTED, ExitCode.REJECTED):
+            failed += 1
+    save_validation_times()
+    return time.perf_counter() - start, failed
+
+
+def main():
+    logging.basicConfig(
+        level=logging.WARNING,
+        format="%(asctime)s %(name)s %(levelname)s: %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S"
+    )
+    args = parse_args()
+    file_path = os.path.abspath(args.file)
+    task_id = database.get_task_id_for_result(args.result_id)
+    if args.other_result_id is None:
+        argv = ['--init', args.result_id, file_path]
+        verdict = lambda: initial_verdict(task_id, args.result_id, file_path)
+    else:
+        other_file_path = os.path.abspath(args.other_file)
+        argv = ['--compare', args.result_id, file_path, args.other_result_id, other_file_path]
+        verdict = lambda: comparative_verdict(task_id, args.result_id, file_path, args.other_result_id, other_file_path)
+
+    try:
+        results = {
+            'process': bench_processes(argv, args.validations),
+            'daemon': bench_in_process(verdict, args.validations),
+        }
+    finally:
+        sandbox.close()
+
+    print(f"{'path':<12}{'validations':>12}{'failed':>8}{'seconds':>10}{'val/sec':>10}")
+    for name, (elapsed, failed) in results.items():
+        print(f"{name:<12}{args.validations:>12}{failed:>8}{elapsed:>10.2f}{args.validations / elapsed:>10.1f}")
+    print(validation_stats())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """
+    Bounded in-memory cache evicting the least recently used entries once there are more than
+    max_entries of them or their total size exceeds max_bytes. Sizes are given by the caller.
+    """
+    def __init__(self, name, max_entries, max_bytes):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (value, size), least recently used first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """The cached value, None if absent."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size):
+        with self._lock:
+            if size > self.max_bytes or self.max_entries <= 0 or key in self._entries:
+                return
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                f'{self.name}.hits': self.hits,
+                f'{self.name}.misses': self.misses,
+                f'{self.name}.hit_rate': self.hits / lookups if lookups else 0.0,
+                f'{self.name}.evictions': self.evictions,
+                f'{self.name}.entries': len(self._entries),
+                f'{self.name}.bytes': self._bytes,
+            }
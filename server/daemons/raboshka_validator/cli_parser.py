@@ -0,0 +1,43 @@
+import sys
+import argparse
+import logging
+from enum import IntEnum, unique
+
+logger = logging.getLogger(__name__)
+
+
+# About exit codes read https://github.com/BOINC/boinc/wiki/Validators-in-scripting-languages
+@unique
+class ExitCode(IntEnum):
+    ACCEPTED = 0            # approved by the validator
+    REJECTED = 1            # rejected by the validator
+    OTHER_ERROR = 2         # any other error, no retries, validation failed
+    TEMP_ERROR = 3          # temporary error, retry later
+    VALID_FUNC_ERROR = 4    # error in the validation function, is considered the user's fault,
+                            # no retries, validation failed
+
+
+def parse_args(argv=None):
+    """Parse the validation arguments, sys.argv[1:] if argv is None."""
+    parser = argparse.ArgumentParser(
+        description="BOINC validator: initial or comparative validation"
+    )
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument(
+        '--init',
+        nargs=2,
+        metavar=('RESULT_ID', 'FILE'),
+        help='Initialize with a result ID and output file'
+    )
+    group.add_argument(
+        '--compare',
+        nargs=4,
+        metavar=('RESULT_ID_1', 'FILE_1', 'RESULT_ID_2', 'FILE_2'),
+        help='Compare two results with their corresponding files'
+    )
+    try:
+        return parser.parse_args(argv)
+    except Exception as e:
+        logger.error(f"Failed to parse arguments: {e}")
+        sys.exit(ExitCode.OTHER_ERROR)
+
@@ -0,0 +1,286 @@
+import os
+import re
+import time
+import hashlib
+import logging
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from .cli_parser import ExitCode
+from .database import database
+from .validator import initial_verdict, comparative_verdict, validation_stats, pop_validation_times, sandbox
+from .utils import get_env_or_die
+
+logger = logging.getLogger(__name__)
+
+APP_NAME_PREFIX = 'raboshka_'
+
+# see db/boinc_db_types.h and html/inc/common_defs.inc in BOINC
+RESULT_SERVER_STATE_OVER = 5
+RESULT_OUTCOME_SUCCESS = 1
+RESULT_OUTCOME_VALIDATE_ERROR = 6
+VALIDATE_STATE_INIT = 0
+VALIDATE_STATE_VALID = 1
+VALIDATE_STATE_INVALID = 2
+VALIDATE_STATE_INCONCLUSIVE = 4
+ASSIMILATE_READY = 1
+WU_ERROR_NO_CANONICAL_RESULT = 32
+WU_ERROR_TOO_MANY_SUCCESS_RESULTS = 64
+
+OUTPUT_FILE_NAME_RE = re.compile(r'<file_info>\s*<name>([^<]+)</name>')
+
+
+class TempError(Exception):
+    """The work unit can not be validated now, it stays flagged with need_validate for the next pass."""
+
+
+@dataclass
+class WorkunitValidation:
+    wu: dict
+    canonical_resultid: int = 0
+    assimilate_state: int = 0
+    target_nresults: int = 0
+    error_mask: int = 0
+    transition: bool = False
+    results: Dict[int, tuple] = field(default_factory=dict)  # result_id -> (validate_state, outcome)
+
+    def __post_init__(self):
+        self.canonical_resultid = self.wu['canonical_resultid']
+        self.assimilate_state = self.wu['assimilate_state']
+        self.target_nresults = self.wu['target_nresults']
+        self.error_mask = self.wu['error_mask']
+
+    def set_result(self, result, validate_state, outcome=RESULT_OUTCOME_SUCCESS):
+        self.results[result['id']] = (validate_state, outcome)
+
+    def fail(self, error_mask):
+        """No canonical result will be found, the transitioner finishes the work unit with an error."""
+        self.error_mask |= error_mask
+        self.transition = True
+
+
+class ValidatorDaemon:
+    """
+    Validates work units of every raboshka app straight from the BOINC database, replacing script_validator,
+    which forks a validator process for every check.
+
+    Work units flagged with need_validate are taken in batches. All successful results of a work unit
+    are validated in one pass, with the same semantics as script_validator (see validator.cpp and
+    validate_util2.cpp in BOINC):
+    - with a canonical result, new results are valid if they match it;
+    - otherwise results passing the initial validation are compared pairwise, the first one matching
+      at least min_quorum results (itself included) becomes canonical, results matching it are valid
+      and the others invalid; with no consensus the results are inconclusive and more are requested.
+    Work units of a batch are validated in parallel by as many threads as there are sandbox workers,
+    verdicts are written as soon as they are reached, those of work units finishing together in one transaction.
+    A VALID_FUNC_ERROR or OTHER_ERROR verdict fails the work unit, TEMP_ERROR (a database error or a result
+    file that can not be read for now) leaves it for the next pass.
+    """
+    def __init__(self, project_dir, batch_size, idle_interval):
+        self.project_dir = project_dir
+        self.batch_size = batch_size
+        self.idle_interval = idle_interval
+        self.upload_dir, self.fanout = self._upload_config()
+        self.validated = 0
+        self.executor = ThreadPoolExecutor(max_workers=sandbox.size)
+
+    def run(self):
+        logger.info(f"Validator daemon started, batch size {self.batch_size}")
+        while True:
+            try:
+                validated = self.run_once()
+            except Exception as e:
+                # e.g. a lost database connection, the work units are still flagged with need_validate
+                logger.exception(f"Validation pass failed: {e}")
+                validated = 0
+            if not validated:
+                time.sleep(self.idle_interval)
+
+    def run_once(self):
+        """
+        Validate one batch, return the number of work units validated. Work units left for the next pass
+        (TempError or an unexpected error) are not counted, so that a database outage or an unreadable upload
+        directory makes the daemon sleep between passes.
+        """
+        app_ids = database.get_app_ids(APP_NAME_PREFIX)
+        if not app_ids:
+            return 0
+        workunits = database.get_workunits_to_validate(app_ids, self.batch_size)
+        if not workunits:
+            return 0
+
+        results_by_wu: Dict[int, List[dict]] = {wu['id']: [] for wu in workunits}
+        for result in database.get_results_to_validate(list(results_by_wu), RESULT_SERVER_STATE_OVER,
+                                                       RESULT_OUTCOME_SUCCESS):
+            results_by_wu[result['workunitid']].append(result)
+
+        # work units are validated in parallel, so that a slow validation function delays only its own one
+        pending = {
+            self.executor.submit(self.validate_workunit, wu, results_by_wu[wu['id']]): wu['name']
+            for wu in workunits
+        }
+        validated = 0
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            validations = []
+            for future in done:
+                wu_name = pending.pop(future)
+                try:
+                    validations.append(future.result())
+                except TempError as e:
+                    logger.warning(f"Work unit {wu_name} is left for the next pass: {e}")
+                except Exception as e:
+                    logger.exception(f"Validation of work unit {wu_name} failed, it is left for the next pass: {e}")
+            if validations:
+                self._save(validations)
+                validated += len(validations)
+
+        previous = self.validated
+        self.validated += validated
+        if self.validated // 100 != previous // 100:
+            logger.info(f"Validator stats after {self.validated} work units: {validation_stats()}")
+        return validated
+
+    @staticmethod
+    def _save(validations):
+        database.save_validation(
+            [
+                (v.canonical_resultid, v.assimilate_state, v.target_nresults, v.error_mask, v.transition, v.wu['id'])
+                for v in validations
+            ],
+            [
+                (validate_state, outcome, result_id)
+                for v in validations for result_id, (validate_state, outcome) in v.results.items()
+            ],
+            pop_validation_times(),
+        )
+
+    def validate_workunit(self, wu, results):
+        validation = WorkunitValidation(wu)
+        if wu['canonical_resultid']:
+            self._check_against_canonical(validation, results)
+        else:
+            self._check_set(validation, results)
+        return validation
+
+    def _check_against_canonical(self, validation, results):
+        wu = validation.wu
+        canonical = next((result for result in results if result['id'] == wu['canonical_resultid']), None)
+        new_results = [result for result in results if result['validate_state'] == VALIDATE_STATE_INIT]
+        if canonical is None:
+            for result in new_results:
+                validation.set_result(result, VALIDATE_STATE_INVALID)
+            return
+        for result in new_results:
+            verdict = self._compare(wu, canonical, result)
+            if verdict == ExitCode.ACCEPTED:
+                validation.set_result(result, VALIDATE_STATE_VALID)
+            else:
+                validation.set_result(result, VALIDATE_STATE_INVALID)
+
+    def _check_set(self, validation, results):
+        wu = validation.wu
+        candidates = [
+            result for result in results
+            if result['validate_state'] in (VALIDATE_STATE_INIT, VALIDATE_STATE_INCONCLUSIVE)
+        ]
+
+        passed = []
+        for result in candidates:
+            verdict = self._check_verdict(wu, initial_verdict(wu['name'], result['id'], self._output_path(result)))
+            if verdict is None:
+                validation.set_result(result, VALIDATE_STATE_INVALID, RESULT_OUTCOME_VALIDATE_ERROR)
+                validation.fail(WU_ERROR_NO_CANONICAL_RESULT)
+                return
+            if verdict == ExitCode.ACCEPTED:
+                passed.append(result)
+            else:
+                # as check_set() of script_validator, a result failing the initial validation is not a success
+                validation.set_result(result, VALIDATE_STATE_INVALID, RESULT_OUTCOME_VALIDATE_ERROR)
+
+        canonical, matching = None, []
+        if len(passed) >= wu['min_quorum']:
+            verdicts = {}
+            for result in passed:
+                matching = [result]
+                for other in passed:
+                    if other is result:
+                        continue
+                    key = frozenset((result['id'], other['id']))
+                    if key not in verdicts:
+                        verdicts[key] = self._compare(wu, result, other)
+                    if verdicts[key] is None:
+                        validation.fail(WU_ERROR_NO_CANONICAL_RESULT)
+                        return
+                    if verdicts[key] == ExitCode.ACCEPTED:
+                        matching.append(other)
+                if len(matching) >= wu['min_quorum']:
+                    canonical = result
+                    break
+
+        if canonical is not None:
+            validation.canonical_resultid = canonical['id']
+            validation.assimilate_state = ASSIMILATE_READY
+            validation.transition = True
+            for result in passed:
+                validation.set_result(result, VALIDATE_STATE_VALID if result in matching else VALIDATE_STATE_INVALID)
+            return
+
+        for result in passed:
+            validation.set_result(result, VALIDATE_STATE_INCONCLUSIVE)
+        n_success = sum(
+            1 for result in results
+            if validation.results.get(result['id'], (None, RESULT_OUTCOME_SUCCESS))[1] == RESULT_OUTCOME_SUCCESS
+        )
+        if n_success > wu['max_success_results']:
+            validation.fail(WU_ERROR_TOO_MANY_SUCCESS_RESULTS)
+        if n_success >= validation.target_nresults:
+            validation.target_nresults = n_success + 1
+            validation.transition = True
+
+    def _compare(self, wu, result_1, result_2):
+        verdict = comparative_verdict(wu['name'], result_1['id'], self._output_path(result_1),
+                                      result_2['id'], self._output_path(result_2))
+        return self._check_verdict(wu, verdict)
+
+    @staticmethod
+    def _check_verdict(wu, verdict) -> Optional[ExitCode]:
+        """ACCEPTED or REJECTED, None if the work unit fails, raises TempError to retry it later."""
+        if verdict == ExitCode.TEMP_ERROR:
+            raise TempError("temporary validation error")
+        if verdict in (ExitCode.ACCEPTED, ExitCode.REJECTED):
+            return verdict
+        logger.error(f"Validation of work unit {wu['name']} failed with {verdict.name}")
+        return None
+
+    def _output_path(self, result):
+        """Path of the uploaded output file of the result, see dir_hier_path() in BOINC lib/filesys.cpp"""
+        match = OUTPUT_FILE_NAME_RE.search(result['xml_doc_in'] or '')
+        if match is None:
+            return os.path.join(self.upload_dir, f"missing_output_of_result_{result['id']}")
+        file_name = match.group(1).strip()
+        bucket = int(hashlib.md5(file_name.encode()).hexdigest()[1:8], 16) % self.fanout
+        return os.path.join(self.upload_dir, f'{bucket:x}', file_name)
+
+    def _upload_config(self):
+        """Upload directory and its fanout from the project config.xml"""
+        config = ET.parse(os.path.join(self.project_dir, 'config.xml')).getroot().find('config')
+        upload_dir = config.findtext('upload_dir') or os.path.join(self.project_dir, 'upload')
+        fanout = int(config.findtext('uldl_dir_fanout') or 1024)
+        return upload_dir, fanout
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(name)s %(levelname)s: %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S"
+    )
+    daemon = ValidatorDaemon(
+        get_env_or_die('PROJECT_DIR'),
+        batch_size=int(os.getenv('VALIDATOR_BATCH_SIZE', '100')),
+        idle_interval=float(os.getenv('VALIDATOR_IDLE_INTERVAL', '5.0')),
+    )
+    daemon.run()
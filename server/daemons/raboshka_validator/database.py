@@ -1,7 +1,7 @@
 import mysql.connector
 import logging
-import cloudpickle
-from typing import Callable
+import threading
+from typing import List
 from contextlib import contextmanager
 
 from .utils import get_env_or_die
@@ -11,6 +11,8 @@ logger = logging.getLogger(__name__)
 class Database:
     def __init__(self):
         self._connection = None
+        # the connection is shared by the threads of the validator daemon
+        self._lock = threading.RLock()
     
     def _get_connection(self) -> mysql.connector.connection.MySQLConnection:
         if not self._connection or not self._connection.is_connected():
@@ -32,22 +34,23 @@ class Database:
     
     @contextmanager
     def cursor(self, commit=True, dictionary=True):
-        connection = self._get_connection()
-        cursor = None
-        try:
-            cursor = connection.cursor(dictionary=dictionary)
-            yield cursor
-            if commit:
-                connection.commit()
-                logger.debug("Changes committed")
-        except mysql.connector.Error as e:
-            logger.error(f"Database operation error: {e}")
-            connection.rollback()
-            logger.debug("Changes rolled back")
-            raise
-        finally:
-            if cursor:
-                cursor.close()
+        with self._lock:
+            connection = self._get_connection()
+            cursor = None
+            try:
+                cursor = connection.cursor(dictionary=dictionary)
+                yield cursor
+                if commit:
+                    connection.commit()
+                    logger.debug("Changes committed")
+            except mysql.connector.Error as e:
+                logger.error(f"Database operation error: {e}")
+                connection.rollback()
+                logger.debug("Changes rolled back")
+                raise
+            finally:
+                if cursor:
+                    cursor.close()
     
     def close(self):
         if self._connection and self._connection.is_connected():
@@ -84,6 +87,19 @@ class Database:
             logger.error(f"Database error when retrieving task_id for result {result_id}: {e}")
             raise
     
+    def get_group_task_ids(self, group_id: str) -> List[str]:
+        """Tasks of the fused group in group_index order."""
+        try:
+            with self.cursor(commit=False, dictionary=False) as cursor:
+                query = "SELECT task_id FROM task_data WHERE group_id = %s ORDER BY group_index"
+                cursor.execute(query, (group_id,))
+                task_ids = [row[0] for row in cursor.fetchall()]
+                logger.info(f"Retrieved {len(task_ids)} tasks of fused group {group_id}")
+                return task_ids
+        except mysql.connector.Error as e:
+            logger.error(f"Database error when retrieving tasks of fused group {group_id}: {e}")
+            raise
+    
     def get_validation_func(self, task_id: str, mode: str) -> bytes:
         try:
             with self.cursor(dictionary=False) as cursor:
@@ -94,10 +110,10 @@ class Database:
                 else:
                     raise ValueError(f"Invalid validation mode: {mode}")
                 
-                query = f"SELECT {column} FROM task_data WHERE task_id = %s"
+                query = f"SELECT {column} FROM task_blob WHERE task_id = %s"
                 cursor.execute(query, (task_id,))
                 result = cursor.fetchone()
-                if not result or not result[0]:
+                if not result or result[0] is None:
                     logger.warning(f"No validation function found for task_id {task_id} and mode {mode}")
                     raise ValueError(f"No validation function found for task_id {task_id} and mode {mode}")
 
@@ -107,6 +123,96 @@ class Database:
             logger.error(f"Database error when retrieving validation function for task {task_id}: {e}")
             raise
     
+    def get_app_ids(self, name_prefix: str) -> List[int]:
+        """Ids of the BOINC apps whose names start with name_prefix."""
+        try:
+            with self.cursor(commit=False, dictionary=False) as cursor:
+                query = "SELECT id FROM app WHERE name LIKE %s AND deprecated = 0"
+                cursor.execute(query, (name_prefix.replace('_', '\\_') + '%',))
+                return [row[0] for row in cursor.fetchall()]
+        except mysql.connector.Error as e:
+            logger.error(f"Database error when retrieving apps {name_prefix}*: {e}")
+            raise
+
+    def get_workunits_to_validate(self, app_ids: List[int], limit: int) -> List[dict]:
+        """Work units of the apps flagged with need_validate by the transitioner, oldest first."""
+        try:
+            with self.cursor() as cursor:
+                query = f"""
+                SELECT id, name, canonical_resultid, assimilate_state, min_quorum, target_nresults, max_success_results,
+                       error_mask
+                FROM workunit
+                WHERE need_validate > 0 AND appid IN ({', '.join(['%s'] * len(app_ids))})
+                ORDER BY id
+                LIMIT %s
+                """
+                cursor.execute(query, tuple(app_ids) + (limit,))
+                return cursor.fetchall()
+        except mysql.connector.Error as e:
+            logger.error(f"Database error when retrieving work units to validate: {e}")
+            raise
+
+    def get_results_to_validate(self, wu_ids: List[int], server_state: int, outcome: int) -> List[dict]:
+        """Results of the work units that are over with the given outcome."""
+        try:
+            with self.cursor() as cursor:
+                query = f"""
+                SELECT id, workunitid, validate_state, xml_doc_in
+                FROM result
+                WHERE workunitid IN ({', '.join(['%s'] * len(wu_ids))}) AND server_state = %s AND outcome = %s
+                ORDER BY id
+                """
+                cursor.execute(query, tuple(wu_ids) + (server_state, outcome))
+                return cursor.fetchall()
+        except mysql.connector.Error as e:
+            logger.error(f"Database error when retrieving results of {len(wu_ids)} work units: {e}")
+            raise
+
+    def save_validation(self, workunits: list, results: list, validation_times: list) -> None:
+        """
+        Write the outcome of validating a batch of work units in one transaction.
+        workunits: list of (canonical_resultid, assimilate_state, target_nresults, error_mask, transition, wu_id),
+        with transition set the transitioner is triggered for the work unit
+        results: list of (validate_state, outcome, result_id)
+        validation_times: list of (seconds, task_id) to add to task_data.validation_time
+        """
+        try:
+            with self.cursor() as cursor:
+                query = """
+                UPDATE result SET validate_state = %s, outcome = %s
+                WHERE id = %s
+                """
+                cursor.executemany(query, results)
+                query = """
+                UPDATE workunit
+                SET need_validate = 0, canonical_resultid = %s, assimilate_state = %s, target_nresults = %s,
+                    error_mask = %s, transition_time = IF(%s, UNIX_TIMESTAMP(), transition_time)
+                WHERE id = %s
+                """
+                cursor.executemany(query, workunits)
+                self._add_validation_times(cursor, validation_times)
+                logger.info(f"Saved validation of {len(workunits)} work units and {len(results)} results")
+        except mysql.connector.Error as e:
+            logger.error(f"Database error when saving validation of {len(workunits)} work units: {e}")
+            raise
+    
+    def add_validation_times(self, validation_times: list) -> None:
+        """validation_times: list of (seconds, task_id) to add to task_data.validation_time"""
+        try:
+            with self.cursor() as cursor:
+                self._add_validation_times(cursor, validation_times)
+        except mysql.connector.Error as e:
+            logger.error(f"Database error when saving validation times of {len(validation_times)} tasks: {e}")
+            raise
+
+    @staticmethod
+    def _add_validation_times(cursor, validation_times):
+        query = """
+        UPDATE task_data SET validation_time = COALESCE(validation_time, 0) + %s
+        WHERE task_id = %s
+        """
+        cursor.executemany(query, validation_times)
+    
     def __del__(self):
         self.close()
 
@@ -0,0 +1,156 @@
+import logging
+import resource
+import threading
+import multiprocessing
+from collections import OrderedDict
+
+import cloudpickle
+
+logger = logging.getLogger(__name__)
+
+# Unpickled validation functions kept by every worker process
+WORKER_FUNC_CACHE_SIZE = 256
+
+
+class ValidFuncError(Exception):
+    """The validation function failed, timed out or exceeded its memory limit."""
+
+
+def _worker_main(conn, memory_limit):
+    """
+    Loop of a sandbox worker process: receive (key, blob, args), call the unpickled validation function
+    and send back ('ok', returned) or ('error', message). The address space is limited to memory_limit bytes.
+    blob is None for a function the parent expects to be cached, ('missing', None) is sent back if it is not.
+    """
+    if memory_limit:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    funcs = OrderedDict()
+    while True:
+        try:
+            key, blob, args = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        try:
+            func = funcs.get(key)
+            if func is None and blob is None:
+                conn.send(('missing', None))
+                continue
+            if func is None:
+                func = cloudpickle.loads(blob)
+                funcs[key] = func
+                if len(funcs) > WORKER_FUNC_CACHE_SIZE:
+                    funcs.popitem(last=False)
+            else:
+                funcs.move_to_end(key)
+            response = ('ok', func(*args))
+        except MemoryError:
+            funcs.clear()
+            response = ('error', f"memory limit of {memory_limit} bytes exceeded")
+        except BaseException as e:
+            response = ('error', f"{type(e).__name__}: {e}")
+        try:
+            conn.send(response)
+        except Exception as e:
+            conn.send(('error', f"Failed to send the returned value: {e}"))
+
+
+class _Worker:
+    """
+    A worker process and the keys of the functions it has unpickled, tracked with the same bound as its cache,
+    so that a blob is sent only to workers which have not loaded it yet.
+    """
+    def __init__(self, context, memory_limit):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, memory_limit), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.loaded = OrderedDict()
+
+    def call(self, key, blob, args, timeout):
+        if key in self.loaded:
+            self.loaded.move_to_end(key)
+            response = self._exchange((key, None, args), timeout)
+            if response[0] != 'missing':
+                return response
+            # evicted by the worker, e.g. when it ran out of memory
+            del self.loaded[key]
+        response = self._exchange((key, blob, args), timeout)
+        self.loaded[key] = None
+        if len(self.loaded) > WORKER_FUNC_CACHE_SIZE:
+            self.loaded.popitem(last=False)
+        return response
+
+    def _exchange(self, request, timeout):
+        self.conn.send(request)
+        if not self.conn.poll(timeout):
+            raise TimeoutError
+        return self.conn.recv()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class SandboxPool:
+    """
+    Runs user validation functions in separate worker processes, so that a slow or memory hungry function
+    can not block or crash the validator: every call is limited to timeout seconds of wall-clock time and
+    the workers to memory_limit bytes of address space. A worker is killed and replaced on timeout or crash.
+    Up to `size` workers are started on first use, serving that many calls in parallel.
+    """
+    def __init__(self, size, timeout, memory_limit):
+        self.size = size
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        # spawn: the validator daemon is multi-threaded, forking it is not safe
+        self._context = multiprocessing.get_context('spawn')
+        self._idle = []
+        self._slots = threading.Semaphore(size)
+        self._lock = threading.Lock()
+
+    def call(self, key, blob, args):
+        """
+        Call the validation function unpickled from blob (cached by key in the worker) with args.
+        Raises ValidFuncError if the function raises, times out or the worker dies.
+        """
+        worker = self._acquire()
+        try:
+            status, value = worker.call(key, blob, args, self.timeout)
+        except TimeoutError:
+            worker.kill()
+            worker = None
+            raise ValidFuncError(f"timed out after {self.timeout} seconds")
+        except (EOFError, OSError) as e:
+            worker.kill()
+            worker = None
+            raise ValidFuncError(f"worker process died: {e}")
+        finally:
+            self._release(worker)
+        if status == 'error':
+            raise ValidFuncError(value)
+        return value
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.kill()
+
+    def _acquire(self):
+        self._slots.acquire()
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        try:
+            return _Worker(self._context, self.memory_limit)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _release(self, worker):
+        """Return the worker to the pool, None if it was killed."""
+        if worker is not None:
+            with self._lock:
+                self._idle.append(worker)
+        self._slots.release()
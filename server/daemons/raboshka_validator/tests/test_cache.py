@@ -0,0 +1,59 @@
+from raboshka_validator.cache import LRUCache
+
+
+def test_entries_are_evicted_by_count_in_lru_order():
+    cache = LRUCache('cache', max_entries=2, max_bytes=1024)
+    cache.put('a', 1, 1)
+    cache.put('b', 2, 1)
+    assert cache.get('a') == 1  # b is now the least recently used
+
+    cache.put('c', 3, 1)
+
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+
+
+def test_entries_are_evicted_by_bytes():
+    cache = LRUCache('cache', max_entries=100, max_bytes=100)
+    for key in ('a', 'b', 'c'):
+        cache.put(key, key, 30)
+
+    cache.put('big', 'big', 60)
+
+    assert [cache.get(key) for key in ('a', 'b', 'c', 'big')] == [None, None, 'c', 'big']
+    stats = cache.stats()
+    assert (stats['cache.evictions'], stats['cache.entries'], stats['cache.bytes']) == (2, 2, 90)
+
+
+def test_values_larger_than_the_cache_are_not_cached():
+    cache = LRUCache('cache', max_entries=100, max_bytes=100)
+    cache.put('a', 'a', 10)
+    cache.put('big', 'big', 101)
+
+    assert cache.get('big') is None
+    assert cache.get('a') == 'a'
+
+
+def test_a_cached_key_keeps_its_first_value():
+    cache = LRUCache('cache', max_entries=100, max_bytes=100)
+    cache.put('a', 1, 10)
+    cache.put('a', 2, 20)
+
+    assert cache.get('a') == 1
+    assert cache.stats()['cache.bytes'] == 10
+
+
+def test_a_cache_of_no_entries_caches_nothing():
+    cache = LRUCache('cache', max_entries=0, max_bytes=100)
+    cache.put('a', 1, 1)
+    assert cache.get('a') is None
+
+
+def test_stats_count_hits_and_misses():
+    cache = LRUCache('parsed', max_entries=10, max_bytes=100)
+    cache.put('a', 1, 1)
+    cache.get('a')
+    cache.get('a')
+    cache.get('b')
+    stats = cache.stats()
+    assert (stats['parsed.hits'], stats['parsed.misses'], stats['parsed.hit_rate']) == (2, 1, 2 / 3)
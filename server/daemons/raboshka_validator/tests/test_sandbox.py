@@ -0,0 +1,105 @@
+import os
+import time
+
+import cloudpickle
+import pytest
+
+from raboshka_validator.sandbox import SandboxPool, ValidFuncError
+
+MEMORY_LIMIT = 512 * 1024 * 1024
+
+
+@pytest.fixture
+def pool():
+    pool = SandboxPool(size=2, timeout=1.0, memory_limit=MEMORY_LIMIT)
+    yield pool
+    pool.close()
+
+
+def call(pool, func, *args, key='func'):
+    return pool.call(key, cloudpickle.dumps(func), args)
+
+
+def test_the_function_is_called_in_a_worker_process(pool):
+    assert call(pool, lambda x, y: x + y, 1, 2) == 3
+    assert call(pool, lambda: os.getpid(), key='pid') != os.getpid()
+
+
+def test_exceptions_are_raised_as_valid_func_errors(pool):
+    with pytest.raises(ValidFuncError, match='ZeroDivisionError'):
+        call(pool, lambda x: x / 0, 1)
+    # the worker is still usable
+    assert call(pool, lambda: 42, key='answer') == 42
+
+
+def test_a_timed_out_worker_is_killed_and_replaced(pool):
+    pid = call(pool, lambda: os.getpid(), key='pid')
+
+    start = time.monotonic()
+    with pytest.raises(ValidFuncError, match='timed out after 1.0 seconds'):
+        call(pool, lambda: time.sleep(60), key='sleep')
+    assert time.monotonic() - start < 10.0
+
+    with pytest.raises(ProcessLookupError):
+        os.kill(pid, 0)
+    assert call(pool, lambda: os.getpid(), key='pid') != pid
+
+
+def test_exceeding_the_memory_limit_is_a_valid_func_error(pool):
+    pid = call(pool, lambda: os.getpid(), key='pid')
+
+    with pytest.raises(ValidFuncError, match=f'memory limit of {MEMORY_LIMIT} bytes exceeded'):
+        call(pool, lambda: len(bytearray(2 * MEMORY_LIMIT)), key='allocate')
+
+    # the allocation failed before taking the memory, the worker is kept
+    assert call(pool, lambda: os.getpid(), key='pid') == pid
+
+
+def test_a_dead_worker_is_a_valid_func_error(pool):
+    with pytest.raises(ValidFuncError, match='worker process died'):
+        call(pool, lambda: os._exit(1), key='exit')
+    assert call(pool, lambda: 42, key='answer') == 42
+
+
+def test_unpickled_functions_are_cached_by_key():
+    pool = SandboxPool(size=1, timeout=10.0, memory_limit=0)
+    try:
+        def count():
+            count.calls += 1
+            return count.calls
+        count.calls = 0
+
+        assert [call(pool, count, key='count') for _ in range(3)] == [1, 2, 3]
+        assert call(pool, count, key='other') == 1
+    finally:
+        pool.close()
+
+
+class RecordingConnection:
+    """Pipe connection of a worker, the requests sent are recorded."""
+    def __init__(self, conn):
+        self.conn = conn
+        self.sent = []
+
+    def send(self, request):
+        self.sent.append(request)
+        self.conn.send(request)
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+
+def test_blobs_are_sent_only_to_workers_which_have_not_loaded_them(pool):
+    pid = call(pool, lambda: os.getpid(), key='pid')
+    worker, = pool._idle
+    worker.conn = RecordingConnection(worker.conn)
+
+    assert call(pool, lambda: os.getpid(), key='pid') == pid
+    assert [blob for _, blob, _ in worker.conn.sent] == [None]
+
+    # the worker drops its functions when it runs out of memory, they are sent again
+    with pytest.raises(ValidFuncError, match='memory limit'):
+        call(pool, lambda: len(bytearray(2 * MEMORY_LIMIT)), key='allocate')
+    worker.conn.sent.clear()
+    assert call(pool, lambda: os.getpid(), key='pid') == pid
+    assert [blob is None for _, blob, _ in worker.conn.sent] == [True, False]
@@ -0,0 +1,176 @@
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from gened_proto.task_service.task_service_pb2 import ResultStatus
+from result_codec import encode, FORMAT_JSON, FORMAT_MSGPACK
+from raboshka_validator import validator
+from raboshka_validator.cache import LRUCache
+from raboshka_validator.cli_parser import ExitCode
+from raboshka_validator.validator import (
+    results_equal, comparative_validation, comparative_verdict, initial_validation, identical_results, load_result,
+    validation_stats, TRIVIAL_INIT_VALIDATOR, TRIVIAL_COMPARE_VALIDATOR,
+)
+
+SUCCESS = ResultStatus.SUCCESS
+USER_ERROR = ResultStatus.USER_ERROR
+SYSTEM_ERROR = ResultStatus.SYSTEM_ERROR
+
+
+def failing_valid_func(*args):
+    raise AssertionError("the validation function must not be called")
+
+
+class FakeDatabase:
+    """Pickled validation functions by task_id, the trivial validators for the others."""
+    def __init__(self):
+        self.validation_funcs = {}
+
+    def get_validation_func(self, task_id, mode):
+        return self.validation_funcs.get(task_id, b'')
+
+
+class FakeSandbox:
+    """Every validation function compares the order of dict keys, the calls are recorded."""
+    def __init__(self):
+        self.calls = []
+
+    def call(self, key, blob, args):
+        self.calls.append(key)
+        x, y = args
+        return list(x) == list(y)
+
+
+@pytest.fixture
+def validator_env(monkeypatch):
+    """Fresh validation counts and caches, a fake database and sandbox."""
+    env = FakeDatabase(), FakeSandbox()
+    monkeypatch.setattr(validator, 'database', env[0])
+    monkeypatch.setattr(validator, 'sandbox', env[1])
+    monkeypatch.setattr(validator, 'validation_counts', Counter())
+    monkeypatch.setattr(validator, 'validation_times', Counter())
+    for name in ('valid_func_cache', 'parsed_result_cache', 'result_digest_cache'):
+        monkeypatch.setattr(validator, name, LRUCache(name, max_entries=100, max_bytes=1024 * 1024))
+    return env
+
+
+def compare_files(tmp_path, task_id, content_1, content_2):
+    paths = [tmp_path / f'{task_id}_1', tmp_path / f'{task_id}_2']
+    for path, content in zip(paths, (content_1, content_2)):
+        path.write_bytes(content)
+    return comparative_verdict(task_id, 1, str(paths[0]), 2, str(paths[1]))
+
+
+def test_results_equal_ignores_the_order_of_dict_keys():
+    assert results_equal({'a': 1, 'b': [1, {'c': 2, 'd': 3}]}, {'b': [1, {'d': 3, 'c': 2}], 'a': 1})
+    assert not results_equal({'a': 1}, {'a': 1, 'b': 2})
+    assert not results_equal([1, 2], [2, 1])
+
+
+def test_results_equal_compares_arrays_by_dtype_shape_and_values():
+    assert results_equal({'x': np.arange(4)}, {'x': np.arange(4)})
+    assert not results_equal(np.arange(4), np.arange(4).reshape(2, 2))
+    assert not results_equal(np.arange(4, dtype=np.int32), np.arange(4, dtype=np.int64))
+    assert not results_equal(np.arange(4), [0, 1, 2, 3])
+
+
+def test_the_trivial_validator_ignores_the_order_of_dict_keys():
+    verdict = comparative_validation('task', TRIVIAL_COMPARE_VALIDATOR,
+                                     1, SUCCESS, {'a': 1, 'b': 2},
+                                     2, SUCCESS, {'b': 2, 'a': 1})
+    assert verdict == ExitCode.ACCEPTED
+
+
+def test_equal_results_are_still_compared_by_the_validation_function():
+    # user functions decide on their own, e.g. if the key order matters
+    verdict = comparative_validation('task', lambda x, y: list(x) == list(y),
+                                     1, SUCCESS, {'a': 1, 'b': 2},
+                                     2, SUCCESS, {'b': 2, 'a': 1})
+    assert verdict == ExitCode.REJECTED
+
+
+def test_different_results_are_compared_by_the_validation_function():
+    close = lambda x, y: abs(x - y) < 0.1
+    assert comparative_validation('task', close, 1, SUCCESS, 1.0, 2, SUCCESS, 1.05) == ExitCode.ACCEPTED
+    assert comparative_validation('task', close, 1, SUCCESS, 1.0, 2, SUCCESS, 2.0) == ExitCode.REJECTED
+    assert comparative_validation('task', TRIVIAL_COMPARE_VALIDATOR,
+                                  1, SUCCESS, 1.0, 2, SUCCESS, 2.0) == ExitCode.REJECTED
+
+
+def test_identical_results_are_accepted_by_their_digest_without_user_code(tmp_path, validator_env):
+    database, sandbox = validator_env
+    database.validation_funcs['task'] = b'pickled'
+
+    assert compare_files(tmp_path, 'task', b'0{"a": 1}', b'0{"a": 1}') == ExitCode.ACCEPTED
+
+    assert sandbox.calls == []
+    stats = validation_stats()
+    assert (stats['validations.compare'], stats['validations.compare_fast_path']) == (1, 1)
+    assert stats['validations.compare_fast_path_rate'] == 1.0
+
+
+def test_trivial_validators_are_applied_without_user_code(tmp_path, validator_env):
+    _, sandbox = validator_env
+
+    assert compare_files(tmp_path, 'task', b'0{"a": 1, "b": 2}', b'0{"b": 2, "a": 1}') == ExitCode.ACCEPTED
+    assert compare_files(tmp_path, 'other', b'0[1]', b'0[2]') == ExitCode.REJECTED
+
+    assert sandbox.calls == []
+    stats = validation_stats()
+    assert (stats['validations.compare'], stats['validations.compare_fast_path']) == (2, 2)
+
+
+def test_different_results_are_compared_by_user_code(tmp_path, validator_env):
+    database, sandbox = validator_env
+    database.validation_funcs['task'] = b'pickled'
+
+    # equal for results_equal, but the user function sees the order of keys
+    assert compare_files(tmp_path, 'task', b'0{"a": 1, "b": 2}', b'0{"b": 2, "a": 1}') == ExitCode.REJECTED
+    assert compare_files(tmp_path, 'task', b'0{"a": 1}', b'0{"a": 1}') == ExitCode.ACCEPTED
+
+    assert sandbox.calls == [('task', 'compare')]
+    stats = validation_stats()
+    assert (stats['validations.compare'], stats['validations.compare_fast_path']) == (2, 1)
+    assert stats['validations.compare_fast_path_rate'] == 0.5
+
+
+def test_user_errors_are_equal_only_to_user_errors():
+    assert comparative_validation('task', failing_valid_func,
+                                  1, USER_ERROR, 'boom', 2, USER_ERROR, 'bang') == ExitCode.ACCEPTED
+    assert comparative_validation('task', failing_valid_func,
+                                  1, USER_ERROR, 'boom', 2, SUCCESS, 1) == ExitCode.REJECTED
+
+
+def test_broken_validation_functions_are_valid_func_errors():
+    assert comparative_validation('task', lambda x, y: 1 / 0, 1, SUCCESS, 1, 2, SUCCESS, 2) == ExitCode.VALID_FUNC_ERROR
+    assert comparative_validation('task', lambda x, y: 'yes', 1, SUCCESS, 1, 2, SUCCESS, 2) == ExitCode.VALID_FUNC_ERROR
+    assert initial_validation('task', lambda x: None, 1, SUCCESS, 1) == ExitCode.VALID_FUNC_ERROR
+
+
+def test_initial_validation():
+    assert initial_validation('task', TRIVIAL_INIT_VALIDATOR, 1, SUCCESS, 1) == ExitCode.ACCEPTED
+    assert initial_validation('task', lambda x: x > 0, 1, SUCCESS, -1) == ExitCode.REJECTED
+    assert initial_validation('task', failing_valid_func, 1, USER_ERROR, 'boom') == ExitCode.ACCEPTED
+    assert initial_validation('task', failing_valid_func, 1, SYSTEM_ERROR, 'lost') == ExitCode.REJECTED
+
+
+def test_identical_result_files_are_found_by_their_digest(tmp_path):
+    paths = [tmp_path / name for name in ('a', 'b', 'c')]
+    for path, content in zip(paths, (b'0[1, 2]', b'0[1, 2]', b'0[1, 3]')):
+        path.write_bytes(content)
+    assert identical_results(paths[0], paths[1])
+    assert not identical_results(paths[0], paths[2])
+    assert not identical_results(paths[0], tmp_path / 'missing')
+
+
+def test_load_result_decodes_json_and_binary_payloads(tmp_path):
+    json_path, binary_path, error_path = tmp_path / 'json', tmp_path / 'binary', tmp_path / 'error'
+    json_path.write_bytes(b'0' + encode({'b': 1, 'a': 2}, FORMAT_JSON))
+    binary_path.write_bytes(b'0' + encode({'x': np.arange(3.0)}, FORMAT_MSGPACK))
+    error_path.write_bytes('1Exception is thrown in user function: boom'.encode())
+
+    assert load_result(json_path) == (SUCCESS, {'b': 1, 'a': 2})
+    status, result = load_result(binary_path)
+    assert status == SUCCESS and results_equal(result, {'x': np.arange(3.0)})
+    assert load_result(error_path) == (USER_ERROR, 'Exception is thrown in user function: boom')
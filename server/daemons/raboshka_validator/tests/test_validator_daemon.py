@@ -0,0 +1,249 @@
+import errno
+import threading
+
+import mysql.connector
+import pytest
+
+from raboshka_validator import daemon, validator
+from raboshka_validator.cache import LRUCache
+from raboshka_validator.cli_parser import ExitCode
+from raboshka_validator.daemon import (
+    ValidatorDaemon, ASSIMILATE_READY, RESULT_OUTCOME_SUCCESS, RESULT_OUTCOME_VALIDATE_ERROR,
+    VALIDATE_STATE_INIT, VALIDATE_STATE_VALID, VALIDATE_STATE_INVALID, VALIDATE_STATE_INCONCLUSIVE,
+    WU_ERROR_NO_CANONICAL_RESULT,
+)
+
+
+class FakeDatabase:
+    """Work units and results of the BOINC database in memory, the validations saved are recorded."""
+    def __init__(self):
+        self.workunits = []
+        self.results = []
+        self.saved_workunits = []
+        self.saved_results = []
+        self.unavailable_tasks = set()
+
+    def get_app_ids(self, prefix):
+        return [1]
+
+    def get_workunits_to_validate(self, app_ids, limit):
+        return self.workunits[:limit]
+
+    def get_results_to_validate(self, wu_ids, server_state, outcome):
+        return [result for result in self.results if result['workunitid'] in wu_ids]
+
+    def save_validation(self, workunits, results, validation_times):
+        self.saved_workunits.extend(workunits)
+        self.saved_results.extend(results)
+
+    def get_validation_func(self, task_id, mode):
+        if task_id in self.unavailable_tasks:
+            raise mysql.connector.errors.OperationalError("Lost connection to MySQL server during query")
+        # the trivial validators
+        return b''
+
+
+@pytest.fixture
+def database(monkeypatch):
+    database = FakeDatabase()
+    monkeypatch.setattr(daemon, 'database', database)
+    monkeypatch.setattr(validator, 'database', database)
+    # validation functions are cached by task name, which the tests reuse
+    monkeypatch.setattr(validator, 'valid_func_cache', LRUCache('valid_func_cache', max_entries=100, max_bytes=1024))
+    return database
+
+
+@pytest.fixture
+def validator_daemon(tmp_path):
+    upload_dir = tmp_path / 'upload'
+    (upload_dir / '0').mkdir(parents=True)
+    (tmp_path / 'config.xml').write_text(
+        f'<boinc><config><upload_dir>{upload_dir}</upload_dir><uldl_dir_fanout>1</uldl_dir_fanout></config></boinc>'
+    )
+    return ValidatorDaemon(str(tmp_path), batch_size=10, idle_interval=0.0)
+
+
+def add_workunit(database, wu_id, min_quorum=2, target_nresults=2, canonical_resultid=0):
+    wu = {
+        'id': wu_id, 'name': f'task{wu_id}', 'canonical_resultid': canonical_resultid, 'assimilate_state': 0,
+        'target_nresults': target_nresults, 'error_mask': 0, 'min_quorum': min_quorum, 'max_success_results': 6,
+    }
+    database.workunits.append(wu)
+    return wu
+
+
+def add_result(database, validator_daemon, wu, result_id, content, validate_state=VALIDATE_STATE_INIT):
+    file_name = f"{wu['name']}_{result_id}_r0"
+    result = {
+        'id': result_id, 'workunitid': wu['id'], 'validate_state': validate_state,
+        'xml_doc_in': f'<file_info>\n    <name>{file_name}</name>\n</file_info>',
+    }
+    with open(validator_daemon._output_path(result), 'wb') as f:
+        f.write(content)
+    database.results.append(result)
+    return result
+
+
+def saved(database, wu_id):
+    """(canonical_resultid, assimilate_state, target_nresults, error_mask, transition) saved for the work unit"""
+    return next(tuple(row[:5]) for row in database.saved_workunits if row[5] == wu_id)
+
+
+def test_matching_results_make_a_canonical_result(database, validator_daemon):
+    wu = add_workunit(database, 1)
+    add_result(database, validator_daemon, wu, 11, b'0{"a": 1, "b": 2}')
+    add_result(database, validator_daemon, wu, 12, b'0{"b": 2, "a": 1}')
+
+    assert validator_daemon.run_once() == 1
+
+    assert saved(database, 1) == (11, ASSIMILATE_READY, 2, 0, True)
+    assert sorted(database.saved_results) == [
+        (VALIDATE_STATE_VALID, RESULT_OUTCOME_SUCCESS, 11), (VALIDATE_STATE_VALID, RESULT_OUTCOME_SUCCESS, 12),
+    ]
+
+
+def test_results_without_consensus_are_inconclusive_and_more_are_requested(database, validator_daemon):
+    wu = add_workunit(database, 1)
+    add_result(database, validator_daemon, wu, 11, b'0[1]')
+    add_result(database, validator_daemon, wu, 12, b'0[2]')
+
+    validator_daemon.run_once()
+
+    assert saved(database, 1) == (0, 0, 3, 0, True)
+    assert {state for state, _, _ in database.saved_results} == {VALIDATE_STATE_INCONCLUSIVE}
+
+
+def test_results_rejected_by_the_initial_validation_are_validate_errors(database, validator_daemon):
+    wu = add_workunit(database, 1, target_nresults=2)
+    add_result(database, validator_daemon, wu, 11, b'2Failed to load call_spec from the file')
+    add_result(database, validator_daemon, wu, 12, b'0[1]')
+
+    validator_daemon.run_once()
+
+    assert sorted(database.saved_results) == [
+        (VALIDATE_STATE_INVALID, RESULT_OUTCOME_VALIDATE_ERROR, 11),
+        (VALIDATE_STATE_INCONCLUSIVE, RESULT_OUTCOME_SUCCESS, 12),
+    ]
+    # the validate error is not a success, one more result is enough to reach the target
+    assert saved(database, 1) == (0, 0, 2, 0, False)
+
+
+def test_new_results_are_checked_against_the_canonical_result(database, validator_daemon):
+    wu = add_workunit(database, 1, canonical_resultid=11)
+    add_result(database, validator_daemon, wu, 11, b'0[1]', validate_state=VALIDATE_STATE_VALID)
+    add_result(database, validator_daemon, wu, 12, b'0[1]')
+    add_result(database, validator_daemon, wu, 13, b'0[2]')
+
+    validator_daemon.run_once()
+
+    assert saved(database, 1) == (11, 0, 2, 0, False)
+    assert sorted(database.saved_results) == [
+        (VALIDATE_STATE_VALID, RESULT_OUTCOME_SUCCESS, 12), (VALIDATE_STATE_INVALID, RESULT_OUTCOME_SUCCESS, 13),
+    ]
+
+
+def test_broken_validation_functions_fail_the_work_unit(database, validator_daemon, monkeypatch):
+    monkeypatch.setattr(daemon, 'comparative_verdict', lambda *args: ExitCode.VALID_FUNC_ERROR)
+    wu = add_workunit(database, 1)
+    add_result(database, validator_daemon, wu, 11, b'0[1]')
+    add_result(database, validator_daemon, wu, 12, b'0[2]')
+
+    validator_daemon.run_once()
+
+    assert saved(database, 1) == (0, 0, 2, WU_ERROR_NO_CANONICAL_RESULT, True)
+
+
+def test_work_units_with_temporary_errors_are_left_for_the_next_pass(database, validator_daemon, monkeypatch):
+    monkeypatch.setattr(daemon, 'comparative_verdict',
+                        lambda task_id, *args: ExitCode.TEMP_ERROR if task_id == 'task1' else ExitCode.ACCEPTED)
+    for wu_id in (1, 2):
+        wu = add_workunit(database, wu_id)
+        add_result(database, validator_daemon, wu, wu_id * 10 + 1, b'0[1]')
+        add_result(database, validator_daemon, wu, wu_id * 10 + 2, b'0[1]')
+
+    assert validator_daemon.run_once() == 1
+
+    assert [row[5] for row in database.saved_workunits] == [2]
+    assert {result_id for _, _, result_id in database.saved_results} == {21, 22}
+
+
+def test_verdicts_are_saved_without_waiting_for_slower_work_units(database, validator_daemon, monkeypatch):
+    saved_other = threading.Event()
+    save_validation = database.save_validation
+
+    def comparative_verdict(task_id, *args):
+        if task_id == 'task1':
+            assert saved_other.wait(timeout=10.0)
+        return ExitCode.ACCEPTED
+
+    def save_validation_and_notify(workunits, results, validation_times):
+        save_validation(workunits, results, validation_times)
+        saved_other.set()
+
+    monkeypatch.setattr(daemon, 'comparative_verdict', comparative_verdict)
+    monkeypatch.setattr(database, 'save_validation', save_validation_and_notify)
+    for wu_id in (1, 2):
+        wu = add_workunit(database, wu_id)
+        add_result(database, validator_daemon, wu, wu_id * 10 + 1, b'0[1]')
+        add_result(database, validator_daemon, wu, wu_id * 10 + 2, b'0[2]')
+
+    assert validator_daemon.run_once() == 2
+
+    # task1 is validated only once the verdict of task2 is saved
+    assert [row[5] for row in database.saved_workunits] == [2, 1]
+
+
+def test_database_errors_of_validation_functions_leave_the_work_unit_for_the_next_pass(database, validator_daemon):
+    database.unavailable_tasks.add('task1')
+    for wu_id in (1, 2):
+        wu = add_workunit(database, wu_id)
+        add_result(database, validator_daemon, wu, wu_id * 10 + 1, b'0[1]')
+        add_result(database, validator_daemon, wu, wu_id * 10 + 2, b'0[2]')
+
+    assert validator_daemon.run_once() == 1
+
+    assert [row[5] for row in database.saved_workunits] == [2]
+
+
+def test_unreadable_results_are_temporary_errors_and_missing_ones_are_rejected(tmp_path, monkeypatch):
+    def unreadable(filepath):
+        raise OSError(errno.EIO, "Input/output error", filepath)
+
+    assert validator.initial_verdict('task1', 11, str(tmp_path / 'missing')) == ExitCode.REJECTED
+    monkeypatch.setattr(validator, 'load_result', unreadable)
+    (tmp_path / 'result').write_bytes(b'0[1]')
+    assert validator.initial_verdict('task1', 11, str(tmp_path / 'result')) == ExitCode.TEMP_ERROR
+
+
+def test_unexpected_errors_leave_the_work_unit_for_the_next_pass(database, validator_daemon, monkeypatch):
+    def comparative_verdict(task_id, *args):
+        if task_id == 'task1':
+            raise RuntimeError("unexpected")
+        return ExitCode.ACCEPTED
+
+    monkeypatch.setattr(daemon, 'comparative_verdict', comparative_verdict)
+    for wu_id in (1, 2):
+        wu = add_workunit(database, wu_id)
+        add_result(database, validator_daemon, wu, wu_id * 10 + 1, b'0[1]')
+        add_result(database, validator_daemon, wu, wu_id * 10 + 2, b'0[1]')
+
+    assert validator_daemon.run_once() == 1
+
+    assert [row[5] for row in database.saved_workunits] == [2]
+
+
+def test_failed_passes_do_not_stop_the_daemon(database, validator_daemon, monkeypatch):
+    class Stop(BaseException):
+        pass
+
+    def get_workunits_to_validate(app_ids, limit):
+        raise mysql.connector.errors.OperationalError("Lost connection to MySQL server during query")
+
+    def sleep(seconds):
+        raise Stop
+
+    monkeypatch.setattr(database, 'get_workunits_to_validate', get_workunits_to_validate)
+    monkeypatch.setattr(daemon.time, 'sleep', sleep)
+
+    with pytest.raises(Stop):
+        validator_daemon.run()
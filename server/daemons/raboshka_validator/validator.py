@@ -1,140 +1,346 @@
+import os
 import sys
-import argparse
-import cloudpickle
-import json
+import time
+import hashlib
 import logging
-from enum import IntEnum, unique
+import threading
+from collections import Counter
 
+import mysql.connector
 from gened_proto.task_service.task_service_pb2 import ResultStatus
+from result_codec import decode, decompress
 
 from .database import database
+from .cli_parser import ExitCode, parse_args
+from .cache import LRUCache
+from .sandbox import SandboxPool
 
 logger = logging.getLogger(__name__)
 
 
-# About exit codes read https://github.com/BOINC/boinc/wiki/Validators-in-scripting-languages
-@unique
-class ExitCode(IntEnum):
-    ACCEPTED = 0            # approved by the validator
-    REJECTED = 1            # rejected by the validator
-    OTHER_ERROR = 2         # any other error, no retries, validation failed
-    TEMP_ERROR = 3          # temporary error, retry later
-    VALID_FUNC_ERROR = 4    # error in the validation function, is considered the user's fault,
-                            # no retries, validation failed
-
-
-def parse_args():
-    parser = argparse.ArgumentParser(
-        description="BOINC validator: initial or comparative validation"
-    )
-    group = parser.add_mutually_exclusive_group(required=True)
-    group.add_argument(
-        '--init',
-        nargs=2,
-        metavar=('RESULT_ID', 'FILE'),
-        help='Initialize with a result ID and output file'
-    )
-    group.add_argument(
-        '--compare',
-        nargs=4,
-        metavar=('RESULT_ID_1', 'FILE_1', 'RESULT_ID_2', 'FILE_2'),
-        help='Compare two results with their corresponding files'
-    )
-    try:
-        return parser.parse_args()
-    except Exception as e:
-        logger.error(f"Failed to parse arguments: {e}")
-        sys.exit(ExitCode.OTHER_ERROR)
+# must be the same as in workers/src/raboshka/main.py
+FUSED_RESULT_MARKER = 'F'
+
+# must be the same as in python_lib/src/stoilo/low_level/validators.py,
+# these defaults are sent as empty bytes and applied without unpickling and running user code
+TRIVIAL_INIT_VALIDATOR = lambda _: True
+TRIVIAL_COMPARE_VALIDATOR = lambda x, y: results_equal(x, y)
+
+
+def results_equal(x, y):
+    """x == y, with numpy arrays (decoded arrays and tensors) equal if they have the same shape and values."""
+    if isinstance(x, dict) and isinstance(y, dict):
+        return x.keys() == y.keys() and all(results_equal(x[key], y[key]) for key in x)
+    if isinstance(x, list) and isinstance(y, list):
+        return len(x) == len(y) and all(results_equal(a, b) for a, b in zip(x, y))
+    numpy = sys.modules.get('numpy')
+    if numpy is not None and (isinstance(x, numpy.ndarray) or isinstance(y, numpy.ndarray)):
+        return (isinstance(x, numpy.ndarray) and isinstance(y, numpy.ndarray)
+                and x.dtype == y.dtype and bool(numpy.array_equal(x, y)))
+    return x == y
+
+# Long-lived validators see every result of a work unit, these caches save fetching and unpickling
+# the same validation function and parsing the same result file for each of them
+valid_func_cache = LRUCache(
+    'valid_func_cache',
+    max_entries=int(os.getenv('VALIDATOR_FUNC_CACHE_MAX_ENTRIES', '10000')),
+    max_bytes=int(os.getenv('VALIDATOR_FUNC_CACHE_MAX_BYTES', str(256 * 1024 * 1024))),
+)
+parsed_result_cache = LRUCache(
+    'parsed_result_cache',
+    max_entries=int(os.getenv('VALIDATOR_RESULT_CACHE_MAX_ENTRIES', '1000')),
+    max_bytes=int(os.getenv('VALIDATOR_RESULT_CACHE_MAX_BYTES', str(256 * 1024 * 1024))),
+)
+result_digest_cache = LRUCache(
+    'result_digest_cache',
+    max_entries=int(os.getenv('VALIDATOR_RESULT_CACHE_MAX_ENTRIES', '1000')),
+    max_bytes=int(os.getenv('VALIDATOR_RESULT_CACHE_MAX_BYTES', str(256 * 1024 * 1024))),
+)
+
+# User validation functions run in worker processes, with limited wall-clock time and memory per call
+sandbox = SandboxPool(
+    size=int(os.getenv('VALIDATOR_SANDBOX_WORKERS', '4')),
+    timeout=float(os.getenv('VALIDATOR_FUNC_TIMEOUT', '60')),
+    memory_limit=int(os.getenv('VALIDATOR_FUNC_MEMORY_LIMIT', str(2 * 1024 * 1024 * 1024))),
+)
+
+# Validations by mode ('init', 'compare') and those of them served by a fast path, without user code
+validation_counts = Counter()
+# Seconds spent in validation functions by task_id, not saved to the database yet
+validation_times = Counter()
+stats_lock = threading.Lock()
+
+
+def validation_stats():
+    stats = {**valid_func_cache.stats(), **parsed_result_cache.stats(), **result_digest_cache.stats()}
+    for mode in ('init', 'compare'):
+        total = validation_counts[mode]
+        fast_path = validation_counts[f'{mode}_fast_path']
+        stats[f'validations.{mode}'] = total
+        stats[f'validations.{mode}_fast_path'] = fast_path
+        stats[f'validations.{mode}_fast_path_rate'] = fast_path / total if total else 0.0
+    return stats
+
+
+def count_validation(mode, fast_path):
+    with stats_lock:
+        validation_counts[mode] += 1
+        if fast_path:
+            validation_counts[f'{mode}_fast_path'] += 1
+
+
+def record_validation_time(task_id, seconds):
+    with stats_lock:
+        validation_times[task_id] += seconds
+
+
+def pop_validation_times():
+    """List of (seconds, task_id) recorded since the previous call."""
+    with stats_lock:
+        times = [(seconds, task_id) for task_id, seconds in validation_times.items()]
+        validation_times.clear()
+    return times
+
+
+def save_validation_times():
+    times = pop_validation_times()
+    if times:
+        database.add_validation_times(times)
+
+
+class SandboxedValidFunc:
+    """
+    Validation function of a task, called in the sandbox: the validator never unpickles user code itself.
+    Errors, timeouts and exceeded memory limits are raised as sandbox.ValidFuncError.
+    """
+    def __init__(self, task_id, mode, blob):
+        self.task_id = task_id
+        self.mode = mode
+        self.blob = blob
+
+    def __call__(self, *args):
+        start = time.perf_counter()
+        try:
+            return sandbox.call((self.task_id, self.mode), self.blob, args)
+        finally:
+            record_validation_time(self.task_id, time.perf_counter() - start)
 
 
 def get_valid_func(task_id, mode):
+    """
+    Validation functions of a task never change, they are cached by (task_id, mode).
+    Empty blobs stand for TRIVIAL_INIT_VALIDATOR and TRIVIAL_COMPARE_VALIDATOR.
+    """
+    valid_func = valid_func_cache.get((task_id, mode))
+    if valid_func is not None:
+        return valid_func
     valid_func_blob = database.get_validation_func(task_id, mode)
-    try:
-        valid_func = cloudpickle.loads(valid_func_blob)
-    except Exception as e:
-        logger.error(f"Failed to deserialize validation function for task_id {task_id}: {e}")
-        sys.exit(ExitCode.VALID_FUNC_ERROR)
+    if not valid_func_blob:
+        valid_func = TRIVIAL_INIT_VALIDATOR if mode == 'init' else TRIVIAL_COMPARE_VALIDATOR
+        valid_func_cache.put((task_id, mode), valid_func, 0)
+        return valid_func
+    valid_func = SandboxedValidFunc(task_id, mode, valid_func_blob)
+    valid_func_cache.put((task_id, mode), valid_func, len(valid_func_blob))
     return valid_func
 
 
-def deserialize_result(filepath):
-    try:
-        with open(filepath, 'r') as f:
-            str_result_status = f.read(1)
-            serialized_result = f.read()
+def parse_result(result_status, serialized_result):
+    """
+    serialized_result is json text or a payload in the binary format of result_codec, possibly compressed,
+    arrays and tensors of binary payloads are decoded as numpy arrays over the payload memory.
+    """
+    result_status = int(result_status)
+    assert result_status in [ResultStatus.SUCCESS, ResultStatus.USER_ERROR, ResultStatus.SYSTEM_ERROR]
+    if result_status == ResultStatus.SUCCESS:
+        result = decode(decompress(serialized_result))
+    elif isinstance(serialized_result, str):
+        result = serialized_result
+    else:
+        result = bytes(serialized_result).decode('utf-8')
+    return result_status, result
+
+
+def load_result(filepath):
+    with open(filepath, 'rb') as f:
+        data = f.read()
+    str_result_status = data[:1].decode('ascii')
+    serialized_result = memoryview(data)[1:]
+
+    if str_result_status == FUSED_RESULT_MARKER:
+        return FUSED_RESULT_MARKER, [
+            parse_result(result_status, serialized)
+            for result_status, serialized, _ in decode(decompress(serialized_result))
+        ]
+    return parse_result(str_result_status, serialized_result)
 
-        # logger.debug(f"result_status: {str_result_status} serialized_result: {serialized_result}")
 
-        result_status = int(str_result_status)
-        assert result_status in [ResultStatus.SUCCESS, ResultStatus.USER_ERROR, ResultStatus.SYSTEM_ERROR]
-        if result_status == ResultStatus.SUCCESS:
-            result = json.loads(serialized_result)
-        else:
-            result = serialized_result
-
-        return result_status, result
+def deserialize_result(filepath):
+    """
+    (result_status, result) of a task, or (FUSED_RESULT_MARKER, list of (result_status, result))
+    for all tasks of a fused work unit.
+    Parsed results are cached by path, mtime and size, so a result compared with many replicas is parsed once
+    (the same objects are then passed to every validation function).
+    A missing file is rejected, other OSErrors are raised, they may go away.
+    """
+    try:
+        stat = os.stat(filepath)
+        key = (os.path.abspath(filepath), stat.st_mtime_ns, stat.st_size)
+        parsed = parsed_result_cache.get(key)
+        if parsed is None:
+            parsed = load_result(filepath)
+            parsed_result_cache.put(key, parsed, stat.st_size)
+        return parsed
+    except OSError as e:
+        if not isinstance(e, FileNotFoundError):
+            # e.g. the upload directory is not mounted, the result may be readable later
+            raise
+        logger.error(f"Result file is missing: {e}; rejected")
+        sys.exit(ExitCode.REJECTED)
     except Exception as e:
         logger.error(f"(This could be an attack) Failed to load result: {e}; rejected")
         sys.exit(ExitCode.REJECTED)
 
 
+def result_digest(filepath):
+    """sha256 of the result file, cached by path, mtime and size like parsed results."""
+    stat = os.stat(filepath)
+    key = (os.path.abspath(filepath), stat.st_mtime_ns, stat.st_size)
+    digest = result_digest_cache.get(key)
+    if digest is None:
+        sha256 = hashlib.sha256()
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha256.update(chunk)
+        digest = sha256.hexdigest()
+        result_digest_cache.put(key, digest, len(digest))
+    return digest
+
+
+def identical_results(file_1, file_2):
+    try:
+        return result_digest(file_1) == result_digest(file_2)
+    except OSError:
+        # missing files are rejected by deserialize_result
+        return False
+
+
 def initial_validation(task_id, valid_func,
                        result_id, result_status, result):
+    fast_path = result_status != ResultStatus.SUCCESS or valid_func is TRIVIAL_INIT_VALIDATOR
+    count_validation('init', fast_path)
+
     if result_status == ResultStatus.USER_ERROR:
         logger.info(f"Initial validation: result_id {result_id} for task_id {task_id} is USER_ERROR; accepted")
-        sys.exit(ExitCode.ACCEPTED)
+        return ExitCode.ACCEPTED
 
     if result_status == ResultStatus.SYSTEM_ERROR:
         logger.info(f"Initial validation: result_id {result_id} for task_id {task_id} is SYSTEM_ERROR; rejected")
-        sys.exit(ExitCode.REJECTED)
+        return ExitCode.REJECTED
+
+    if valid_func is TRIVIAL_INIT_VALIDATOR:
+        logger.info(f"Initial validation: result_id {result_id} for task_id {task_id} is accepted by the trivial validator")
+        return ExitCode.ACCEPTED
 
     try:
         is_valid = valid_func(result)
+    except OSError:
+        # the sandbox failed, not the user function (whose errors are ValidFuncError)
+        raise
     except Exception as e:
         logger.info(f"Error during executing initial validation function: {e}")
-        sys.exit(ExitCode.VALID_FUNC_ERROR)
+        return ExitCode.VALID_FUNC_ERROR
 
     if not isinstance(is_valid, bool):
         logger.info(f"Validation function returned non-boolean value: {is_valid}")
-        sys.exit(ExitCode.VALID_FUNC_ERROR)
+        return ExitCode.VALID_FUNC_ERROR
 
     if is_valid:
         logger.info(f"Initial validation: result_id {result_id} for task_id {task_id} is accepted")
-        sys.exit(ExitCode.ACCEPTED)
+        return ExitCode.ACCEPTED
 
     logger.info(f"Initial validation: result_id {result_id} for task_id {task_id} is rejected")
-    sys.exit(ExitCode.REJECTED)
+    return ExitCode.REJECTED
 
 
 def comparative_validation(task_id, valid_func,
                            result_id_1, result_status_1, result_1,
                            result_id_2, result_status_2, result_2):
+    """
+    Results which are not byte-identical are always compared by compare_valid_func, user functions may
+    accept results that differ. The trivial validator compares them with results_equal, which ignores
+    the order of dict keys: raboshka keeps the insertion order, which may differ between replicas
+    (e.g. for dicts built from sets).
+    """
+    fast_path = (ResultStatus.USER_ERROR in (result_status_1, result_status_2)
+                 or valid_func is TRIVIAL_COMPARE_VALIDATOR)
+    count_validation('compare', fast_path)
+
     if result_status_1 == ResultStatus.USER_ERROR and result_status_2 == ResultStatus.USER_ERROR:
         logger.info(f"Comparative validation: result_id {result_id_1} and {result_id_2} for task_id {task_id} "
                     "are both USER_ERROR; considered equal")
-        sys.exit(ExitCode.ACCEPTED)
+        return ExitCode.ACCEPTED
 
     if result_status_1 == ResultStatus.USER_ERROR or result_status_2 == ResultStatus.USER_ERROR:
         logger.info(f"Comparative validation: among result_id {result_id_1} and {result_id_2} for task_id {task_id} "
                     "there is exactly one USER_ERROR; considered different")
-        sys.exit(ExitCode.REJECTED)
+        return ExitCode.REJECTED
 
     try:
+        # the trivial validator is applied the same way, it is our code
         are_equal = valid_func(result_1, result_2)
+    except OSError:
+        # the sandbox failed, not the user function (whose errors are ValidFuncError)
+        raise
     except Exception as e:
         logger.info(f"Error during comparative validation: {e}")
-        sys.exit(ExitCode.VALID_FUNC_ERROR)
+        return ExitCode.VALID_FUNC_ERROR
 
     if not isinstance(are_equal, bool):
         logger.info(f"Validation function returned non-boolean value: {are_equal}")
-        sys.exit(ExitCode.VALID_FUNC_ERROR)
+        return ExitCode.VALID_FUNC_ERROR
 
     if are_equal:
         logger.info(f"Comparative validation: result_id {result_id_1} and {result_id_2} for task_id {task_id} are equal")
-        sys.exit(ExitCode.ACCEPTED)
+        return ExitCode.ACCEPTED
 
     logger.info(f"Comparative validation: result_id {result_id_1} and {result_id_2} for task_id {task_id} are different")
-    sys.exit(ExitCode.REJECTED)
+    return ExitCode.REJECTED
+
+
+def fused_verdict(verdicts):
+    """
+    Verdict for a fused work unit: the worst verdict among its tasks. A broken validation function
+    cannot be fixed by retries, so it outweighs a rejected result.
+    """
+    severity = [ExitCode.ACCEPTED, ExitCode.REJECTED, ExitCode.VALID_FUNC_ERROR]
+    return max(verdicts, key=severity.index)
+
+
+def fused_initial_validation(wu_name, result_id, results):
+    task_ids = database.get_group_task_ids(wu_name)
+    if len(task_ids) != len(results):
+        logger.info(f"Initial validation: result_id {result_id} has {len(results)} results "
+                    f"for {len(task_ids)} fused tasks of {wu_name}; rejected")
+        return ExitCode.REJECTED
+    return fused_verdict([
+        initial_validation(task_id, get_valid_func(task_id, 'init'), result_id, result_status, result)
+        for task_id, (result_status, result) in zip(task_ids, results)
+    ])
+
+
+def fused_comparative_validation(wu_name, result_id_1, results_1, result_id_2, results_2):
+    task_ids = database.get_group_task_ids(wu_name)
+    if len(task_ids) != len(results_1) or len(task_ids) != len(results_2):
+        logger.info(f"Comparative validation: result_id {result_id_1} and {result_id_2} have "
+                    f"{len(results_1)} and {len(results_2)} results for {len(task_ids)} fused tasks of {wu_name}; "
+                    "considered different")
+        return ExitCode.REJECTED
+    return fused_verdict([
+        comparative_validation(task_id, get_valid_func(task_id, 'compare'),
+                               result_id_1, result_status_1, result_1,
+                               result_id_2, result_status_2, result_2)
+        for task_id, (result_status_1, result_1), (result_status_2, result_2) in zip(task_ids, results_1, results_2)
+    ])
 
 
 def main():
@@ -146,27 +352,84 @@ def main():
 
     logger.debug(f"raboshka_validator received args: {sys.argv}")
 
-    args = parse_args()
+    validate(parse_args())
+
 
+def validate(args):
+    """Run the validation requested by the parsed command line, always exits with an ExitCode."""
     try:
         if args.init:
             result_id, file_path = args.init
             task_id = database.get_task_id_for_result(result_id)
             logger.debug(f"task_id: {task_id}")
-            valid_func = get_valid_func(task_id, 'init')
-            result_status, result = deserialize_result(file_path)
-            initial_validation(task_id, valid_func,
-                               result_id, result_status, result)
-        elif args.compare:
+            verdict = initial_verdict(task_id, result_id, file_path)
+        else:
             result_id_1, file_1, result_id_2, file_2 = args.compare
             task_id = database.get_task_id_for_result(result_id_1)
             logger.debug(f"task_id: {task_id}")
-            valid_func = get_valid_func(task_id, 'compare')
-            result_status_1, result_1 = deserialize_result(file_1)
-            result_status_2, result_2 = deserialize_result(file_2)
-            comparative_validation(task_id, valid_func,
-                                   result_id_1, result_status_1, result_1,
-                                   result_id_2, result_status_2, result_2)
+            verdict = comparative_verdict(task_id, result_id_1, file_1, result_id_2, file_2)
+        save_validation_times()
+    except mysql.connector.Error as e:
+        logger.error(f"Database error: {e}")
+        sys.exit(ExitCode.TEMP_ERROR)
     except Exception as e:
         logger.error(f"Unknown internal error: {e}")
         sys.exit(ExitCode.OTHER_ERROR)
+    sys.exit(verdict)
+
+
+def initial_verdict(task_id, result_id, file_path):
+    """
+    ExitCode of the initial validation of the result file of the work unit named task_id.
+    Database errors and result files that can not be read for now (other than missing ones) are TEMP_ERROR.
+    """
+    try:
+        result_status, result = deserialize_result(file_path)
+        if result_status == FUSED_RESULT_MARKER:
+            return fused_initial_validation(task_id, result_id, result)
+        valid_func = get_valid_func(task_id, 'init')
+        return initial_validation(task_id, valid_func,
+                                  result_id, result_status, result)
+    except SystemExit as e:
+        return ExitCode(e.code)
+    except (mysql.connector.Error, OSError) as e:
+        logger.warning(f"Temporary error, the validation is retried later: {e}")
+        return ExitCode.TEMP_ERROR
+    except Exception as e:
+        logger.error(f"Unknown internal error: {e}")
+        return ExitCode.OTHER_ERROR
+
+
+def comparative_verdict(task_id, result_id_1, file_1, result_id_2, file_2):
+    """
+    ExitCode of the comparative validation of two result files of the work unit named task_id.
+    Byte-identical results are equal by their digests, without parsing them and running compare_valid_func
+    (replicas returning the same value usually write identical files). Other results are parsed and compared
+    by compare_valid_func, see comparative_validation. Temporary errors are TEMP_ERROR as in initial_verdict.
+    """
+    try:
+        if identical_results(file_1, file_2):
+            count_validation('compare', fast_path=True)
+            logger.info(f"Comparative validation: result_id {result_id_1} and {result_id_2} for task_id {task_id} "
+                        "are identical")
+            return ExitCode.ACCEPTED
+        result_status_1, result_1 = deserialize_result(file_1)
+        result_status_2, result_2 = deserialize_result(file_2)
+        if (result_status_1 == FUSED_RESULT_MARKER) != (result_status_2 == FUSED_RESULT_MARKER):
+            logger.info(f"Comparative validation: only one of result_id {result_id_1} and {result_id_2} "
+                        f"for task_id {task_id} is fused; considered different")
+            return ExitCode.REJECTED
+        if result_status_1 == FUSED_RESULT_MARKER:
+            return fused_comparative_validation(task_id, result_id_1, result_1, result_id_2, result_2)
+        valid_func = get_valid_func(task_id, 'compare')
+        return comparative_validation(task_id, valid_func,
+                                      result_id_1, result_status_1, result_1,
+                                      result_id_2, result_status_2, result_2)
+    except SystemExit as e:
+        return ExitCode(e.code)
+    except (mysql.connector.Error, OSError) as e:
+        logger.warning(f"Temporary error, the validation is retried later: {e}")
+        return ExitCode.TEMP_ERROR
+    except Exception as e:
+        logger.error(f"Unknown internal error: {e}")
+        return ExitCode.OTHER_ERROR
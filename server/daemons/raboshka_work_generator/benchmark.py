@@ -0,0 +1,122 @@
+"""
+Benchmark of BOINC work unit creation: the per-task subprocess path (bin/stage_file and bin/create_work
+for every task) against the bulk path (in-process staging and one create_work --stdin per batch).
+
+Run inside the server container, from the daemons directory:
+    python3 -m raboshka_work_generator.benchmark --flavor 39754ae2661e5b7b2b776bcd8e4717cc --tasks 200
+
+The created work units are cancelled at the end, so volunteers never receive them.
+"""
+import os
+import time
+import uuid
+import argparse
+import logging
+
+from gened_proto.task_service import task_service_pb2
+from blob_store import open_blob_store
+
+from .utils import get_env_or_die
+from .database import database
+from .work_creator import WorkCreator
+
+logger = logging.getLogger(__name__)
+
+# see html/inc/common_defs.inc in BOINC
+RESULT_SERVER_STATE_UNSENT = 2
+RESULT_SERVER_STATE_OVER = 5
+RESULT_OUTCOME_DIDNT_NEED = 5
+WU_ERROR_CANCELLED = 16
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark BOINC work unit creation")
+    parser.add_argument('--flavor', required=True, help='Flavor of an existing raboshka app')
+    parser.add_argument('--tasks', type=int, default=200, help='Number of work units per backend')
+    parser.add_argument('--call-spec-size', type=int, default=64 * 1024, help='Size of every call_spec in bytes')
+    parser.add_argument('--batch-size', type=int, default=100, help='Batch size of the bulk path')
+    return parser.parse_args()
+
+
+def make_works(args):
+    redundancy_options = task_service_pb2.RedundancyOptions(
+        min_quorum=1, target_nresults=1, max_error_results=1,
+        max_total_results=1, max_success_results=1, delay_bound=300,
+    )
+    return [
+        (f'bench_{uuid.uuid4().hex}', args.flavor, os.urandom(args.call_spec_size), None, [],
+         redundancy_options)
+        for _ in range(args.tasks)
+    ]
+
+
+def bench_subprocess(work_creator, works):
+    failed = 0
+    start = time.perf_counter()
+    for work in works:
+        try:
+            task_id, flavor, call_spec, _, _, redundancy_options = work
+            work_creator.create_work(task_id, flavor, call_spec, redundancy_options)
+        except RuntimeError:
+            failed += 1
+    return time.perf_counter() - start, failed
+
+
+def bench_bulk(work_creator, works, batch_size):
+    failed = 0
+    start = time.perf_counter()
+    for begin in range(0, len(works), batch_size):
+        failed += len(work_creator.create_works(works[begin:begin + batch_size]))
+    return time.perf_counter() - start, failed
+
+
+def cancel_works(names):
+    """Cancel benchmark work units the same way bin/cancel_jobs does."""
+    with database.get_cursor() as cursor:
+        placeholders = ', '.join(['%s'] * len(names))
+        cursor.execute(f"SELECT id FROM workunit WHERE name IN ({placeholders})", tuple(names))
+        wu_ids = [row['id'] for row in cursor.fetchall()]
+        if not wu_ids:
+            return
+        placeholders = ', '.join(['%s'] * len(wu_ids))
+        cursor.execute(f"""
+            UPDATE result SET server_state = %s, outcome = %s
+            WHERE server_state = %s AND workunitid IN ({placeholders})
+        """, (RESULT_SERVER_STATE_OVER, RESULT_OUTCOME_DIDNT_NEED, RESULT_SERVER_STATE_UNSENT) + tuple(wu_ids))
+        cursor.execute(f"""
+            UPDATE workunit SET error_mask = error_mask | %s, transition_time = UNIX_TIMESTAMP()
+            WHERE id IN ({placeholders})
+        """, (WU_ERROR_CANCELLED,) + tuple(wu_ids))
+
+
+def main():
+    logging.basicConfig(
+        level=logging.WARNING,
+        format="%(asctime)s %(name)s %(levelname)s: %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S"
+    )
+    args = parse_args()
+
+    project_dir = get_env_or_die('PROJECT_DIR')
+    tmp_dir = os.path.join(project_dir, 'raboshka_stage_tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+    work_creator = WorkCreator(project_dir, tmp_dir, open_blob_store(project_dir))
+
+    results = {}
+    for name, bench in [
+        ('subprocess', lambda works: bench_subprocess(work_creator, works)),
+        ('bulk', lambda works: bench_bulk(work_creator, works, args.batch_size)),
+    ]:
+        works = make_works(args)
+        try:
+            results[name] = bench(works)
+        finally:
+            cancel_works([work[0] for work in works])
+
+    print(f"{'backend':<12}{'work units':>12}{'failed':>8}{'seconds':>10}{'wu/sec':>10}")
+    for name, (elapsed, failed) in results.items():
+        print(f"{name:<12}{args.tasks:>12}{failed:>8}{elapsed:>10.2f}{args.tasks / elapsed:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
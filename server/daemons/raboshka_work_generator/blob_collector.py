@@ -0,0 +1,78 @@
+import time
+import logging
+import threading
+
+from .database import database
+
+logger = logging.getLogger(__name__)
+
+
+class BlobCollector:
+    """
+    Background stage deleting the call_spec and result blobs of finished tasks from the blob store once their
+    retention is over, without it the blob store grows with every task.
+    Retention policy: blobs of a task are kept for retention seconds after the task finished, long enough for
+    the client to fetch its result. Then the task is released: a result it had is gone and polling the task
+    returns SYSTEM_ERROR saying so. A blob is deleted only if no task that is not released references it
+    (blobs are content-addressed and may be shared) and it was not stored again in the last grace seconds,
+    e.g. uploaded again for a new task. Uploaded objects are unstaged by ObjectCollector, they stay in the store.
+    """
+    def __init__(self, blob_store, interval, retention, grace, batch_size):
+        self.blob_store = blob_store
+        self.interval = interval
+        self.retention = retention
+        self.grace = grace
+        self.batch_size = batch_size
+        self._thread = threading.Thread(target=self._run, name='blob_collector', daemon=True)
+        self.released_tasks = 0
+        self.deleted_blobs = 0
+
+    def start(self):
+        if self.retention <= 0:
+            logger.info("Blob collector is disabled, blobs of finished tasks are kept forever")
+            return
+        logger.info(f"Starting blob collector every {self.interval} s with retention {self.retention} s")
+        self._thread.start()
+
+    def stats(self):
+        return {
+            'blob_collector.released_tasks': self.released_tasks,
+            'blob_collector.deleted_blobs': self.deleted_blobs,
+        }
+
+    def collect(self):
+        """
+        Release up to batch_size expired tasks and delete their blobs no other task needs.
+        Blobs are deleted before the tasks are released, so that a failure leaves the tasks to the next pass
+        rather than blobs nobody knows about. Returns the number of released tasks, None on database error.
+        """
+        rows = database.get_expired_tasks(self.retention, self.batch_size)
+        if not rows:
+            return None if rows is None else 0
+        task_ids = [row['task_id'] for row in rows]
+        digests = {digest for row in rows for digest in (row['call_spec_digest'], row['result_digest']) if digest}
+        if digests:
+            referenced = database.get_referenced_blobs(digests, task_ids)
+            if referenced is None:
+                return None
+            for digest in digests - referenced:
+                if self.blob_store.delete(digest, self.grace):
+                    self.deleted_blobs += 1
+        error_message = (f"Task result expired, results are kept for {self.retention:.0f} seconds "
+                         "after the task finished")
+        if not database.release_task_blobs(task_ids, error_message):
+            return None
+        self.released_tasks += len(task_ids)
+        return len(task_ids)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                while True:
+                    released = self.collect()
+                    # a full batch means more expired tasks may be waiting
+                    if released is None or released < self.batch_size:
+                        break
+            except Exception as e:
+                logger.error(f"Unexpected error collecting expired blobs: {e}")
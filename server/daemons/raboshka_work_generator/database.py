@@ -6,14 +6,20 @@ from contextlib import contextmanager
 
 from gened_proto.task_service import task_service_pb2
 
-from .utils import get_env_or_die
+from .utils import get_env_or_die, get_rpc_db_pool_size, get_work_creator_parallelism
 
 logger = logging.getLogger(__name__)
 
+# see LOCALITY_SCHED_LITE in db/boinc_db_types.h in BOINC
+LOCALITY_SCHED_LITE = 1
+
 class Database:
     def __init__(self):
         try:
-            pool_size = int(get_env_or_die('TASK_SERVICE_POOL_SIZE'))
+            # RPC handlers use up to get_rpc_db_pool_size() connections at once,
+            # the work pipeline uses one per parallel batch and one for its dispatcher,
+            # the task events listener uses one
+            pool_size = get_rpc_db_pool_size() + get_work_creator_parallelism() + 2
             self.pool = pooling.MySQLConnectionPool(
                 pool_name="task_service_pool",
                 pool_size=pool_size,
@@ -76,21 +82,271 @@ class Database:
                     except Exception as e:
                         logger.warning(f"Error while closing cursor: {e}")
     
-    def create_task(self, task_id, call_spec, init_valid_func, compare_valid_func, task_status):
+    def create_task(self, task_id, flavor, call_spec, call_spec_digest, object_digests, init_valid_func,
+                    compare_valid_func, redundancy_options, task_status):
+        return self.create_tasks(
+            [(task_id, flavor, call_spec, call_spec_digest, object_digests, init_valid_func, compare_valid_func,
+              redundancy_options)],
+            task_status
+        )
+    
+    def create_tasks(self, tasks, task_status, group_id=None):
+        """
+        Insert many tasks in a single multi-row transaction.
+        tasks: list of (task_id, flavor, call_spec, call_spec_digest, object_digests, init_valid_func,
+        compare_valid_func, redundancy_options) tuples, call_spec is None if call_spec_digest refers to it
+        in the blob store, object_digests is a space separated string or None
+        group_id: if set, the tasks form a fused group run in one work unit named group_id
+        """
         try:
             with self.get_cursor() as cursor:
                 query = """
                 INSERT INTO task_data (
-                    task_id, call_spec, init_valid_func, compare_valid_func, task_status
-                ) VALUES (%s, %s, %s, %s, %s)
+                    task_id, flavor, group_id, group_index, redundancy_options, task_status
+                ) VALUES (%s, %s, %s, %s, %s, %s)
+                """
+                cursor.executemany(query, [
+                    (task_id, flavor, group_id, None if group_id is None else group_index, redundancy_options,
+                     task_status)
+                    for group_index, (task_id, flavor, _, _, _, _, _, redundancy_options) in enumerate(tasks)
+                ])
+                query = """
+                INSERT INTO task_blob (
+                    task_id, call_spec, call_spec_digest, object_digests, init_valid_func, compare_valid_func
+                ) VALUES (%s, %s, %s, %s, %s, %s)
                 """
-                cursor.execute(query, (task_id, call_spec, init_valid_func, compare_valid_func, task_status))
-                logger.info(f"Created task {task_id} in database")
+                cursor.executemany(query, [
+                    (task_id, call_spec, call_spec_digest, object_digests, init_valid_func, compare_valid_func)
+                    for task_id, _, call_spec, call_spec_digest, object_digests, init_valid_func, compare_valid_func, _
+                    in tasks
+                ])
+                task_objects = [
+                    (task_id, digest)
+                    for task_id, _, _, _, object_digests, _, _, _ in tasks if object_digests
+                    for digest in dict.fromkeys(object_digests.split())
+                ]
+                if task_objects:
+                    query = "INSERT INTO task_object (task_id, digest) VALUES (%s, %s)"
+                    cursor.executemany(query, task_objects)
+                logger.info(f"Created {len(tasks)} tasks in database")
                 return True
         except (mysql.connector.Error, Exception) as e:
-            logger.error(f"Database error creating task {task_id}: {e}")
+            logger.error(f"Database error creating {len(tasks)} tasks: {e}")
             return False
-    
+
+    def get_pending_work_units(self, limit):
+        """
+        Names of the oldest work units to create for PENDING tasks: the task_id of a task with its own
+        work unit, the group_id of a fused group.
+        """
+        try:
+            with self.get_cursor(dictionary=False) as cursor:
+                query = """
+                SELECT COALESCE(group_id, task_id) AS wu_name
+                FROM task_data
+                WHERE task_status = %s
+                GROUP BY wu_name
+                ORDER BY MIN(created_at)
+                LIMIT %s
+                """
+                cursor.execute(query, (task_service_pb2.TaskStatus.PENDING, limit))
+                return [row[0] for row in cursor.fetchall()]
+        except (mysql.connector.Error, Exception) as e:
+            logger.error(f"Database error retrieving pending work units: {e}")
+            return None
+
+    def get_pending_tasks(self, wu_names):
+        """
+        Everything needed to create the given work units of PENDING tasks,
+        tasks of fused groups come in group_index order.
+        """
+        try:
+            with self.get_cursor() as cursor:
+                placeholders = ', '.join(['%s'] * len(wu_names))
+                query = f"""
+                SELECT task_data.task_id, flavor, group_id, group_index,
+                       call_spec, call_spec_digest, object_digests, redundancy_options
+                FROM task_data JOIN task_blob ON task_blob.task_id = task_data.task_id
+                WHERE task_status = %s AND (task_data.task_id IN ({placeholders}) OR group_id IN ({placeholders}))
+                ORDER BY group_id, group_index
+                """
+                cursor.execute(query, (task_service_pb2.TaskStatus.PENDING,) + tuple(wu_names) + tuple(wu_names))
+                return cursor.fetchall()
+        except (mysql.connector.Error, Exception) as e:
+            logger.error(f"Database error retrieving pending tasks: {e}")
+            return None
+
+    def count_pending_tasks(self):
+        try:
+            with self.get_cursor(dictionary=False) as cursor:
+                query = "SELECT COUNT(*) FROM task_data WHERE task_status = %s"
+                cursor.execute(query, (task_service_pb2.TaskStatus.PENDING,))
+                return cursor.fetchone()[0]
+        except (mysql.connector.Error, Exception) as e:
+            logger.error(f"Database error counting pending tasks: {e}")
+            return None
+
+    def get_existing_workunits(self, names):
+        """Names among the given ones that already have a BOINC work unit."""
+        try:
+            with self.get_cursor(dictionary=False) as cursor:
+                query = f"SELECT name FROM workunit WHERE name IN ({', '.join(['%s'] * len(names))})"
+                cursor.execute(query, tuple(names))
+                return {row[0] for row in cursor.fetchall()}
+        except (mysql.connector.Error, Exception) as e:
+            logger.error(f"Database error retrieving work units: {e}")
+            return None
+
+    def enable_locality_scheduling(self, appname):
+        """
+        Turn on locality scheduling lite for the BOINC app: the scheduler prefers sending its jobs to hosts
+        that already hold their sticky input files.
+        """
+        try:
+            with self.get_cursor() as cursor:
+                query = "UPDATE app SET locality_scheduling = %s WHERE name = %s AND locality_scheduling <> %s"
+                cursor.execute(query, (LOCALITY_SCHED_LITE, appname, LOCALITY_SCHED_LITE))
+                if cursor.rowcount:
+                    logger.info(f"Enabled locality scheduling lite for app {appname}")
+                return True
+        except (mysql.connector.Error, Exception) as e:
+            logger.error(f"Database error enabling locality scheduling for app {appname}: {e}")
+            return False
+
+    def touch_staged_objects(self, digests):
+        """Record that work units referencing the objects are being created, so they are not unstaged meanwhile."""
+        try:
+            with self.get_cursor() as cursor:
+                query = """
+                INSERT INTO staged_object (digest) VALUES (%s)
+                ON DUPLICATE KEY UPDATE used_at = CURRENT_TIMESTAMP(3)
+                """
+                cursor.executemany(query, [(digest,) for digest in digests])
+                return True
+        except (mysql.connector.Error, Exception) as e:
+            logger.error(f"Database error touching {len(digests)} staged objects: {e}")
+            return False
+
+    def get_unused_staged_objects(self, older_than, limit):
+        """
+        Digests of staged objects not used for older_than seconds that no PENDING or RUNNING task references,
+        task_object holds the references of unfinished tasks only.
+        """
+        try:
+            with self.get_cursor(dictionary=False) as cursor:
+                query = """
+                SELECT digest FROM staged_object
+                WHERE used_at < NOW(3) - INTERVAL %s SECOND
+                  AND NOT EXISTS (SELECT 1 FROM task_object WHERE task_object.digest = staged_object.digest)
+                ORDER BY used_at
+                LIMIT %s
+                """
+                cursor.execute(query, (older_than, limit))
+                return {row[0] for row in cursor.fetchall()}
+        except (mysql.connector.Error, Exception) as e:
+            logger.error(f"Database error retrieving unused staged objects: {e}")
+            return None
+
+    def delete_staged_object(self, digest, older_than):
+        """Forget the staged object unless it was used in the last older_than seconds, True if it was deleted."""
+        try:
+            with self.get_cursor() as cursor:
+                query = "DELETE FROM staged_object WHERE digest = %s AND used_at < NOW(3) - INTERVAL %s SECOND"
+                cursor.execute(query, (digest, older_than))
+                return cursor.rowcount > 0
+        except (mysql.connector.Error, Exception) as e:
+            logger.error(f"Database error deleting staged object {digest}: {e}")
+            return False
+
+    def get_expired_tasks(self, retention, limit):
+        """
+        Rows (task_id, call_spec_digest, result_digest) of the tasks that finished more than retention seconds ago
+        and whose blobs are not released yet, oldest first.
+        """
+        try:
+            with self.get_cursor() as cursor:
+                query = """
+                SELECT task_data.task_id, call_spec_digest, result_digest
+                FROM task_data JOIN task_blob ON task_blob.task_id = task_data.task_id
+                WHERE task_status = %s AND blobs_released_at IS NULL AND finished_at < NOW(3) - INTERVAL %s SECOND
+                ORDER BY finished_at
+                LIMIT %s
+                """
+                cursor.execute(query, (task_service_pb2.TaskStatus.FINISHED, retention, limit))
+                return cursor.fetchall()
+        except (mysql.connector.Error, Exception) as e:
+            logger.error(f"Database error retrieving expired tasks: {e}")
+            return None
+
+    def get_referenced_blobs(self, digests, exclude_task_ids):
+        """
+        Digests among the given ones that are still needed: the call_spec or result of a task whose blobs are
+        not released (except exclude_task_ids), an object of an unfinished task or a staged object.
+        """
+        try:
+            with self.get_cursor(dictionary=False) as cursor:
+                digest_list = ', '.join(['%s'] * len(digests))
+                exclude_list = ', '.join(['%s'] * len(exclude_task_ids))
+                query = f"""
+                SELECT result_digest FROM task_data
+                WHERE result_digest IN ({digest_list}) AND task_id NOT IN ({exclude_list})
+                UNION
+                SELECT call_spec_digest FROM task_blob JOIN task_data ON task_data.task_id = task_blob.task_id
+                WHERE call_spec_digest IN ({digest_list}) AND blobs_released_at IS NULL
+                  AND task_blob.task_id NOT IN ({exclude_list})
+                UNION
+                SELECT digest FROM task_object WHERE digest IN ({digest_list})
+                UNION
+                SELECT digest FROM staged_object WHERE digest IN ({digest_list})
+                """
+                digests, exclude_task_ids = tuple(digests), tuple(exclude_task_ids)
+                cursor.execute(query, digests + exclude_task_ids + digests + exclude_task_ids + digests + digests)
+                return {row[0] for row in cursor.fetchall()}
+        except (mysql.connector.Error, Exception) as e:
+            logger.error(f"Database error retrieving referenced blobs: {e}")
+            return None
+
+    def release_task_blobs(self, task_ids, error_message):
+        """
+        Mark the blobs of the finished tasks as released. Tasks that had a result in the blob store
+        are turned into SYSTEM_ERROR with error_message, their result is gone.
+        """
+        try:
+            with self.get_cursor() as cursor:
+                # assignments are applied left to right, result_digest is cleared last
+                query = f"""
+                UPDATE task_data
+                SET blobs_released_at = CURRENT_TIMESTAMP(3),
+                    result_status = IF(result_digest IS NULL, result_status, %s),
+                    error_message = IF(result_digest IS NULL, error_message, %s),
+                    result_size = NULL,
+                    result_digest = NULL
+                WHERE task_id IN ({', '.join(['%s'] * len(task_ids))})
+                """
+                cursor.execute(query, (task_service_pb2.ResultStatus.SYSTEM_ERROR, error_message) + tuple(task_ids))
+                logger.info(f"Released blobs of {len(task_ids)} finished tasks")
+                return True
+        except (mysql.connector.Error, Exception) as e:
+            logger.error(f"Database error releasing blobs of {len(task_ids)} tasks: {e}")
+            return False
+
+    def set_tasks_running(self, task_ids):
+        """Move PENDING tasks to RUNNING once their work units are created."""
+        try:
+            with self.get_cursor() as cursor:
+                query = f"""
+                UPDATE task_data
+                SET task_status = %s
+                WHERE task_status = %s AND task_id IN ({', '.join(['%s'] * len(task_ids))})
+                """
+                cursor.execute(query, (task_service_pb2.TaskStatus.RUNNING,
+                                       task_service_pb2.TaskStatus.PENDING) + tuple(task_ids))
+                logger.info(f"Set {len(task_ids)} tasks to RUNNING")
+                return True
+        except (mysql.connector.Error, Exception) as e:
+            logger.error(f"Database error setting {len(task_ids)} tasks to RUNNING: {e}")
+            return False
+
     def set_task_failed(self, task_id, error_message):
         task_status = task_service_pb2.TaskStatus.FINISHED
         result_status = task_service_pb2.ResultStatus.SYSTEM_ERROR
@@ -98,34 +354,133 @@ class Database:
             with self.get_cursor() as cursor:
                 query = """
                 UPDATE task_data
-                SET task_status = %s, result_status = %s, error_message = %s
+                SET task_status = %s, result_status = %s, error_message = %s, finished_at = CURRENT_TIMESTAMP(3)
                 WHERE task_id = %s
                 """
                 cursor.execute(query, (task_status, result_status, error_message, task_id))
+                self._delete_task_objects(cursor, [task_id])
                 logger.info(f"Set task {task_id} to FAILED: {error_message}")
                 return True
         except (mysql.connector.Error, Exception) as e:
             logger.error(f"Database error setting task {task_id} to FAILED: {e}")
             return False
     
-    def get_task_status(self, task_id):
+    def set_tasks_failed(self, errors):
+        """errors: dict task_id -> error_message"""
+        task_status = task_service_pb2.TaskStatus.FINISHED
+        result_status = task_service_pb2.ResultStatus.SYSTEM_ERROR
         try:
             with self.get_cursor() as cursor:
                 query = """
-                SELECT returned, task_status, result_status, error_message
-                FROM task_data
+                UPDATE task_data
+                SET task_status = %s, result_status = %s, error_message = %s, finished_at = CURRENT_TIMESTAMP(3)
                 WHERE task_id = %s
                 """
-                cursor.execute(query, (task_id,))
-                row = cursor.fetchone()
-                if row:
-                    logger.info(f"Retrieved task {task_id} from database")
-                else:
-                    logger.info(f"Task {task_id} not found in database")
-                return row
-        except (mysql.connector.Error, Exception) as e:
-            logger.error(f"Database error retrieving task {task_id}: {e}")
+                cursor.executemany(query, [
+                    (task_status, result_status, error_message, task_id)
+                    for task_id, error_message in errors.items()
+                ])
+                self._delete_task_objects(cursor, list(errors))
+                logger.info(f"Set {len(errors)} tasks to FAILED")
+                return True
+        except (mysql.connector.Error, Exception) as e:
+            logger.error(f"Database error setting {len(errors)} tasks to FAILED: {e}")
+            return False
+
+    @staticmethod
+    def _delete_task_objects(cursor, task_ids):
+        """Finished tasks no longer keep their objects staged."""
+        query = "DELETE FROM task_object WHERE task_id = %s"
+        cursor.executemany(query, [(task_id,) for task_id in task_ids])
+
+    def get_task_status(self, task_id):
+        rows = self.get_tasks_status([task_id])
+        if rows is None:
+            return None
+        row = rows.get(task_id)
+        if row:
+            logger.info(f"Retrieved task {task_id} from database")
+        else:
+            logger.info(f"Task {task_id} not found in database")
+        return row
+
+    def get_tasks_status(self, task_ids, chunk_size=1000):
+        """
+        Status of many tasks at once (a primary key lookup per chunk of task_ids).
+        Statuses come from the small task_data rows only. Results are referenced by result_digest in the blob store,
+        only results stored before the blob store are fetched from task_blob, and just for the tasks FINISHED with SUCCESS.
+        Returns dict task_id -> row, unknown tasks are absent.
+        """
+        try:
+            rows = {}
+            with self.get_cursor() as cursor:
+                for begin in range(0, len(task_ids), chunk_size):
+                    chunk = task_ids[begin:begin + chunk_size]
+                    query = f"""
+                    SELECT task_id, task_status, result_status, result_digest, result_size, runtime, error_message
+                    FROM task_data
+                    WHERE task_id IN ({', '.join(['%s'] * len(chunk))})
+                    """
+                    cursor.execute(query, tuple(chunk))
+                    for row in cursor.fetchall():
+                        row['returned'] = None
+                        rows[row['task_id']] = row
+
+                with_returned = [
+                    task_id for task_id, row in rows.items()
+                    if row['task_status'] == task_service_pb2.TaskStatus.FINISHED
+                    and row['result_status'] == task_service_pb2.ResultStatus.SUCCESS
+                    and row['result_digest'] is None
+                ]
+                for begin in range(0, len(with_returned), chunk_size):
+                    chunk = with_returned[begin:begin + chunk_size]
+                    query = f"""
+                    SELECT task_id, returned
+                    FROM task_blob
+                    WHERE task_id IN ({', '.join(['%s'] * len(chunk))})
+                    """
+                    cursor.execute(query, tuple(chunk))
+                    for row in cursor.fetchall():
+                        rows[row['task_id']]['returned'] = row['returned']
+            logger.debug(f"Retrieved {len(rows)} of {len(task_ids)} tasks from database")
+            return rows
+        except (mysql.connector.Error, Exception) as e:
+            logger.error(f"Database error retrieving {len(task_ids)} tasks: {e}")
             return None
 
+    def get_last_task_event_id(self):
+        """Id of the latest task finished event, 0 if there are none."""
+        try:
+            with self.get_cursor(dictionary=False) as cursor:
+                cursor.execute("SELECT COALESCE(MAX(id), 0) FROM task_event")
+                return cursor.fetchone()[0]
+        except (mysql.connector.Error, Exception) as e:
+            logger.error(f"Database error retrieving the last task event: {e}")
+            return None
+
+    def get_task_events(self, after_id, limit):
+        """Task finished events with ids greater than after_id as (id, task_id) in id order."""
+        try:
+            with self.get_cursor(dictionary=False) as cursor:
+                query = "SELECT id, task_id FROM task_event WHERE id > %s ORDER BY id LIMIT %s"
+                cursor.execute(query, (after_id, limit))
+                return cursor.fetchall()
+        except (mysql.connector.Error, Exception) as e:
+            logger.error(f"Database error retrieving task events after {after_id}: {e}")
+            return None
+
+    def delete_task_events(self, older_than):
+        """Drop task finished events created more than older_than seconds ago."""
+        try:
+            with self.get_cursor() as cursor:
+                query = "DELETE FROM task_event WHERE created_at < NOW(3) - INTERVAL %s SECOND"
+                cursor.execute(query, (older_than,))
+                if cursor.rowcount:
+                    logger.info(f"Deleted {cursor.rowcount} old task events")
+                return True
+        except (mysql.connector.Error, Exception) as e:
+            logger.error(f"Database error deleting old task events: {e}")
+            return False
+
 # Singleton
 database = Database()
@@ -0,0 +1,25 @@
+import pickle
+
+# must be the same as in workers/src/raboshka/main.py
+FUSED_CALL_SPECS_KEY = 'fused_call_specs'
+
+
+def fuse_call_specs(members):
+    """
+    Pack the call_specs of a fused group into the call_spec of its work unit.
+    members: list of (call_spec, object_digests) in group_index order
+
+    Objects referenced by several members are staged once, every member gets the map from its own
+    ref indices to the ref indices of the work unit.
+    Returns (call_spec, object_digests) of the work unit.
+    """
+    object_digests = []
+    fused = []
+    for call_spec, digests in members:
+        refs = []
+        for digest in digests:
+            if digest not in object_digests:
+                object_digests.append(digest)
+            refs.append(object_digests.index(digest))
+        fused.append({'call_spec': call_spec, 'refs': refs})
+    return pickle.dumps({FUSED_CALL_SPECS_KEY: fused}, protocol=pickle.HIGHEST_PROTOCOL), object_digests
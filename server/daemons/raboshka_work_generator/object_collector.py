@@ -0,0 +1,44 @@
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class ObjectCollector:
+    """
+    Background stage unstaging the object files of the download directory that no unfinished task needs anymore.
+    BOINC does not delete them (they are <no_delete/>, as every work unit referencing an object shares its file),
+    so without it the download directory grows with every uploaded object.
+    An object is unstaged once it was not used by new work units for grace seconds and no PENDING or RUNNING
+    task references it, a later task referencing it stages it again from the blob store.
+    """
+    def __init__(self, work_creator, interval, grace, batch_size):
+        self.work_creator = work_creator
+        self.interval = interval
+        self.grace = grace
+        self.batch_size = batch_size
+        self._thread = threading.Thread(target=self._run, name='object_collector', daemon=True)
+        self.unstaged = 0
+
+    def start(self):
+        logger.info(f"Starting object collector every {self.interval} s with grace {self.grace} s")
+        self._thread.start()
+
+    def stats(self):
+        return {
+            'object_collector.unstaged': self.unstaged,
+        }
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                while True:
+                    unstaged = self.work_creator.collect_objects(self.grace, self.batch_size)
+                    self.unstaged += unstaged or 0
+                    # a full batch means more unused objects may be waiting
+                    if unstaged is None or unstaged < self.batch_size:
+                        break
+            except Exception as e:
+                logger.error(f"Unexpected error collecting unused objects: {e}")
@@ -0,0 +1,122 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+from gened_proto.task_service import task_service_pb2
+
+logger = logging.getLogger(__name__)
+
+# Rough size of a cached row without its blobs
+ROW_OVERHEAD_BYTES = 256
+# Short-lived rows of not yet finished tasks are swept once there are more of them
+MAX_UNFINISHED_ENTRIES = 100_000
+
+
+class ResultCache:
+    """
+    Bounded in-memory cache of task_data rows served by PollTask(s) and WatchTasks.
+
+    FINISHED rows never change, they are kept until evicted in LRU order once their total size
+    exceeds max_bytes. Rows of not yet finished tasks are kept only for ttl seconds, and are
+    invalidated as soon as the task is known to change its status.
+    """
+    def __init__(self, max_bytes, ttl):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._finished = OrderedDict()  # task_id -> row, least recently used first
+        self._finished_bytes = 0
+        self._unfinished = {}  # task_id -> (expires_at, row)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, task_id):
+        with self._lock:
+            return self._get(task_id, time.monotonic())
+
+    def get_many(self, task_ids):
+        """Dict task_id -> row for the cached ones."""
+        now = time.monotonic()
+        with self._lock:
+            rows = {}
+            for task_id in task_ids:
+                row = self._get(task_id, now)
+                if row is not None:
+                    rows[task_id] = row
+            return rows
+
+    def put(self, task_id, row):
+        with self._lock:
+            self._put(task_id, row, time.monotonic())
+
+    def put_many(self, rows):
+        """rows: dict task_id -> row"""
+        now = time.monotonic()
+        with self._lock:
+            for task_id, row in rows.items():
+                self._put(task_id, row, now)
+
+    def invalidate(self, task_id):
+        with self._lock:
+            self._unfinished.pop(task_id, None)
+
+    def invalidate_many(self, task_ids):
+        with self._lock:
+            for task_id in task_ids:
+                self._unfinished.pop(task_id, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'result_cache.hits': self.hits,
+                'result_cache.misses': self.misses,
+                'result_cache.hit_rate': self.hits / lookups if lookups else 0.0,
+                'result_cache.evictions': self.evictions,
+                'result_cache.finished_entries': len(self._finished),
+                'result_cache.finished_bytes': self._finished_bytes,
+                'result_cache.unfinished_entries': len(self._unfinished),
+            }
+
+    def _get(self, task_id, now):
+        row = self._finished.get(task_id)
+        if row is not None:
+            self._finished.move_to_end(task_id)
+            self.hits += 1
+            return row
+        entry = self._unfinished.get(task_id)
+        if entry is not None:
+            expires_at, row = entry
+            if now < expires_at:
+                self.hits += 1
+                return row
+            del self._unfinished[task_id]
+        self.misses += 1
+        return None
+
+    def _put(self, task_id, row, now):
+        if row['task_status'] != task_service_pb2.TaskStatus.FINISHED:
+            if len(self._unfinished) >= MAX_UNFINISHED_ENTRIES:
+                self._unfinished = {
+                    key: entry for key, entry in self._unfinished.items() if now < entry[0]
+                }
+                if len(self._unfinished) >= MAX_UNFINISHED_ENTRIES:
+                    return
+            self._unfinished[task_id] = (now + self.ttl, row)
+            return
+        self._unfinished.pop(task_id, None)
+        size = self._row_size(row)
+        if size > self.max_bytes or task_id in self._finished:
+            return
+        self._finished[task_id] = row
+        self._finished_bytes += size
+        while self._finished_bytes > self.max_bytes:
+            _, evicted = self._finished.popitem(last=False)
+            self._finished_bytes -= self._row_size(evicted)
+            self.evictions += 1
+
+    @staticmethod
+    def _row_size(row):
+        return ROW_OVERHEAD_BYTES + len(row['returned'] or b'') + len(row['error_message'] or '')
@@ -0,0 +1,154 @@
+import os
+import time
+import socket
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+
+from .database import database
+
+logger = logging.getLogger(__name__)
+
+# must be the same as in raboshka_assimilator/task_events.py
+SOCKET_NAME = 'raboshka_task_events.sock'
+MAX_DATAGRAM_SIZE = 1024
+# Old events are dropped at most this often
+PRUNE_INTERVAL = 60.0
+
+
+class TaskEventsListener:
+    """
+    Consumes the task_event outbox, which the assimilator fills in the transaction that finishes the tasks,
+    and passes the ids of the finished tasks to the subscribers.
+
+    Events are read incrementally by id: right after a wake-up datagram the assimilator sends to the UNIX socket
+    once it committed, and every poll_interval seconds in case a datagram was lost (e.g. the work generator
+    was restarting). Events committed before the start are skipped, nothing is cached or watched yet.
+    """
+    def __init__(self, project_dir, poll_interval, batch_size, retention):
+        self.socket_path = os.path.join(project_dir, SOCKET_NAME)
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.retention = retention
+        self._subscribers = []
+        self._last_id = None
+        self._pruned_at = 0.0
+        self._thread = threading.Thread(target=self._run, name='task_events', daemon=True)
+        self.consumed = 0
+        self.wakeups = 0
+
+    def subscribe(self, callback):
+        """callback(task_ids) is called from the listener thread for every batch of finished tasks."""
+        self._subscribers.append(callback)
+
+    def start(self):
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)  # left by a previous run
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.bind(self.socket_path)
+        self._socket.settimeout(self.poll_interval)
+        self._last_id = database.get_last_task_event_id()
+        logger.info(f"Listening for task events at {self.socket_path} after event {self._last_id}")
+        self._thread.start()
+
+    def stats(self):
+        return {
+            'task_events.consumed': self.consumed,
+            'task_events.wakeups': self.wakeups,
+        }
+
+    def _run(self):
+        while True:
+            if self._wait():
+                self.wakeups += 1
+            try:
+                self._consume()
+                self._prune()
+            except Exception as e:
+                logger.error(f"Unexpected error consuming task events: {e}")
+
+    def _wait(self):
+        """Wait for a wake-up datagram or poll_interval, drain the others. True if woken up."""
+        try:
+            self._socket.recv(MAX_DATAGRAM_SIZE)
+        except socket.timeout:
+            return False
+        except OSError as e:
+            logger.error(f"Error receiving task events wake-up: {e}")
+            time.sleep(self.poll_interval)
+            return False
+        # a batch of events needs one read, however many assimilators woke us up
+        self._socket.setblocking(False)
+        try:
+            while True:
+                self._socket.recv(MAX_DATAGRAM_SIZE)
+        except (BlockingIOError, OSError):
+            pass
+        finally:
+            self._socket.settimeout(self.poll_interval)
+        return True
+
+    def _consume(self):
+        if self._last_id is None:
+            self._last_id = database.get_last_task_event_id()
+            return
+        while True:
+            events = database.get_task_events(self._last_id, self.batch_size)
+            if not events:
+                return
+            self._last_id = events[-1][0]
+            task_ids = [task_id for _, task_id in events]
+            self.consumed += len(task_ids)
+            logger.debug(f"Received {len(task_ids)} task finished events up to {self._last_id}")
+            for callback in self._subscribers:
+                try:
+                    callback(task_ids)
+                except Exception as e:
+                    logger.error(f"Error handling {len(task_ids)} task finished events: {e}")
+            if len(events) < self.batch_size:
+                return
+
+    def _prune(self):
+        now = time.monotonic()
+        if now - self._pruned_at >= PRUNE_INTERVAL:
+            self._pruned_at = now
+            database.delete_task_events(self.retention)
+
+
+class TaskWaiters:
+    """
+    Wakes up the coroutines waiting for tasks to finish, e.g. WatchTasks streams.
+    notify() is called from the task events listener thread, waiters live on the event loop.
+    """
+    def __init__(self):
+        self._loop = None
+        self._waiters = {}  # task_id -> set of asyncio.Queue
+
+    def bind(self, loop):
+        self._loop = loop
+
+    def notify(self, task_ids):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._notify, task_ids)
+
+    @contextmanager
+    def watch(self, task_ids):
+        """Queue receiving those of task_ids that finish while in the context."""
+        queue = asyncio.Queue()
+        for task_id in task_ids:
+            self._waiters.setdefault(task_id, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            for task_id in task_ids:
+                queues = self._waiters.get(task_id)
+                if queues is not None:
+                    queues.discard(queue)
+                    if not queues:
+                        del self._waiters[task_id]
+
+    def _notify(self, task_ids):
+        for task_id in task_ids:
+            for queue in self._waiters.get(task_id, ()):
+                queue.put_nowait(task_id)
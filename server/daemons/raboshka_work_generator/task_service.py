@@ -1,36 +1,107 @@
 import os
 import uuid
+import zlib
+import asyncio
 import logging
+import functools
 from concurrent import futures
 
 import grpc
 from gened_proto.task_service import task_service_pb2, task_service_pb2_grpc
+from blob_store import open_blob_store, BlobNotFoundError, CHUNK_SIZE
 
-from .utils import get_env_or_die
+from .utils import get_env_or_die, get_rpc_db_pool_size, get_work_creator_parallelism
 from .database import database
 from .work_creator import WorkCreator
+from .work_pipeline import WorkPipeline
+from .object_collector import ObjectCollector
+from .blob_collector import BlobCollector
+from .result_cache import ResultCache
+from .task_events import TaskEventsListener, TaskWaiters
 
 logger = logging.getLogger(__name__)
 
+# The result file starts with the result status digit, see save_result in workers/src/raboshka/main.py
+RESULT_HEADER_SIZE = 1
+
 class TaskService(task_service_pb2_grpc.TaskServiceServicer):
+    """
+    Asynchronous (grpc.aio) task service.
+    RPCs are served on the event loop, so streams and idle pollers cost no threads. Blocking database calls
+    run on a dedicated executor sized by the database pool, BOINC work units are created by the work pipeline.
+    """
     def __init__(self):
         self.project_dir = get_env_or_die('PROJECT_DIR')
         self.tmp_dir = os.path.join(self.project_dir, 'raboshka_stage_tmp')
         os.makedirs(self.tmp_dir, exist_ok=True)
-        self.work_creator = WorkCreator(self.project_dir, self.tmp_dir)
+        self.blob_store = open_blob_store(self.project_dir)
+        self.work_creator = WorkCreator(self.project_dir, self.tmp_dir, self.blob_store)
+        self.result_cache = ResultCache(
+            max_bytes=int(os.getenv('RESULT_CACHE_MAX_BYTES', str(256 * 1024 * 1024))),
+            ttl=float(os.getenv('RESULT_CACHE_TTL', '2.0')),
+        )
+        self.task_events = TaskEventsListener(
+            self.project_dir,
+            poll_interval=float(os.getenv('TASK_EVENTS_POLL_INTERVAL', '5.0')),
+            batch_size=int(os.getenv('TASK_EVENTS_BATCH_SIZE', '1000')),
+            retention=float(os.getenv('TASK_EVENTS_RETENTION', '3600')),
+        )
+        self.task_waiters = TaskWaiters()
+        # stale rows are dropped before the waiters read them again
+        self.task_events.subscribe(self.result_cache.invalidate_many)
+        self.task_events.subscribe(self.task_waiters.notify)
+        self.work_pipeline = WorkPipeline(
+            self.work_creator,
+            self.result_cache,
+            batch_size=int(os.getenv('WORK_PIPELINE_BATCH_SIZE', '100')),
+            idle_interval=float(os.getenv('WORK_PIPELINE_IDLE_INTERVAL', '5.0')),
+            parallelism=get_work_creator_parallelism(),
+        )
+        self.object_collector = ObjectCollector(
+            self.work_creator,
+            interval=float(os.getenv('OBJECT_COLLECTOR_INTERVAL', '600')),
+            grace=float(os.getenv('OBJECT_COLLECTOR_GRACE', '3600')),
+            batch_size=int(os.getenv('OBJECT_COLLECTOR_BATCH_SIZE', '1000')),
+        )
+        self.blob_collector = BlobCollector(
+            self.blob_store,
+            interval=float(os.getenv('BLOB_COLLECTOR_INTERVAL', '3600')),
+            retention=float(os.getenv('BLOB_RETENTION', str(7 * 24 * 3600))),
+            grace=float(os.getenv('BLOB_COLLECTOR_GRACE', '3600')),
+            batch_size=int(os.getenv('BLOB_COLLECTOR_BATCH_SIZE', '1000')),
+        )
+        self.db_executor = futures.ThreadPoolExecutor(
+            max_workers=get_rpc_db_pool_size(),
+            thread_name_prefix='task_service_db',
+        )
+        self.watch_interval = float(os.getenv('TASK_SERVICE_WATCH_INTERVAL', '5.0'))
+        self.chunk_size = int(os.getenv('TASK_SERVICE_CHUNK_SIZE', str(CHUNK_SIZE)))
+        self.inline_result_max_bytes = int(os.getenv('TASK_SERVICE_INLINE_RESULT_MAX_BYTES', str(4 * 1024 * 1024)))
 
-    def CreateTask(self, request, context):
+    async def CreateTask(self, request, context):
+        """
+        Handle CreateTask request:
+        Store the task as PENDING, its BOINC work unit is created in the background by the work pipeline
+        """
         # Step 1: Generate task_id
         task_id = uuid.uuid4().hex
         logger.info(f"CreateTask request: generated task_id={task_id}")
 
+        if not await self._check_blobs([request], context):
+            return task_service_pb2.CreateTaskResponse(task_id="")
+
         # Step 2: Insert task into database
-        success = database.create_task(
+        success = await self._run_db(
+            database.create_task,
             task_id=task_id,
-            call_spec=request.call_spec,
+            flavor=request.flavor,
+            call_spec=None if request.call_spec_digest else request.call_spec,
+            call_spec_digest=request.call_spec_digest or None,
+            object_digests=' '.join(request.object_digests) or None,
             init_valid_func=request.init_valid_func,
             compare_valid_func=request.compare_valid_func,
-            task_status=task_service_pb2.TaskStatus.RUNNING
+            redundancy_options=request.redundancy_options.SerializeToString(),
+            task_status=task_service_pb2.TaskStatus.PENDING
         )
         if not success:
             error_msg = "Failed to create task in database"
@@ -39,61 +110,322 @@ class TaskService(task_service_pb2_grpc.TaskServiceServicer):
             context.set_code(grpc.StatusCode.INTERNAL)
             return task_service_pb2.CreateTaskResponse(task_id="")
 
-        # Step 3: Create BOINC work unit
-        try:
-            self.work_creator.create_work(task_id, request.flavor, request.call_spec, request.redundancy_options)
-            logger.info(f"BOINC work created for task_id={task_id}")
-        except Exception as e:
-            error_msg = str(e)
+        # Step 3: Let the work pipeline create BOINC work unit
+        self.work_pipeline.notify()
+
+        # Step 4: Return task_id
+        return task_service_pb2.CreateTaskResponse(task_id=task_id)
+
+    async def CreateTasks(self, request, context):
+        """
+        Handle CreateTasks request:
+        Same as CreateTask, but inserts all tasks in one transaction.
+        Tasks of a fused request form a group run in one work unit named by the generated group_id
+        """
+        # Step 1: Generate task_ids
+        task_ids = [uuid.uuid4().hex for _ in request.tasks]
+        group_id = uuid.uuid4().hex if request.fused else None
+        logger.info(f"CreateTasks request: generated {len(task_ids)} task_ids"
+                    + (f" fused into group {group_id}" if group_id else ""))
+
+        if request.fused and len({(task.flavor, task.redundancy_options.SerializeToString())
+                                  for task in request.tasks}) > 1:
+            error_msg = "Fused tasks must have the same flavor and redundancy_options"
+            logger.error(error_msg)
+            context.set_details(error_msg)
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            return task_service_pb2.CreateTasksResponse()
+
+        if not await self._check_blobs(request.tasks, context):
+            return task_service_pb2.CreateTasksResponse()
+
+        # Step 2: Insert tasks into database
+        success = await self._run_db(
+            database.create_tasks,
+            tasks=[
+                (task_id, task.flavor, None if task.call_spec_digest else task.call_spec,
+                 task.call_spec_digest or None, ' '.join(task.object_digests) or None,
+                 task.init_valid_func, task.compare_valid_func,
+                 task.redundancy_options.SerializeToString())
+                for task_id, task in zip(task_ids, request.tasks)
+            ],
+            task_status=task_service_pb2.TaskStatus.PENDING,
+            group_id=group_id
+        )
+        if not success:
+            error_msg = "Failed to create tasks in database"
             logger.error(error_msg)
             context.set_details(error_msg)
             context.set_code(grpc.StatusCode.INTERNAL)
-            # Mark task as failed in database, ignore database errors if any
-            database.set_task_failed(task_id, error_message=error_msg)
-            return task_service_pb2.CreateTaskResponse(task_id="")
+            return task_service_pb2.CreateTasksResponse()
 
-        # Step 4: Return task_id
-        return task_service_pb2.CreateTaskResponse(task_id=task_id)
+        # Step 3: Let the work pipeline create BOINC work units
+        self.work_pipeline.notify()
 
-    def PollTask(self, request, context):
+        # Step 4: Return task_ids
+        return task_service_pb2.CreateTasksResponse(tasks=[
+            task_service_pb2.CreateTaskResponse(task_id=task_id)
+            for task_id in task_ids
+        ])
+
+    async def PollTask(self, request, context):
         """
         Handle PollTask request:
         Lookup task data in database and return status
         """
         task_id = request.task_id
         logger.info(f"PollTask request received for task_id={task_id}")
-        task_data = database.get_task_status(task_id)
+        task_data = self.result_cache.get(task_id)
+        if task_data is None:
+            task_data = await self._run_db(database.get_task_status, task_id)
+            if task_data:
+                loaded = await self._load_results_or_abort({task_id: task_data}, context)
+                self.result_cache.put_many(loaded)
+        return self._make_poll_response(task_id, task_data)
+
+    async def PollTasks(self, request, context):
+        """
+        Handle PollTasks request:
+        Lookup data of all requested tasks in database with one query and return their statuses
+        """
+        task_ids = list(request.task_ids)
+        logger.info(f"PollTasks request received for {len(task_ids)} tasks")
+        tasks_data = await self._get_tasks_data(task_ids, context)
+        if tasks_data is None:
+            error_msg = "Failed to retrieve tasks from database"
+            context.set_details(error_msg)
+            context.set_code(grpc.StatusCode.INTERNAL)
+            return task_service_pb2.PollTasksResponse()
+        return task_service_pb2.PollTasksResponse(tasks=[
+            self._make_poll_response(task_id, tasks_data.get(task_id))
+            for task_id in task_ids
+        ])
+
+    async def WatchTasks(self, request, context):
+        """
+        Handle WatchTasks request:
+        Stream the response for each task as soon as it is finished or turns out to be unknown.
+        Tasks are rechecked as soon as their task finished events arrive, all still watched tasks
+        are also rechecked with one query every watch_interval seconds in case an event is missed
+        """
+        watched = list(dict.fromkeys(request.task_ids))
+        logger.info(f"WatchTasks request received for {len(watched)} tasks")
+        with self.task_waiters.watch(watched) as finished:
+            to_check = watched
+            while watched:
+                tasks_data = await self._get_tasks_data(to_check, context)
+                if tasks_data is not None:
+                    done = set()
+                    for task_id in to_check:
+                        task_data = tasks_data.get(task_id)
+                        if not task_data or task_data['task_status'] == task_service_pb2.TaskStatus.FINISHED:
+                            done.add(task_id)
+                            yield self._make_poll_response(task_id, task_data)
+                    watched = [task_id for task_id in watched if task_id not in done]
+                if watched:
+                    to_check = await self._wait_finished(finished, watched)
+
+    async def _wait_finished(self, finished, watched):
+        """Watched tasks with task finished events, all watched tasks if none arrive within watch_interval."""
+        try:
+            task_ids = {await asyncio.wait_for(finished.get(), self.watch_interval)}
+        except asyncio.TimeoutError:
+            return watched
+        while not finished.empty():
+            task_ids.add(finished.get_nowait())
+        return [task_id for task_id in watched if task_id in task_ids]
+
+    async def UploadBlob(self, request_iterator, context):
+        """
+        Handle UploadBlob request:
+        Write the payload into the blob store chunk by chunk, verifying the checksum of every chunk
+        """
+        writer = await self._run_db(self.blob_store.open_writer)
+        try:
+            async for chunk in request_iterator:
+                if zlib.crc32(chunk.data) != chunk.crc32:
+                    await context.abort(grpc.StatusCode.DATA_LOSS, "Checksum mismatch in an uploaded chunk")
+                await self._run_db(writer.write, chunk.data)
+            digest = await self._run_db(writer.commit)
+        except BaseException:
+            await self._run_db(writer.abort)
+            raise
+        logger.info(f"UploadBlob request: stored blob {digest} of {writer.size} bytes")
+        return task_service_pb2.UploadBlobResponse(digest=digest, size=writer.size)
+
+    async def FetchResult(self, request, context):
+        """
+        Handle FetchResult request:
+        Stream the returned object of a task FINISHED with SUCCESS from the blob store chunk by chunk
+        """
+        task_id = request.task_id
+        logger.info(f"FetchResult request received for task_id={task_id}")
+        task_data = await self._run_db(database.get_task_status, task_id)
         if not task_data:
-            return task_service_pb2.PollTaskResponse(found=False)
+            await context.abort(grpc.StatusCode.NOT_FOUND, f"Task {task_id} not found")
+        if (task_data['task_status'] != task_service_pb2.TaskStatus.FINISHED
+                or task_data['result_status'] != task_service_pb2.ResultStatus.SUCCESS):
+            await context.abort(grpc.StatusCode.FAILED_PRECONDITION, f"Task {task_id} has no returned object")
+
+        if task_data['result_digest']:
+            chunks = self.blob_store.read_chunks(
+                task_data['result_digest'], offset=RESULT_HEADER_SIZE, chunk_size=self.chunk_size
+            )
+        else:
+            # Stored before the blob store, already in memory
+            returned = task_data['returned'] or b''
+            chunks = iter([returned[begin:begin + self.chunk_size]
+                           for begin in range(0, len(returned), self.chunk_size)])
+        while True:
+            try:
+                data = await self._run_db(next, chunks, None)
+            except BlobNotFoundError as e:
+                logger.error(f"Failed to read result {task_data['result_digest']} of task {task_id}: {e}")
+                await context.abort(grpc.StatusCode.DATA_LOSS, "Task result is missing in the blob store")
+            except OSError as e:
+                logger.error(f"Failed to read result {task_data['result_digest']} of task {task_id}: {e}")
+                await context.abort(grpc.StatusCode.UNAVAILABLE, "Task result cannot be read now, retry later")
+            if data is None:
+                break
+            yield task_service_pb2.BlobChunk(data=data, crc32=zlib.crc32(data))
+
+    async def GetStats(self, request, context):
+        """
+        Handle GetStats request:
+        Return service metrics, unavailable ones are omitted
+        """
+        stats = {}
+        queue_depth = await self._run_db(self.work_pipeline.queue_depth)
+        if queue_depth is not None:
+            stats['work_pipeline.queue_depth'] = queue_depth
+        stats.update(self.result_cache.stats())
+        stats.update(self.task_events.stats())
+        stats.update(self.object_collector.stats())
+        stats.update(self.blob_collector.stats())
+        return task_service_pb2.GetStatsResponse(stats=stats)
+
+    async def _get_tasks_data(self, task_ids, context):
+        """
+        Rows of the given tasks, from the result cache or else from database; None on database error.
+        The RPC fails with UNAVAILABLE if the results cannot be read from the blob store for now.
+        """
+        tasks_data = self.result_cache.get_many(task_ids)
+        missing = [task_id for task_id in task_ids if task_id not in tasks_data]
+        if missing:
+            missing_data = await self._run_db(database.get_tasks_status, missing)
+            if missing_data is None:
+                return None
+            loaded = await self._load_results_or_abort(missing_data, context)
+            self.result_cache.put_many(loaded)
+            tasks_data.update(missing_data)
+        return tasks_data
+
+    async def _check_blobs(self, requests, context):
+        """Check that all call_spec and object digests refer to uploaded blobs, otherwise fail the RPC."""
+        digests = set()
+        for request in requests:
+            if request.call_spec_digest:
+                digests.add(request.call_spec_digest)
+            digests.update(request.object_digests)
+        missing = [digest for digest in digests if not await self._run_db(self.blob_store.exists, digest)]
+        if missing:
+            error_msg = f"Blob {missing[0]} is not uploaded"
+            logger.error(error_msg)
+            context.set_details(error_msg)
+            context.set_code(grpc.StatusCode.FAILED_PRECONDITION)
+            return False
+        return True
+
+    def _load_results(self, tasks_data):
+        """
+        Read the results of the given rows from the blob store chunk by chunk into their 'returned' keys.
+        Results larger than inline_result_max_bytes are not read, they are fetched with FetchResult.
+        Rows whose result is missing in the blob store are turned into SYSTEM_ERROR rows, which are not cached.
+        Returns the rows to cache. Other errors reading a result (OSError) may be transient, they are raised.
+        """
+        loaded = {}
+        for task_id, task_data in tasks_data.items():
+            if not task_data.get('result_digest'):
+                loaded[task_id] = task_data
+                continue
+            result_size = task_data.get('result_size')
+            if result_size is not None and result_size - RESULT_HEADER_SIZE > self.inline_result_max_bytes:
+                task_data['fetch_result'] = True
+                loaded[task_id] = task_data
+                continue
+            try:
+                task_data['returned'] = b''.join(
+                    self.blob_store.read_chunks(task_data['result_digest'], offset=RESULT_HEADER_SIZE)
+                )
+                loaded[task_id] = task_data
+            except BlobNotFoundError as e:
+                logger.error(f"Failed to read result {task_data['result_digest']} of task {task_id}: {e}")
+                task_data['result_status'] = task_service_pb2.ResultStatus.SYSTEM_ERROR
+                task_data['error_message'] = "Task result is missing in the blob store"
+        return loaded
+
+    async def _load_results_or_abort(self, tasks_data, context):
+        """_load_results on the executor, the RPC fails with UNAVAILABLE (so the client retries) on OSError."""
+        try:
+            return await self._run_db(self._load_results, tasks_data)
+        except OSError as e:
+            logger.error(f"Failed to read results of {len(tasks_data)} tasks: {e}")
+            await context.abort(grpc.StatusCode.UNAVAILABLE, "Task results cannot be read now, retry later")
+
+    async def _run_db(self, func, *args, **kwargs):
+        """
+        Run a blocking database (or blob store) call on the dedicated executor,
+        the event loop stays free for other RPCs.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.db_executor, functools.partial(func, *args, **kwargs))
+
+    @staticmethod
+    def _make_poll_response(task_id, task_data):
+        if not task_data:
+            return task_service_pb2.PollTaskResponse(task_id=task_id, found=False)
         return task_service_pb2.PollTaskResponse(
+            task_id=task_id,
             found=True,
             task_status=task_data['task_status'],
             result_status=task_data['result_status'] or 0,
             returned=task_data['returned'] or b'',
-            error_message=task_data['error_message'] or ''
+            error_message=task_data['error_message'] or '',
+            fetch_result=task_data.get('fetch_result', False),
+            runtime=task_data.get('runtime') or 0.0
         )
 
 
-def serve():
-    """Start the gRPC server."""
-    logging.basicConfig(
-        level=logging.DEBUG,
-        format="%(asctime)s %(name)s %(levelname)s: %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S"
-    )
-
-    pool_size = int(get_env_or_die('TASK_SERVICE_POOL_SIZE'))
-    server = grpc.server(
-        thread_pool=futures.ThreadPoolExecutor(max_workers=pool_size),
+async def _serve():
+    max_concurrent_rpcs = int(os.getenv('TASK_SERVICE_MAX_CONCURRENT_RPCS', '1000'))
+    server = grpc.aio.server(
+        maximum_concurrent_rpcs=max_concurrent_rpcs,
         options=[
             ('grpc.max_send_message_length', 1024 * 1024 * 1024),
             ('grpc.max_receive_message_length', 1024 * 1024 * 1024),
         ],
     )
-    task_service_pb2_grpc.add_TaskServiceServicer_to_server(TaskService(), server)
+    task_service = TaskService()
+    task_service_pb2_grpc.add_TaskServiceServicer_to_server(task_service, server)
+    task_service.task_waiters.bind(asyncio.get_running_loop())
+    task_service.task_events.start()
+    task_service.work_pipeline.start()
+    task_service.object_collector.start()
+    task_service.blob_collector.start()
 
     bind_addr = f"{get_env_or_die('TASK_SERVICE_HOST')}:{get_env_or_die('TASK_SERVICE_PORT')}"
     server.add_insecure_port(bind_addr)
-    logger.info(f"Starting gRPC server at {bind_addr}")
-    server.start()
-    server.wait_for_termination()
+    logger.info(f"Starting gRPC server at {bind_addr}, at most {max_concurrent_rpcs} concurrent RPCs")
+    await server.start()
+    await server.wait_for_termination()
+
+
+def serve():
+    """Start the gRPC server."""
+    logging.basicConfig(
+        level=logging.DEBUG,
+        format="%(asctime)s %(name)s %(levelname)s: %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S"
+    )
+
+    asyncio.run(_serve())
@@ -0,0 +1,102 @@
+import os
+import time
+
+import pytest
+
+from blob_store import LocalBlobStore
+from raboshka_work_generator import blob_collector
+from raboshka_work_generator.blob_collector import BlobCollector
+
+
+class FakeDatabase:
+    """
+    Finished tasks as (task_id, call_spec_digest, result_digest, expired) and the digests other tasks
+    or staged objects reference, released tasks are recorded.
+    """
+    def __init__(self, tasks, referenced=()):
+        self.tasks = tasks
+        self.referenced = set(referenced)
+        self.released = []
+
+    def get_expired_tasks(self, retention, limit):
+        return [
+            {'task_id': task_id, 'call_spec_digest': call_spec_digest, 'result_digest': result_digest}
+            for task_id, call_spec_digest, result_digest, expired in self.tasks
+            if expired and task_id not in self.released
+        ][:limit]
+
+    def get_referenced_blobs(self, digests, exclude_task_ids):
+        referenced = {
+            digest
+            for task_id, call_spec_digest, result_digest, _ in self.tasks
+            if task_id not in self.released and task_id not in exclude_task_ids
+            for digest in (call_spec_digest, result_digest)
+        }
+        return (referenced | self.referenced) & set(digests)
+
+    def release_task_blobs(self, task_ids, error_message):
+        self.released.extend(task_ids)
+        return True
+
+
+@pytest.fixture
+def blob_store(tmp_path):
+    return LocalBlobStore(str(tmp_path / 'blob_store'))
+
+
+def put_old(blob_store, data):
+    digest = blob_store.put_bytes(data)
+    stored_at = time.time() - 3600
+    os.utime(blob_store._path(digest), (stored_at, stored_at))
+    return digest
+
+
+def make_collector(blob_store, batch_size=10):
+    return BlobCollector(blob_store, interval=60.0, retention=3600.0, grace=60.0, batch_size=batch_size)
+
+
+def test_blobs_of_expired_tasks_are_deleted(blob_store, monkeypatch):
+    call_spec, result = put_old(blob_store, b'call_spec'), put_old(blob_store, b'0result')
+    database = FakeDatabase([('a', call_spec, result, True)])
+    monkeypatch.setattr(blob_collector, 'database', database)
+    collector = make_collector(blob_store)
+
+    assert collector.collect() == 1
+
+    assert database.released == ['a']
+    assert not blob_store.exists(call_spec) and not blob_store.exists(result)
+    assert collector.stats() == {'blob_collector.released_tasks': 1, 'blob_collector.deleted_blobs': 2}
+    assert collector.collect() == 0
+
+
+def test_blobs_other_tasks_reference_are_kept(blob_store, monkeypatch):
+    shared_result, object_digest = put_old(blob_store, b'0None'), put_old(blob_store, b'object')
+    database = FakeDatabase(
+        [('a', object_digest, shared_result, True), ('b', None, shared_result, False)],
+        referenced=[object_digest],
+    )
+    monkeypatch.setattr(blob_collector, 'database', database)
+
+    assert make_collector(blob_store).collect() == 1
+
+    assert database.released == ['a']
+    assert blob_store.exists(shared_result) and blob_store.exists(object_digest)
+
+
+def test_blobs_stored_again_within_the_grace_period_are_kept(blob_store, monkeypatch):
+    call_spec = put_old(blob_store, b'call_spec')
+    blob_store.put_bytes(b'call_spec')  # uploaded again for a new task
+    database = FakeDatabase([('a', call_spec, None, True)])
+    monkeypatch.setattr(blob_collector, 'database', database)
+
+    assert make_collector(blob_store).collect() == 1
+    assert blob_store.exists(call_spec)
+
+
+def test_expired_tasks_are_released_in_batches(blob_store, monkeypatch):
+    database = FakeDatabase([(f'task{i}', None, put_old(blob_store, f'{i}'.encode()), True) for i in range(5)])
+    monkeypatch.setattr(blob_collector, 'database', database)
+    collector = make_collector(blob_store, batch_size=2)
+
+    assert [collector.collect() for _ in range(4)] == [2, 2, 1, 0]
+    assert database.released == [f'task{i}' for i in range(5)]
@@ -0,0 +1,152 @@
+import os
+import zlib
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+import grpc
+import pytest
+
+from blob_store import LocalBlobStore
+from gened_proto.task_service import task_service_pb2
+from raboshka_work_generator import task_service
+from raboshka_work_generator.task_service import TaskService
+
+PAYLOAD = bytes(range(256)) * 10
+
+
+class FakeDatabase:
+    """task_data rows of get_task_status by task_id."""
+    def __init__(self, rows):
+        self.rows = rows
+
+    def get_task_status(self, task_id):
+        return self.rows.get(task_id)
+
+
+class FakeContext:
+    """Servicer context of grpc.aio, abort raises AbortError as grpc does, the status is recorded."""
+    def __init__(self):
+        self.code = None
+        self.details = None
+
+    async def abort(self, code, details):
+        self.code = code
+        self.details = details
+        raise grpc.aio.AbortError()
+
+
+@pytest.fixture
+def service(tmp_path):
+    service = TaskService.__new__(TaskService)
+    service.blob_store = LocalBlobStore(str(tmp_path / 'blob_store'))
+    service.chunk_size = 1000
+    service.db_executor = ThreadPoolExecutor(max_workers=2)
+    yield service
+    service.db_executor.shutdown()
+
+
+@pytest.fixture
+def fake_database(monkeypatch):
+    def install(rows):
+        monkeypatch.setattr(task_service, 'database', FakeDatabase(rows))
+    return install
+
+
+def chunks_of(data, size=1000):
+    return [task_service_pb2.BlobChunk(data=data[begin:begin + size], crc32=zlib.crc32(data[begin:begin + size]))
+            for begin in range(0, len(data), size)]
+
+
+def upload(service, chunks):
+    async def request_iterator():
+        for chunk in chunks:
+            yield chunk
+
+    context = FakeContext()
+    try:
+        return asyncio.run(service.UploadBlob(request_iterator(), context)), context
+    except grpc.aio.AbortError:
+        return None, context
+
+
+def fetch(service, task_id):
+    async def collect():
+        request = task_service_pb2.FetchResultRequest(task_id=task_id)
+        return [chunk async for chunk in service.FetchResult(request, context)]
+
+    context = FakeContext()
+    try:
+        return asyncio.run(collect()), context
+    except grpc.aio.AbortError:
+        return None, context
+
+
+def finished_row(result_digest=None, returned=None, task_status=task_service_pb2.TaskStatus.FINISHED,
+                 result_status=task_service_pb2.ResultStatus.SUCCESS):
+    return {'task_status': task_status, 'result_status': result_status,
+            'result_digest': result_digest, 'returned': returned}
+
+
+def stored_files(service):
+    return [name for _, _, names in os.walk(service.blob_store.root) for name in names]
+
+
+def test_uploaded_chunks_are_stored_as_one_blob(service):
+    response, context = upload(service, chunks_of(PAYLOAD))
+
+    assert context.code is None
+    assert (response.digest, response.size) == (hashlib.sha256(PAYLOAD).hexdigest(), len(PAYLOAD))
+    assert b''.join(service.blob_store.read_chunks(response.digest)) == PAYLOAD
+
+
+def test_a_corrupt_chunk_aborts_the_upload_with_data_loss(service):
+    chunks = chunks_of(PAYLOAD)
+    chunks[1].crc32 ^= 1
+
+    response, context = upload(service, chunks)
+
+    assert response is None and context.code == grpc.StatusCode.DATA_LOSS
+    assert not service.blob_store.exists(hashlib.sha256(PAYLOAD).hexdigest())
+    # the partial upload is removed
+    assert stored_files(service) == []
+
+
+def test_results_are_fetched_in_chunks_with_their_checksums(service, fake_database):
+    result_digest = service.blob_store.put_bytes(b'0' + PAYLOAD)
+    fake_database({'task': finished_row(result_digest=result_digest)})
+
+    chunks, context = fetch(service, 'task')
+
+    assert context.code is None
+    assert len(chunks) == 3
+    assert all(zlib.crc32(chunk.data) == chunk.crc32 for chunk in chunks)
+    # without the result status header
+    assert b''.join(chunk.data for chunk in chunks) == PAYLOAD
+
+
+def test_results_stored_before_the_blob_store_are_fetched_from_the_database(service, fake_database):
+    fake_database({'task': finished_row(returned=PAYLOAD)})
+
+    chunks, _ = fetch(service, 'task')
+
+    assert b''.join(chunk.data for chunk in chunks) == PAYLOAD
+
+
+def test_results_missing_in_the_blob_store_are_data_loss(service, fake_database):
+    fake_database({'task': finished_row(result_digest=hashlib.sha256(b'0' + PAYLOAD).hexdigest())})
+
+    chunks, context = fetch(service, 'task')
+
+    assert chunks is None and context.code == grpc.StatusCode.DATA_LOSS
+
+
+def test_only_successful_results_are_fetched(service, fake_database):
+    fake_database({
+        'running': finished_row(task_status=task_service_pb2.TaskStatus.RUNNING),
+        'failed': finished_row(result_status=task_service_pb2.ResultStatus.USER_ERROR),
+    })
+
+    assert fetch(service, 'unknown')[1].code == grpc.StatusCode.NOT_FOUND
+    assert fetch(service, 'running')[1].code == grpc.StatusCode.FAILED_PRECONDITION
+    assert fetch(service, 'failed')[1].code == grpc.StatusCode.FAILED_PRECONDITION
@@ -0,0 +1,132 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import grpc
+import pytest
+
+from blob_store import LocalBlobStore
+from gened_proto.task_service import task_service_pb2
+from raboshka_work_generator import task_service
+from raboshka_work_generator.task_service import TaskService
+
+REDUNDANCY_OPTIONS = task_service_pb2.RedundancyOptions(min_quorum=1, target_nresults=1)
+
+
+class FakeDatabase:
+    """The inserted tasks are recorded, create_tasks fails if `failing` is set."""
+    def __init__(self):
+        self.created = []  # (tasks, task_status, group_id) of every create_tasks call
+        self.failing = False
+
+    def create_tasks(self, tasks, task_status, group_id=None):
+        if self.failing:
+            return False
+        self.created.append((tasks, task_status, group_id))
+        return True
+
+
+class FakeWorkPipeline:
+    def __init__(self):
+        self.notified = 0
+
+    def notify(self):
+        self.notified += 1
+
+
+class FakeContext:
+    """Servicer context of grpc.aio, the status set by the RPC is recorded."""
+    def __init__(self):
+        self.code = None
+        self.details = None
+
+    def set_code(self, code):
+        self.code = code
+
+    def set_details(self, details):
+        self.details = details
+
+
+@pytest.fixture
+def database(monkeypatch):
+    database = FakeDatabase()
+    monkeypatch.setattr(task_service, 'database', database)
+    return database
+
+
+@pytest.fixture
+def service(tmp_path):
+    service = TaskService.__new__(TaskService)
+    service.blob_store = LocalBlobStore(str(tmp_path / 'blob_store'))
+    service.work_pipeline = FakeWorkPipeline()
+    service.db_executor = ThreadPoolExecutor(max_workers=2)
+    yield service
+    service.db_executor.shutdown()
+
+
+def make_task(flavor='flavor', call_spec=b'call_spec', **kwargs):
+    return task_service_pb2.CreateTaskRequest(
+        flavor=flavor, call_spec=call_spec, redundancy_options=REDUNDANCY_OPTIONS, **kwargs
+    )
+
+
+def create_tasks(service, tasks, fused=False):
+    context = FakeContext()
+    request = task_service_pb2.CreateTasksRequest(tasks=tasks, fused=fused)
+    return asyncio.run(service.CreateTasks(request, context)), context
+
+
+def test_tasks_are_inserted_with_one_database_call(service, database):
+    response, context = create_tasks(service, [make_task(call_spec=f'call_spec {i}'.encode()) for i in range(3)])
+
+    assert context.code is None
+    (tasks, task_status, group_id), = database.created
+    assert task_status == task_service_pb2.TaskStatus.PENDING and group_id is None
+    # task_ids are returned in the order of the request
+    assert [task.task_id for task in response.tasks] == [row[0] for row in tasks]
+    assert len({task.task_id for task in response.tasks}) == 3
+    assert [row[2] for row in tasks] == [b'call_spec 0', b'call_spec 1', b'call_spec 2']
+    assert service.work_pipeline.notified == 1
+
+
+def test_uploaded_call_specs_and_objects_are_referenced_by_digest(service, database):
+    call_spec_digest = service.blob_store.put_bytes(b'call_spec')
+    object_digest = service.blob_store.put_bytes(b'object')
+
+    create_tasks(service, [make_task(call_spec=b'', call_spec_digest=call_spec_digest,
+                                     object_digests=[object_digest, object_digest])])
+
+    (tasks, _, _), = database.created
+    _, _, call_spec, digest, object_digests, *_ = tasks[0]
+    assert (call_spec, digest, object_digests) == (None, call_spec_digest, f'{object_digest} {object_digest}')
+
+
+def test_fused_tasks_share_a_group(service, database):
+    response, context = create_tasks(service, [make_task(), make_task()], fused=True)
+
+    assert context.code is None and len(response.tasks) == 2
+    (_, _, group_id), = database.created
+    assert group_id is not None
+
+
+def test_fused_tasks_must_have_the_same_flavor(service, database):
+    response, context = create_tasks(service, [make_task(flavor='a'), make_task(flavor='b')], fused=True)
+
+    assert context.code == grpc.StatusCode.INVALID_ARGUMENT
+    assert list(response.tasks) == [] and database.created == []
+
+
+def test_tasks_referencing_missing_blobs_are_not_created(service, database):
+    response, context = create_tasks(service, [make_task(call_spec=b'', call_spec_digest='0' * 64)])
+
+    assert context.code == grpc.StatusCode.FAILED_PRECONDITION
+    assert list(response.tasks) == [] and database.created == []
+    assert service.work_pipeline.notified == 0
+
+
+def test_database_errors_are_internal_errors(service, database):
+    database.failing = True
+
+    response, context = create_tasks(service, [make_task()])
+
+    assert context.code == grpc.StatusCode.INTERNAL
+    assert list(response.tasks) == [] and service.work_pipeline.notified == 0
@@ -0,0 +1,26 @@
+import pickle
+
+from raboshka_work_generator.fusion import FUSED_CALL_SPECS_KEY, fuse_call_specs
+
+
+def test_members_keep_their_call_specs_in_order():
+    call_spec, object_digests = fuse_call_specs([(b'first', []), (b'second', [])])
+
+    fused = pickle.loads(call_spec)[FUSED_CALL_SPECS_KEY]
+    assert [member['call_spec'] for member in fused] == [b'first', b'second']
+    assert object_digests == []
+
+
+def test_shared_objects_are_staged_once_and_refs_are_remapped():
+    call_spec, object_digests = fuse_call_specs([
+        (b'a', ['x', 'y']),
+        (b'b', ['y']),
+        (b'c', ['z', 'x']),
+    ])
+
+    assert object_digests == ['x', 'y', 'z']
+    fused = pickle.loads(call_spec)[FUSED_CALL_SPECS_KEY]
+    # ref_<i> of a member is ref_<refs[i]> of the work unit
+    assert [member['refs'] for member in fused] == [[0, 1], [1], [2, 0]]
+    for member, (_, digests) in zip(fused, [(b'a', ['x', 'y']), (b'b', ['y']), (b'c', ['z', 'x'])]):
+        assert [object_digests[ref] for ref in member['refs']] == digests
@@ -0,0 +1,162 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import grpc
+import pytest
+
+from gened_proto.task_service import task_service_pb2
+from raboshka_work_generator import task_service
+from raboshka_work_generator.result_cache import ResultCache
+from raboshka_work_generator.task_events import TaskWaiters
+from raboshka_work_generator.task_service import TaskService
+
+RUNNING = task_service_pb2.TaskStatus.RUNNING
+FINISHED = task_service_pb2.TaskStatus.FINISHED
+
+
+class FakeDatabase:
+    """task_data rows in memory, the task_ids of every query are recorded."""
+    def __init__(self, statuses):
+        self.rows = {task_id: self.row(task_status) for task_id, task_status in statuses.items()}
+        self.queries = []
+        self.failing = False
+
+    @staticmethod
+    def row(task_status, returned=None):
+        return {
+            'task_status': task_status, 'result_status': 0, 'returned': returned, 'error_message': None,
+            'result_digest': None, 'result_size': None, 'runtime': None,
+        }
+
+    def finish(self, task_id):
+        self.rows[task_id] = self.row(FINISHED, returned=f'returned of {task_id}'.encode())
+
+    def get_tasks_status(self, task_ids):
+        if self.failing:
+            return None
+        rows = {task_id: dict(self.rows[task_id]) for task_id in task_ids if task_id in self.rows}
+        self.queries.append(list(task_ids))
+        return rows
+
+
+class FakeContext:
+    """Servicer context of grpc.aio, the status set by the RPC is recorded."""
+    def __init__(self):
+        self.code = None
+        self.details = None
+
+    def set_code(self, code):
+        self.code = code
+
+    def set_details(self, details):
+        self.details = details
+
+
+@pytest.fixture
+def fake_database(monkeypatch):
+    def install(statuses):
+        database = FakeDatabase(statuses)
+        monkeypatch.setattr(task_service, 'database', database)
+        return database
+    return install
+
+
+@pytest.fixture
+def service():
+    service = TaskService.__new__(TaskService)
+    # rows of unfinished tasks expire right away, as if invalidated by their task events
+    service.result_cache = ResultCache(max_bytes=1024 * 1024, ttl=0.0)
+    service.task_waiters = TaskWaiters()
+    service.watch_interval = 10.0
+    service.inline_result_max_bytes = 1024
+    service.db_executor = ThreadPoolExecutor(max_workers=2)
+    yield service
+    service.db_executor.shutdown()
+
+
+def poll_tasks(service, task_ids):
+    context = FakeContext()
+    response = asyncio.run(service.PollTasks(task_service_pb2.PollTasksRequest(task_ids=task_ids), context))
+    return response, context
+
+
+def test_tasks_are_polled_with_one_query_in_the_order_of_the_request(service, fake_database):
+    database = fake_database({'a': RUNNING, 'b': FINISHED})
+
+    response, context = poll_tasks(service, ['b', 'unknown', 'a'])
+
+    assert context.code is None
+    assert [(task.task_id, task.found, task.task_status) for task in response.tasks] == [
+        ('b', True, FINISHED), ('unknown', False, 0), ('a', True, RUNNING),
+    ]
+    assert database.queries == [['b', 'unknown', 'a']]
+
+
+def test_finished_tasks_are_served_from_the_result_cache(service, fake_database):
+    database = fake_database({'a': RUNNING, 'b': FINISHED})
+
+    poll_tasks(service, ['a', 'b'])
+    response, _ = poll_tasks(service, ['a', 'b'])
+
+    assert [task.task_id for task in response.tasks] == ['a', 'b']
+    assert database.queries == [['a', 'b'], ['a']]
+
+
+def test_database_errors_are_internal_errors(service, fake_database):
+    fake_database({'a': RUNNING}).failing = True
+
+    response, context = poll_tasks(service, ['a'])
+
+    assert context.code == grpc.StatusCode.INTERNAL
+    assert list(response.tasks) == []
+
+
+def test_watched_tasks_are_streamed_as_their_task_events_arrive(service, fake_database):
+    database = fake_database({'a': RUNNING, 'b': RUNNING})
+
+    async def watch():
+        service.task_waiters.bind(asyncio.get_running_loop())
+        request = task_service_pb2.WatchTasksRequest(task_ids=['a', 'b', 'unknown', 'a'])
+        stream = service.WatchTasks(request, FakeContext())
+        responses = [await anext(stream)]
+        for task_id in ('b', 'a'):
+            database.finish(task_id)
+            service.task_waiters.notify([task_id])
+            responses.append(await asyncio.wait_for(anext(stream), timeout=5.0))
+        with pytest.raises(StopAsyncIteration):
+            await anext(stream)
+        return responses
+
+    responses = asyncio.run(watch())
+
+    assert [(task.task_id, task.found, task.task_status) for task in responses] == [
+        ('unknown', False, 0), ('b', True, FINISHED), ('a', True, FINISHED),
+    ]
+    assert responses[1].returned == b'returned of b'
+    # only the tasks with events are checked again
+    assert database.queries == [['a', 'b', 'unknown'], ['b'], ['a']]
+    assert service.task_waiters._waiters == {}
+
+
+def test_watched_tasks_are_checked_again_when_their_task_event_is_missed(service, fake_database):
+    database = fake_database({'a': RUNNING, 'b': RUNNING})
+    service.watch_interval = 0.05
+
+    async def watch():
+        service.task_waiters.bind(asyncio.get_running_loop())
+        stream = service.WatchTasks(task_service_pb2.WatchTasksRequest(task_ids=['a', 'b']), FakeContext())
+        watching = asyncio.ensure_future(asyncio.wait_for(collect(stream), timeout=5.0))
+        while not database.queries:
+            await asyncio.sleep(0.01)
+        # no task events, e.g. the work generator was restarting
+        database.finish('a')
+        database.finish('b')
+        return await watching
+
+    async def collect(stream):
+        return [task async for task in stream]
+
+    responses = asyncio.run(watch())
+
+    assert [task.task_id for task in responses] == ['a', 'b']
+    assert len(database.queries) > 1 and database.queries[-1] == ['a', 'b']
@@ -0,0 +1,105 @@
+import types
+
+import pytest
+
+from gened_proto.task_service import task_service_pb2
+from raboshka_work_generator import result_cache
+from raboshka_work_generator.result_cache import ResultCache, ROW_OVERHEAD_BYTES
+
+FINISHED = task_service_pb2.TaskStatus.FINISHED
+RUNNING = task_service_pb2.TaskStatus.RUNNING
+
+
+def row(task_status=FINISHED, returned=b'', error_message=None):
+    return {'task_status': task_status, 'returned': returned, 'error_message': error_message}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(result_cache, 'time', types.SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+def test_finished_rows_are_evicted_by_bytes_in_lru_order():
+    cache = ResultCache(max_bytes=3 * (ROW_OVERHEAD_BYTES + 100), ttl=1.0)
+    for task_id in ('a', 'b', 'c'):
+        cache.put(task_id, row(returned=b'x' * 100))
+    assert cache.get('a') is not None  # b is now the least recently used
+
+    cache.put('d', row(returned=b'x' * 100))
+
+    assert cache.get('b') is None
+    assert set(cache.get_many(['a', 'c', 'd'])) == {'a', 'c', 'd'}
+    stats = cache.stats()
+    assert stats['result_cache.evictions'] == 1
+    assert stats['result_cache.finished_bytes'] == 3 * (ROW_OVERHEAD_BYTES + 100)
+
+
+def test_a_large_row_evicts_as_many_rows_as_needed():
+    cache = ResultCache(max_bytes=4 * ROW_OVERHEAD_BYTES, ttl=1.0)
+    for task_id in ('a', 'b', 'c'):
+        cache.put(task_id, row())
+
+    cache.put('big', row(returned=b'x' * 2 * ROW_OVERHEAD_BYTES))
+
+    assert cache.get_many(['a', 'b', 'c', 'big']).keys() == {'c', 'big'}
+
+
+def test_rows_larger_than_the_cache_are_not_cached():
+    cache = ResultCache(max_bytes=ROW_OVERHEAD_BYTES + 10, ttl=1.0)
+    cache.put('a', row(returned=b'x' * 11))
+    assert cache.get('a') is None
+
+
+def test_unfinished_rows_expire_after_ttl(clock):
+    cache = ResultCache(max_bytes=1024 * 1024, ttl=2.0)
+    cache.put('a', row(task_status=RUNNING))
+
+    clock.now += 1.9
+    assert cache.get('a') is not None
+    clock.now += 0.2
+    assert cache.get('a') is None
+
+
+def test_finished_rows_do_not_expire(clock):
+    cache = ResultCache(max_bytes=1024 * 1024, ttl=2.0)
+    cache.put('a', row(returned=b'42'))
+    clock.now += 3600.0
+    assert cache.get('a')['returned'] == b'42'
+
+
+def test_invalidate_drops_unfinished_rows_only():
+    cache = ResultCache(max_bytes=1024 * 1024, ttl=60.0)
+    cache.put('running', row(task_status=RUNNING))
+    cache.put('finished', row(returned=b'42'))
+
+    cache.invalidate_many(['running', 'finished'])
+
+    assert cache.get('running') is None
+    assert cache.get('finished') is not None
+
+
+def test_finished_row_replaces_the_unfinished_one():
+    cache = ResultCache(max_bytes=1024 * 1024, ttl=60.0)
+    cache.put('a', row(task_status=RUNNING))
+    cache.put('a', row(returned=b'42'))
+    assert cache.get('a')['task_status'] == FINISHED
+    assert cache.stats()['result_cache.unfinished_entries'] == 0
+
+
+def test_stats_count_hits_and_misses():
+    cache = ResultCache(max_bytes=1024 * 1024, ttl=60.0)
+    cache.put('a', row())
+    cache.get('a')
+    cache.get('b')
+    stats = cache.stats()
+    assert (stats['result_cache.hits'], stats['result_cache.misses'], stats['result_cache.hit_rate']) == (1, 1, 0.5)
@@ -0,0 +1,130 @@
+import time
+import asyncio
+import tempfile
+import threading
+
+import pytest
+
+from raboshka_assimilator.task_events import publish_task_events
+from raboshka_work_generator import task_events
+from raboshka_work_generator.task_events import TaskEventsListener, TaskWaiters
+
+
+class FakeDatabase:
+    """
+    The task_event outbox in memory, events are (id, task_id) with ids from 1.
+    Once closed, reading events blocks forever: listeners are never stopped, their threads are parked this way.
+    """
+    def __init__(self, task_ids=()):
+        self.task_ids = list(task_ids)
+        self.lock = threading.Lock()
+        self.closed = False
+        self.parked = threading.Event()
+
+    def add_events(self, task_ids):
+        with self.lock:
+            self.task_ids.extend(task_ids)
+
+    def get_last_task_event_id(self):
+        with self.lock:
+            return len(self.task_ids)
+
+    def get_task_events(self, after, limit):
+        if self.closed:
+            self.parked.set()
+            threading.Event().wait()
+        with self.lock:
+            return [(event_id, self.task_ids[event_id - 1])
+                    for event_id in range(after + 1, min(after + limit, len(self.task_ids)) + 1)]
+
+    def delete_task_events(self, retention):
+        return True
+
+
+@pytest.fixture
+def project_dir(monkeypatch):
+    # short enough for a UNIX socket path
+    with tempfile.TemporaryDirectory(dir='/tmp') as project_dir:
+        monkeypatch.setenv('PROJECT_DIR', project_dir)
+        yield project_dir
+
+
+@pytest.fixture
+def fake_database(monkeypatch):
+    def install(*args):
+        database = FakeDatabase(*args)
+        monkeypatch.setattr(task_events, 'database', database)
+        return database
+    return install
+
+
+@pytest.fixture
+def start_listener(project_dir, fake_database):
+    listeners = []
+
+    def start(poll_interval, batch_size=100):
+        """Started listener and the list of task_ids it passes to its subscriber."""
+        listener = TaskEventsListener(project_dir, poll_interval, batch_size, retention=3600)
+        received = []
+        listener.subscribe(received.extend)
+        listener.start()
+        listeners.append(listener)
+        return listener, received
+
+    yield start
+    if listeners:
+        task_events.database.closed = True
+        publish_task_events()
+        assert task_events.database.parked.wait(timeout=5.0)
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_published_events_wake_the_listener_up(fake_database, start_listener):
+    database = fake_database(['before the start'])
+    listener, received = start_listener(poll_interval=60.0, batch_size=2)
+
+    database.add_events(['a', 'b', 'c'])
+    publish_task_events()
+    publish_task_events()
+
+    # well before the safety poll, the events committed before the start are skipped
+    wait_until(lambda: len(received) == 3)
+    assert received == ['a', 'b', 'c']
+    assert listener.stats()['task_events.consumed'] == 3
+    assert listener.stats()['task_events.wakeups'] >= 1
+
+
+def test_events_of_lost_datagrams_are_consumed_by_the_safety_poll(fake_database, start_listener):
+    database = fake_database()
+    listener, received = start_listener(poll_interval=0.1)
+
+    database.add_events(['a', 'b'])
+
+    wait_until(lambda: len(received) == 2)
+    assert received == ['a', 'b']
+    assert listener.stats()['task_events.wakeups'] == 0
+
+
+def test_publishing_without_a_listener_is_not_an_error(project_dir):
+    publish_task_events()
+
+
+def test_waiters_are_woken_up_by_events_from_other_threads():
+    waiters = TaskWaiters()
+
+    async def watch():
+        waiters.bind(asyncio.get_running_loop())
+        with waiters.watch(['a', 'b']) as finished:
+            threading.Thread(target=waiters.notify, args=(['x', 'b'],)).start()
+            task_id = await asyncio.wait_for(finished.get(), timeout=5.0)
+        return task_id, finished.empty()
+
+    assert asyncio.run(watch()) == ('b', True)
+    # the queue is dropped with the context
+    assert waiters._waiters == {}
@@ -0,0 +1,131 @@
+import time
+import threading
+
+import pytest
+
+from gened_proto.task_service import task_service_pb2
+from raboshka_work_generator import work_pipeline
+from raboshka_work_generator.result_cache import ResultCache
+from raboshka_work_generator.work_pipeline import WorkPipeline
+
+REDUNDANCY_OPTIONS = task_service_pb2.RedundancyOptions(min_quorum=1, target_nresults=1).SerializeToString()
+
+
+class FakeDatabase:
+    """task_data of PENDING tasks in memory, the calls of WorkPipeline are recorded."""
+    def __init__(self, task_ids, existing=()):
+        self.pending = {task_id: self.row(task_id) for task_id in task_ids}
+        self.existing = set(existing)
+        self.running = []
+        self.failed = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def row(task_id):
+        return {
+            'task_id': task_id, 'flavor': 'flavor', 'group_id': None, 'group_index': None,
+            'call_spec': f'call_spec of {task_id}'.encode(), 'call_spec_digest': None, 'object_digests': None,
+            'redundancy_options': REDUNDANCY_OPTIONS,
+        }
+
+    def get_pending_work_units(self, limit):
+        with self.lock:
+            return list(self.pending)[:limit]
+
+    def get_pending_tasks(self, wu_names):
+        with self.lock:
+            return [self.pending[wu_name] for wu_name in wu_names if wu_name in self.pending]
+
+    def get_existing_workunits(self, names):
+        return {name for name in names if name in self.existing}
+
+    def set_tasks_running(self, task_ids):
+        with self.lock:
+            self.running.extend(task_ids)
+            for task_id in task_ids:
+                self.pending.pop(task_id, None)
+        return True
+
+    def set_tasks_failed(self, errors):
+        with self.lock:
+            self.failed.update(errors)
+            for task_id in errors:
+                self.pending.pop(task_id, None)
+        return True
+
+    def count_pending_tasks(self):
+        with self.lock:
+            return len(self.pending)
+
+
+class FakeWorkCreator:
+    def __init__(self, errors=None):
+        self.errors = errors or {}
+        self.created = []
+        self.lock = threading.Lock()
+
+    def create_works(self, works):
+        with self.lock:
+            self.created.extend(works)
+        return {wu_name: self.errors[wu_name] for wu_name, *_ in works if wu_name in self.errors}
+
+
+@pytest.fixture
+def fake_database(monkeypatch):
+    def install(*args, **kwargs):
+        database = FakeDatabase(*args, **kwargs)
+        monkeypatch.setattr(work_pipeline, 'database', database)
+        return database
+    return install
+
+
+def make_pipeline(work_creator, parallelism=1, batch_size=10):
+    return WorkPipeline(work_creator, ResultCache(max_bytes=1024 * 1024, ttl=1.0),
+                        batch_size=batch_size, idle_interval=0.05, parallelism=parallelism)
+
+
+def test_created_work_units_move_tasks_to_running(fake_database):
+    database = fake_database(['a', 'b'])
+    work_creator = FakeWorkCreator()
+    make_pipeline(work_creator)._process_batch(['a', 'b'])
+
+    assert sorted(database.running) == ['a', 'b']
+    assert database.failed == {}
+    assert [(wu_name, call_spec) for wu_name, _, call_spec, *_ in work_creator.created] == [
+        ('a', b'call_spec of a'), ('b', b'call_spec of b'),
+    ]
+
+
+def test_failed_work_units_finish_their_tasks_with_the_error(fake_database):
+    database = fake_database(['a', 'b'])
+    make_pipeline(FakeWorkCreator(errors={'b': 'create_work failed'}))._process_batch(['a', 'b'])
+
+    assert database.running == ['a']
+    assert database.failed == {'b': 'create_work failed'}
+
+
+def test_work_units_created_before_a_restart_are_not_created_again(fake_database):
+    database = fake_database(['a', 'b'], existing=['a'])
+    work_creator = FakeWorkCreator()
+    make_pipeline(work_creator)._process_batch(['a', 'b'])
+
+    assert [wu_name for wu_name, *_ in work_creator.created] == ['b']
+    assert sorted(database.running) == ['a', 'b']
+
+
+def test_parallel_batches_create_every_work_unit_once():
+    task_ids = [f'task{i}' for i in range(100)]
+    # the pipeline thread can not be stopped, it keeps polling this database after the test
+    database = FakeDatabase(task_ids)
+    work_pipeline.database = database
+    work_creator = FakeWorkCreator()
+    pipeline = make_pipeline(work_creator, parallelism=4, batch_size=7)
+    pipeline.start()
+    pipeline.notify()
+
+    deadline = time.monotonic() + 5.0
+    while database.count_pending_tasks() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert database.count_pending_tasks() == 0
+    assert sorted(database.running) == sorted(task_ids)
+    assert sorted(wu_name for wu_name, *_ in work_creator.created) == sorted(task_ids)
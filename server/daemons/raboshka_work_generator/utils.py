@@ -11,3 +11,13 @@ def get_env_or_die(name: str) -> str:
         logger.critical(f"Environment variable '{name}' is required but not set.")
         sys.exit(1)
     return value
+
+
+def get_rpc_db_pool_size() -> int:
+    """Number of database connections for RPC handlers (TASK_SERVICE_POOL_SIZE is the legacy name)."""
+    return int(os.getenv('TASK_SERVICE_DB_POOL_SIZE') or get_env_or_die('TASK_SERVICE_POOL_SIZE'))
+
+
+def get_work_creator_parallelism() -> int:
+    """Number of batches of work units created in parallel by the work pipeline."""
+    return int(os.getenv('WORK_CREATOR_PARALLELISM', '1'))
@@ -1,13 +1,47 @@
 import os
+import uuid
+import hashlib
 import logging
+import functools
+import threading
 import subprocess
+import xml.etree.ElementTree as ET
+
+from blob_store import BlobNotFoundError
+
+from .database import database
 
 logger = logging.getLogger(__name__)
 
+WU_TEMPLATE = 'templates/raboshka/2.0/in'
+RESULT_TEMPLATE = 'templates/raboshka/2.0/out'
+# Input templates of work units referencing N objects are WU_TEMPLATE with N object files added,
+# the work generator writes them into the templates directory of the project on first use, see _wu_template()
+
+# Input files of uploaded objects are shared by many work units, the file deleter must keep them,
+# the work generator unstages them once no unfinished task references them, see collect_objects().
+# They are sticky, so volunteers keep them for the next work units (routed to them by locality scheduling),
+# and they are not copied into the slot directory, raboshka follows the soft link file BOINC puts there instead
+REF_FILE_INFO = """<file_info>
+    <number>{number}</number>
+    <sticky/>
+    <no_delete/>
+</file_info>
+"""
+REF_FILE_REF = """    <file_ref>
+        <file_number>{number}</file_number>
+        <open_name>ref_{index}</open_name>
+    </file_ref>
+"""
+
 class WorkCreator:
-    def __init__(self, project_dir, tmp_dir):
+    def __init__(self, project_dir, tmp_dir, blob_store):
         self.project_dir = project_dir
         self.tmp_dir = tmp_dir
+        self.blob_store = blob_store
+        self._locality_apps = set()
+        # Held while objects are touched for new work units and while unused ones are unstaged
+        self._objects_lock = threading.Lock()
 
     def create_work(self, task_id, flavor, call_spec, redundancy_options):
         # Create call_spec file
@@ -21,27 +55,211 @@ class WorkCreator:
 
         # Create BOINC work
         appname = f'raboshka_{flavor}'
-        self._run_subprocess(['bin/create_work',
-                                '--appname', appname,
-                                '--min_quorum', str(redundancy_options.min_quorum),
-                                '--target_nresults', str(redundancy_options.target_nresults),
-                                '--max_error_results', str(redundancy_options.max_error_results),
-                                '--max_total_results', str(redundancy_options.max_total_results),
-                                '--max_success_results', str(redundancy_options.max_success_results),
-                                '--delay_bound', str(redundancy_options.delay_bound),
-                                '--wu_name', str(task_id),
-                                '--wu_template', 'templates/raboshka/2.0/in',
-                                '--result_template', 'templates/raboshka/2.0/out',
+        self._run_subprocess(['bin/create_work', '--appname', appname]
+                             + self._redundancy_args(redundancy_options)
+                             + ['--wu_name', str(task_id),
+                                '--wu_template', WU_TEMPLATE,
+                                '--result_template', RESULT_TEMPLATE,
                                 call_spec_file_name
                                 ], "Failed to create BOINC work")
 
-    def _run_subprocess(self, cmd, error_prefix):
+    def create_works(self, works):
+        """
+        Create BOINC work units for many tasks at once.
+        works: list of (wu_name, flavor, call_spec, call_spec_digest, object_digests, redundancy_options) tuples,
+        call_spec is None if it is uploaded to the blob store, then it is copied from there chunk by chunk.
+        wu_name is the task_id of a task with its own work unit or the group_id of a fused group.
+
+        The call_spec files are staged in-process straight into the download hierarchy (as bin/stage_file does),
+        uploaded objects are staged once as sticky obj_<digest> files shared by all work units referencing them,
+        and locality scheduling lite is enabled for the apps of such work units.
+        Then one create_work --stdin call is made per (flavor, redundancy_options, number of objects) group,
+        since the app, the redundancy options and the input template can only be set for the whole
+        create_work invocation. Which work units were actually created is checked in the BOINC database afterwards.
+
+        Returns dict wu_name -> error message for the work units that failed.
+        """
+        errors = {}
+        groups = {}
+        staged_objects = set()
+        # objects used by the batch are touched first, so that collect_objects() does not unstage them meanwhile
+        all_digests = {digest for *_, object_digests, _ in works for digest in object_digests}
+        objects_touched = True
+        if all_digests:
+            with self._objects_lock:
+                objects_touched = database.touch_staged_objects(sorted(all_digests))
+        for task_id, flavor, call_spec, call_spec_digest, object_digests, redundancy_options in works:
+            call_spec_file_name = f'wu_{task_id}_call_spec'
+            if object_digests and not objects_touched:
+                errors[task_id] = "Failed to record the staged objects in the database"
+                continue
+            try:
+                for digest in object_digests:
+                    if digest not in staged_objects:
+                        self._stage_object(digest)
+                        staged_objects.add(digest)
+                if call_spec is None:
+                    self._stage_file(call_spec_file_name, self.blob_store.read_chunks(call_spec_digest))
+                else:
+                    self._stage_file(call_spec_file_name, [call_spec])
+            except BlobNotFoundError as e:
+                errors[task_id] = f"Blob {e.args[0]} is missing in the blob store"
+                continue
+            except OSError as e:
+                errors[task_id] = f"Failed to stage file: {e}"
+                continue
+            key = (flavor, redundancy_options.SerializeToString(), len(object_digests))
+            input_files = [call_spec_file_name] + [self._object_file_name(digest) for digest in object_digests]
+            groups.setdefault(key, (redundancy_options, []))[1].append((task_id, input_files))
+
+        for (flavor, _, n_objects), (redundancy_options, group) in groups.items():
+            appname = f'raboshka_{flavor}'
+            jobs = ''.join(f'--wu_name {task_id} {" ".join(input_files)}\n' for task_id, input_files in group)
+            error_msg = "Work unit is missing after create_work"
+            if n_objects and appname not in self._locality_apps:
+                if database.enable_locality_scheduling(appname):
+                    self._locality_apps.add(appname)
+            try:
+                self._run_subprocess(['bin/create_work', '--appname', appname, '--stdin']
+                                     + self._redundancy_args(redundancy_options)
+                                     + ['--wu_template', self._wu_template(n_objects),
+                                        '--result_template', RESULT_TEMPLATE,
+                                        ], "Failed to create BOINC work", input=jobs)
+            except (RuntimeError, OSError) as e:
+                error_msg = str(e)
+
+            # create_work may fail in the middle of the batch, so look at what was created
+            created = database.get_existing_workunits([task_id for task_id, _ in group])
+            if created is None:
+                created = set()
+            for task_id, input_files in group:
+                if task_id not in created:
+                    errors[task_id] = error_msg
+                    # Object files may be shared with other work units, they stay staged
+                    self._unstage_file(input_files[0])
+            logger.info(f"Created {len(created)} of {len(group)} BOINC works for app {appname}")
+        return errors
+
+    def collect_objects(self, older_than, limit):
+        """
+        Unstage up to limit objects that were not used for older_than seconds and no unfinished task references.
+        An object touched for new work units in the meantime is kept, one unstaged before is staged again.
+        Returns the number of unstaged objects, None on database error.
+        """
+        digests = database.get_unused_staged_objects(older_than, limit)
+        if digests is None:
+            return None
+        unstaged = 0
+        for digest in digests:
+            with self._objects_lock:
+                if database.delete_staged_object(digest, older_than):
+                    self._unstage_file(self._object_file_name(digest))
+                    unstaged += 1
+        if unstaged:
+            logger.info(f"Unstaged {unstaged} unused objects")
+        return unstaged
+
+    @staticmethod
+    def _object_file_name(digest):
+        return f'obj_{digest}'
+
+    def _stage_object(self, digest):
+        """Stage the uploaded object unless it is already staged, its file name is the same for every work unit."""
+        file_name = self._object_file_name(digest)
+        if os.path.exists(f'{self._download_path(file_name)}.md5'):
+            return
+        self._stage_file(file_name, self.blob_store.read_chunks(digest))
+
+    def _wu_template(self, n_objects):
+        """
+        Input template with the call_spec file and n_objects object files. It is generated from WU_TEMPLATE
+        on first use and written next to it in the templates directory of the project, which the work generator
+        must be able to write to, as create_work only takes templates from files.
+        """
+        if n_objects == 0:
+            return WU_TEMPLATE
+        template = f'{WU_TEMPLATE}_refs_{n_objects}'
+        path = os.path.join(self.project_dir, template)
+        if not os.path.exists(path):
+            with open(os.path.join(self.project_dir, WU_TEMPLATE)) as f:
+                base = f.read()
+            file_infos = ''.join(REF_FILE_INFO.format(number=i + 1) for i in range(n_objects))
+            file_refs = ''.join(REF_FILE_REF.format(number=i + 1, index=i) for i in range(n_objects))
+            content = base.replace('<workunit>', file_infos + '<workunit>', 1)
+            content = content.replace('    <rsc_fpops_bound>', file_refs + '    <rsc_fpops_bound>', 1)
+            tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+            with open(tmp_path, 'w') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        return template
+
+    def _stage_file(self, file_name, chunks):
+        """
+        Write a file from its content chunks straight into the download hierarchy, the same way bin/stage_file
+        moves it there, including the .md5 file, so that create_work does not have to read the file again.
+        """
+        path = self._download_path(file_name)
+        tmp_path = os.path.join(os.path.dirname(path), f'.{file_name}.{uuid.uuid4().hex}.tmp')
+        md5 = hashlib.md5()
+        size = 0
+        try:
+            with open(tmp_path, 'wb') as f:
+                for chunk in chunks:
+                    md5.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        os.replace(tmp_path, path)
+        # The .md5 file comes last and atomically, its presence means the file is staged
+        with open(tmp_path, 'w') as f:
+            f.write(f'{md5.hexdigest()} {size}\n')
+        os.replace(tmp_path, f'{path}.md5')
+
+    def _unstage_file(self, file_name):
+        path = self._download_path(file_name)
+        # the .md5 file goes first, its presence means the file is staged
+        for leftover in (f'{path}.md5', path):
+            try:
+                os.remove(leftover)
+            except OSError:
+                pass
+
+    def _download_path(self, file_name):
+        """Path of the file in the download hierarchy, see dir_hier_path() in BOINC lib/filesys.cpp"""
+        download_dir, fanout = self._download_config()
+        bucket = int(hashlib.md5(file_name.encode()).hexdigest()[1:8], 16) % fanout
+        bucket_dir = os.path.join(download_dir, f'{bucket:x}')
+        os.makedirs(bucket_dir, exist_ok=True)
+        return os.path.join(bucket_dir, file_name)
+
+    @functools.cache
+    def _download_config(self):
+        """Download directory and its fanout from the project config.xml"""
+        config = ET.parse(os.path.join(self.project_dir, 'config.xml')).getroot().find('config')
+        download_dir = config.findtext('download_dir') or os.path.join(self.project_dir, 'download')
+        fanout = int(config.findtext('uldl_dir_fanout') or 1024)
+        return download_dir, fanout
+
+    @staticmethod
+    def _redundancy_args(redundancy_options):
+        return ['--min_quorum', str(redundancy_options.min_quorum),
+                '--target_nresults', str(redundancy_options.target_nresults),
+                '--max_error_results', str(redundancy_options.max_error_results),
+                '--max_total_results', str(redundancy_options.max_total_results),
+                '--max_success_results', str(redundancy_options.max_success_results),
+                '--delay_bound', str(redundancy_options.delay_bound)]
+
+    def _run_subprocess(self, cmd, error_prefix, input=None):
         """Run a subprocess command with proper error handling."""
         logger.debug(f"Running command: {' '.join(cmd)}")
         try:
             result = subprocess.run(
                 cmd,
                 cwd=self.project_dir,
+                input=input,
                 check=True,
                 capture_output=True,
                 text=True
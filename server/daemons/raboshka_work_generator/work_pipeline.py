@@ -0,0 +1,131 @@
+import logging
+import threading
+from concurrent import futures
+
+from gened_proto.task_service import task_service_pb2
+from blob_store import BlobNotFoundError
+
+from .database import database
+from .fusion import fuse_call_specs
+
+logger = logging.getLogger(__name__)
+
+class WorkPipeline:
+    """
+    Background stage creating BOINC work units for PENDING tasks.
+
+    CreateTask(s) only persist tasks as PENDING and wake the pipeline up. The dispatcher thread takes
+    the oldest work units of PENDING tasks in batches and hands every batch to one of `parallelism` workers,
+    which creates the work units and moves every task to RUNNING, or to FINISHED with SYSTEM_ERROR if its
+    work unit could not be created. A work unit runs either one task or all tasks of a fused group.
+    The queue is the task_data table itself, so PENDING tasks left by a previous run are picked up
+    after a restart.
+    """
+    def __init__(self, work_creator, result_cache, batch_size, idle_interval, parallelism=1):
+        self.work_creator = work_creator
+        self.result_cache = result_cache
+        self.batch_size = batch_size
+        self.idle_interval = idle_interval
+        self.parallelism = parallelism
+        self._wakeup = threading.Event()
+        self._slots = threading.Semaphore(parallelism)
+        self._in_flight = set()
+        self._in_flight_lock = threading.Lock()
+        self._executor = futures.ThreadPoolExecutor(max_workers=parallelism, thread_name_prefix='work_creator')
+        self._thread = threading.Thread(target=self._run, name='work_pipeline', daemon=True)
+
+    def start(self):
+        logger.info(f"Starting work pipeline with batch size {self.batch_size} and parallelism {self.parallelism}")
+        self._thread.start()
+
+    def notify(self):
+        """Wake the pipeline up, new PENDING tasks are available."""
+        self._wakeup.set()
+
+    def queue_depth(self):
+        """Number of tasks waiting for their work units, None on database error."""
+        return database.count_pending_tasks()
+
+    def _run(self):
+        while True:
+            self._slots.acquire()
+            self._wakeup.clear()
+            with self._in_flight_lock:
+                in_flight = set(self._in_flight)
+            # Batches being processed are still PENDING, skip them
+            wu_names = database.get_pending_work_units(self.batch_size + len(in_flight)) or []
+            batch = [wu_name for wu_name in wu_names if wu_name not in in_flight][:self.batch_size]
+            if not batch:
+                # Nothing to do (or the database is unavailable), also recheck periodically
+                self._slots.release()
+                self._wakeup.wait(self.idle_interval)
+                continue
+            with self._in_flight_lock:
+                self._in_flight.update(batch)
+            self._executor.submit(self._process_batch, batch)
+
+    def _process_batch(self, wu_names):
+        try:
+            tasks = database.get_pending_tasks(wu_names)
+            if tasks:
+                self._create_works(tasks)
+                # More PENDING tasks may be waiting
+                self._wakeup.set()
+        except Exception as e:
+            logger.error(f"Unexpected error processing a batch of {len(wu_names)} pending work units: {e}")
+        finally:
+            with self._in_flight_lock:
+                self._in_flight.difference_update(wu_names)
+            self._slots.release()
+
+    def _create_works(self, tasks):
+        work_units = {}  # wu_name -> its tasks
+        for task in tasks:
+            work_units.setdefault(task['group_id'] or task['task_id'], []).append(task)
+
+        # Work units of the previous run, created right before a restart, must not be created twice
+        existing = database.get_existing_workunits(list(work_units))
+        if existing is None:
+            return
+        if existing:
+            logger.warning(f"Found {len(existing)} pending work units that are already created")
+
+        errors = {}  # wu_name -> error message
+        works = []
+        for wu_name, wu_tasks in work_units.items():
+            if wu_name in existing:
+                continue
+            try:
+                works.append(self._make_work(wu_name, wu_tasks))
+            except (BlobNotFoundError, OSError) as e:
+                errors[wu_name] = f"Failed to read call_spec of a fused task: {e}"
+        errors.update(self.work_creator.create_works(works))
+        for wu_name, error_msg in errors.items():
+            logger.error(f"Failed to create BOINC work {wu_name}: {error_msg}")
+
+        created = [task['task_id'] for wu_name, wu_tasks in work_units.items() if wu_name not in errors
+                   for task in wu_tasks]
+        failed = {task['task_id']: errors[wu_name] for wu_name, wu_tasks in work_units.items() if wu_name in errors
+                  for task in wu_tasks}
+        if created:
+            database.set_tasks_running(created)
+        if failed:
+            database.set_tasks_failed(failed)
+        self.result_cache.invalidate_many([task['task_id'] for task in tasks])
+        logger.info(f"BOINC work created for {len(created)} of {len(tasks)} pending tasks "
+                    f"in {len(work_units) - len(errors)} work units")
+
+    def _make_work(self, wu_name, wu_tasks):
+        """Arguments of WorkCreator.create_works for the work unit, fused groups get a fused call_spec."""
+        first = wu_tasks[0]
+        redundancy_options = task_service_pb2.RedundancyOptions.FromString(first['redundancy_options'])
+        if first['group_id'] is None:
+            return (wu_name, first['flavor'], first['call_spec'], first['call_spec_digest'],
+                    (first['object_digests'] or '').split(), redundancy_options)
+        call_spec, object_digests = fuse_call_specs([
+            (task['call_spec'] if task['call_spec'] is not None
+             else self.work_creator.blob_store.read(task['call_spec_digest']),
+             (task['object_digests'] or '').split())
+            for task in wu_tasks
+        ])
+        return wu_name, first['flavor'], call_spec, None, object_digests, redundancy_options
@@ -0,0 +1,7 @@
+from .codec import FORMAT_JSON, FORMAT_MSGPACK, FORMATS, encode, encode_chunks, decode, is_binary
+from .compression import is_compressed, decompress
+
+__all__ = [
+    'FORMAT_JSON', 'FORMAT_MSGPACK', 'FORMATS', 'encode', 'encode_chunks', 'decode', 'is_binary',
+    'is_compressed', 'decompress',
+]
@@ -0,0 +1,118 @@
+"""
+Benchmark of the result formats on the gradients returned by a data parallel training task:
+payload size, encode time on the worker and decode time in the validator and the client.
+Then the compression codecs on the gradients and on a JSON result of a parameter sweep: compressed size,
+compress time on the worker and decompress time in the validator and the client.
+
+Run from the daemons directory:
+    python3 -m result_codec.benchmark --repeat 5
+
+The gradients have the parameter shapes of ResNet-18 (11.7M float32 values), they are torch tensors
+if torch is installed and numpy arrays otherwise. Codecs whose library is not installed are skipped.
+"""
+import time
+import argparse
+
+import numpy
+
+from .codec import FORMAT_JSON, FORMAT_MSGPACK, encode, decode
+from .compression import CODECS, available, compress, decompress
+
+COMPRESSION_LEVELS = {'zstd': [1, 3, 9, 19], 'lz4': [0, 9]}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark result formats on ResNet-18 gradients")
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement, the best one is reported')
+    return parser.parse_args()
+
+
+def resnet18_shapes():
+    """Shapes of the trainable parameters of torchvision.models.resnet18, by parameter name."""
+    shapes = {'conv1.weight': (64, 3, 7, 7), 'bn1.weight': (64,), 'bn1.bias': (64,)}
+    in_channels = 64
+    for layer, channels in enumerate([64, 128, 256, 512], start=1):
+        for block in range(2):
+            prefix = f'layer{layer}.{block}'
+            block_in = in_channels if block == 0 else channels
+            shapes[f'{prefix}.conv1.weight'] = (channels, block_in, 3, 3)
+            shapes[f'{prefix}.conv2.weight'] = (channels, channels, 3, 3)
+            for bn in ('bn1', 'bn2'):
+                shapes[f'{prefix}.{bn}.weight'] = (channels,)
+                shapes[f'{prefix}.{bn}.bias'] = (channels,)
+            if block == 0 and block_in != channels:
+                shapes[f'{prefix}.downsample.0.weight'] = (channels, block_in, 1, 1)
+                shapes[f'{prefix}.downsample.1.weight'] = (channels,)
+                shapes[f'{prefix}.downsample.1.bias'] = (channels,)
+        in_channels = channels
+    shapes['fc.weight'] = (1000, 512)
+    shapes['fc.bias'] = (1000,)
+    return shapes
+
+
+def make_returned():
+    rng = numpy.random.default_rng(0)
+    grads = {name: rng.standard_normal(shape, dtype=numpy.float32) for name, shape in resnet18_shapes().items()}
+    try:
+        import torch
+        grads = {name: torch.from_numpy(grad) for name, grad in grads.items()}
+    except ImportError:
+        pass
+    return {'grads': grads, 'loss': 2.3}
+
+
+def make_sweep_result():
+    """Metrics of a hyperparameter sweep, the typical JSON result: 10k records of repeated keys and floats."""
+    rng = numpy.random.default_rng(0)
+    return [
+        {'lr': float(lr), 'batch_size': int(batch_size), 'epoch': epoch,
+         'train_loss': float(rng.random()), 'val_loss': float(rng.random()), 'accuracy': float(rng.random())}
+        for lr in numpy.logspace(-5, -1, 50) for batch_size in (32, 64, 128, 256) for epoch in range(50)
+    ]
+
+
+def best_time(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    args = parse_args()
+    returned = make_returned()
+    values = sum(int(numpy.prod(shape)) for shape in resnet18_shapes().values())
+    print(f"ResNet-18 gradients: {values / 1e6:.1f}M float32 values, {values * 4 / 2**20:.1f} MiB raw")
+
+    print(f"{'format':<10}{'payload MiB':>12}{'encode ms':>12}{'decode ms':>12}{'decode(bytearray) ms':>22}")
+    for result_format in (FORMAT_MSGPACK, FORMAT_JSON):
+        payload = encode(returned, result_format)
+        writable = bytearray(payload)
+        encode_time = best_time(lambda: encode(returned, result_format), args.repeat)
+        decode_time = best_time(lambda: decode(payload), args.repeat)
+        writable_decode_time = best_time(lambda: decode(writable), args.repeat)
+        print(f"{result_format:<10}{len(payload) / 2**20:>12.1f}{encode_time * 1e3:>12.1f}"
+              f"{decode_time * 1e3:>12.2f}{writable_decode_time * 1e3:>22.2f}")
+
+    payloads = {
+        'msgpack gradients': encode(returned, FORMAT_MSGPACK),
+        'json sweep': encode(make_sweep_result(), FORMAT_JSON),
+    }
+    print(f"\n{'payload':<20}{'codec':<10}{'level':>6}{'MiB':>10}{'ratio':>8}{'compress ms':>14}{'decompress ms':>16}")
+    for name, payload in payloads.items():
+        print(f"{name:<20}{'none':<10}{'':>6}{len(payload) / 2**20:>10.2f}{1:>8.2f}{'':>14}{'':>16}")
+        for codec in CODECS:
+            if not available(codec):
+                continue
+            for level in COMPRESSION_LEVELS[codec]:
+                frame = compress(payload, codec, level)
+                compress_time = best_time(lambda: compress(payload, codec, level), args.repeat)
+                decompress_time = best_time(lambda: decompress(frame), args.repeat)
+                print(f"{name:<20}{codec:<10}{level:>6}{len(frame) / 2**20:>10.2f}{len(payload) / len(frame):>8.2f}"
+                      f"{compress_time * 1e3:>14.1f}{decompress_time * 1e3:>16.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""
+Encoding of the objects returned by tasks.
+
+'json' payloads are JSON text. 'msgpack' payloads are binary:
+
+    MAGIC | version (1 byte) | 3 zero bytes | header size (uint64 LE) | msgpack header | buffers
+
+The header is the msgpack of the returned object, in which every numpy array and torch tensor is replaced
+by an ext value [dtype, shape, offset, nbytes] pointing to its contiguous buffer. Buffers are laid out
+after the header at offsets aligned to ALIGNMENT from the start of the payload, so that decoding makes
+arrays and tensors over the payload memory instead of copying it.
+Dicts keep their insertion order in both formats, as the client gets them back.
+"""
+import sys
+import json
+import struct
+
+# python_lib is the source of this module, make sync-shared-modules copies it into raboshka and the server daemons
+FORMAT_JSON = 'json'
+FORMAT_MSGPACK = 'msgpack'
+FORMATS = (FORMAT_JSON, FORMAT_MSGPACK)
+
+# a JSON text never starts with NUL
+MAGIC = b'\x00STR'
+VERSION = 1
+PREAMBLE = struct.Struct('<4sB3xQ')
+ALIGNMENT = 64
+
+EXT_NDARRAY = 1
+EXT_TENSOR = 2
+
+
+def _to_json(obj):
+    numpy = sys.modules.get('numpy')
+    torch = sys.modules.get('torch')
+    if torch is not None and isinstance(obj, torch.Tensor):
+        return obj.detach().cpu().tolist()
+    if numpy is not None and isinstance(obj, (numpy.ndarray, numpy.generic)):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def encode(returned, result_format=FORMAT_JSON):
+    """Payload bytes of the returned object."""
+    return b''.join(encode_chunks(returned, result_format))
+
+
+def encode_chunks(returned, result_format=FORMAT_JSON):
+    """The payload as a list of bytes-like chunks, buffers of arrays and tensors are not copied."""
+    if result_format == FORMAT_JSON:
+        # arrays and tensors become nested lists
+        return [json.dumps(returned, default=_to_json).encode('utf-8')]
+    if result_format != FORMAT_MSGPACK:
+        raise ValueError(f"Unknown result format: {result_format}")
+
+    import msgpack
+    buffers = []
+    offsets = [0]  # offset of the next buffer relative to the start of the buffers
+
+    def add_buffer(data):
+        offset = offsets[0]
+        buffers.append(data)
+        padding = -(offset + data.nbytes) % ALIGNMENT
+        if padding:
+            buffers.append(bytes(padding))
+        offsets[0] = offset + data.nbytes + padding
+        return offset
+
+    def prepare(obj):
+        if isinstance(obj, dict):
+            return {prepare(key): prepare(value) for key, value in obj.items()}
+        if isinstance(obj, (list, tuple)):
+            return [prepare(item) for item in obj]
+        ext = _array_ext(obj, add_buffer)
+        return obj if ext is None else ext
+
+    header = msgpack.packb(prepare(returned), use_bin_type=True)
+    header_end = PREAMBLE.size + len(header)
+    preamble = PREAMBLE.pack(MAGIC, VERSION, len(header))
+    return [preamble, header, bytes(-header_end % ALIGNMENT)] + buffers
+
+
+def _array_ext(obj, add_buffer):
+    """ExtType for a numpy array or a torch tensor, None for other objects."""
+    import msgpack
+    # modules are only looked up, a returned tensor means the task already imported torch
+    numpy = sys.modules.get('numpy')
+    torch = sys.modules.get('torch')
+    if torch is not None and isinstance(obj, torch.Tensor):
+        tensor = obj.detach().cpu().contiguous()
+        data = memoryview(tensor.reshape(-1).view(torch.uint8).numpy())
+        meta = [str(tensor.dtype).removeprefix('torch.'), list(tensor.shape), add_buffer(data), data.nbytes]
+        return msgpack.ExtType(EXT_TENSOR, msgpack.packb(meta))
+    if numpy is not None and isinstance(obj, numpy.generic):
+        return obj.item()
+    if numpy is not None and isinstance(obj, numpy.ndarray):
+        array = obj if obj.flags.c_contiguous else numpy.ascontiguousarray(obj)
+        if array.dtype.hasobject:
+            raise TypeError("numpy arrays of Python objects can not be encoded")
+        data = memoryview(array.reshape(-1).view(numpy.uint8))
+        meta = [array.dtype.str, list(array.shape), add_buffer(data), data.nbytes]
+        return msgpack.ExtType(EXT_NDARRAY, msgpack.packb(meta))
+    return None
+
+
+def is_binary(payload):
+    """Whether the payload is in the binary format, json payloads may also be given as text."""
+    return not isinstance(payload, str) and bytes(payload[:len(MAGIC)]) == MAGIC
+
+
+def decode(payload):
+    """
+    The returned object from its payload of either format.
+    Arrays and tensors are views of the payload memory: read-only numpy arrays over read-only payloads
+    (e.g. bytes), writable ones over writable payloads (e.g. bytearray). Tensors are decoded as numpy arrays
+    where torch is not installed, and are copied if the payload is read-only, torch has no read-only tensors.
+    """
+    if not is_binary(payload):
+        if isinstance(payload, memoryview):
+            payload = payload.tobytes()
+        return json.loads(payload)
+
+    import msgpack
+    view = memoryview(payload).cast('B')
+    magic, version, header_size = PREAMBLE.unpack_from(view)
+    if version != VERSION:
+        raise ValueError(f"Unsupported result payload version {version}")
+    header_end = PREAMBLE.size + header_size
+    buffers_start = header_end + (-header_end % ALIGNMENT)
+
+    def ext_hook(code, data):
+        if code not in (EXT_NDARRAY, EXT_TENSOR):
+            return msgpack.ExtType(code, data)
+        dtype, shape, offset, nbytes = msgpack.unpackb(data)
+        begin = buffers_start + offset
+        if begin + nbytes > len(view):
+            raise ValueError("Array buffer is out of the result payload")
+        return _decode_array(code, dtype, shape, view[begin:begin + nbytes])
+
+    return msgpack.unpackb(view[PREAMBLE.size:header_end], ext_hook=ext_hook, raw=False, strict_map_key=False)
+
+
+def _decode_array(code, dtype, shape, data):
+    if code == EXT_TENSOR:
+        try:
+            import torch
+        except ImportError:
+            torch = None
+        if torch is not None:
+            torch_dtype = getattr(torch, dtype)
+            if not data.nbytes:
+                return torch.empty(shape, dtype=torch_dtype)
+            if data.readonly:
+                data = bytearray(data)
+            return torch.frombuffer(data, dtype=torch_dtype).reshape(shape)
+        if dtype not in TORCH_TO_NUMPY_DTYPES:
+            raise TypeError(f"torch.{dtype} tensors can not be decoded without torch")
+        dtype = TORCH_TO_NUMPY_DTYPES[dtype]
+    import numpy
+    return numpy.frombuffer(data, dtype=numpy.dtype(dtype)).reshape(shape)
+
+
+TORCH_TO_NUMPY_DTYPES = {
+    'bool': '|b1', 'uint8': '|u1', 'int8': '|i1', 'int16': '<i2', 'int32': '<i4', 'int64': '<i8',
+    'float16': '<f2', 'float32': '<f4', 'float64': '<f8', 'complex64': '<c8', 'complex128': '<c16',
+}
@@ -0,0 +1,97 @@
+"""
+Compressed frames of call_specs, shared objects and results:
+
+    MAGIC | codec id (1 byte) | 3 zero bytes | uncompressed size (uint64 LE) | compressed data
+
+A payload that does not start with MAGIC is not compressed. The codecs are optional dependencies,
+'zstd' needs zstandard and 'lz4' needs lz4, they are imported only when used.
+"""
+import struct
+
+# python_lib is the source of this module, make sync-shared-modules copies it into raboshka and the server daemons
+MAGIC = b'\x00SCF'
+HEADER = struct.Struct('<4sB3xQ')
+CODEC_IDS = {'zstd': 1, 'lz4': 2}
+CODECS = tuple(CODEC_IDS)
+DEFAULT_LEVELS = {'zstd': 3, 'lz4': 0}
+
+
+def is_compressed(payload):
+    return not isinstance(payload, str) and bytes(payload[:len(MAGIC)]) == MAGIC
+
+
+def available(codec):
+    """Whether the library of the codec is installed."""
+    try:
+        _import(codec)
+    except ImportError:
+        return False
+    return True
+
+
+def compress_chunks(chunks, codec, level=None):
+    """The frame of the concatenated bytes-like chunks as a list of chunks."""
+    if codec not in CODEC_IDS:
+        raise ValueError(f"Unknown compression codec: {codec}")
+    if level is None:
+        level = DEFAULT_LEVELS[codec]
+    module = _import(codec)
+    size = sum(memoryview(chunk).nbytes for chunk in chunks)
+    frame = [HEADER.pack(MAGIC, CODEC_IDS[codec], size)]
+    if codec == 'zstd':
+        compressor = module.ZstdCompressor(level=level).compressobj(size=size)
+        frame.extend(compressor.compress(chunk) for chunk in chunks)
+        frame.append(compressor.flush())
+    else:
+        compressor = module.LZ4FrameCompressor(compression_level=level)
+        frame.append(compressor.begin(source_size=size))
+        frame.extend(compressor.compress(chunk) for chunk in chunks)
+        frame.append(compressor.flush())
+    return frame
+
+
+def compress(data, codec, level=None):
+    return b''.join(compress_chunks([data], codec, level))
+
+
+def decompress(frame):
+    """
+    The payload of a frame as a bytearray, writable so that arrays decoded from it share its memory.
+    Payloads that are not compressed are returned as they are, corrupt frames raise ValueError.
+    """
+    if not is_compressed(frame):
+        return frame
+    view = memoryview(frame).cast('B')
+    _, codec_id, size = HEADER.unpack_from(view)
+    codec = next((name for name, known_id in CODEC_IDS.items() if known_id == codec_id), None)
+    if codec is None:
+        raise ValueError(f"Unknown compression codec id {codec_id}")
+    module = _import(codec)
+    data = view[HEADER.size:]
+    try:
+        if codec == 'zstd':
+            payload = bytearray(size)
+            with module.ZstdDecompressor().stream_reader(data) as reader:
+                received = 0
+                while received < size:
+                    n = reader.readinto(memoryview(payload)[received:])
+                    if not n:
+                        break
+                    received += n
+        else:
+            payload = module.decompress(data, return_bytearray=True)
+            received = len(payload)
+    except (RuntimeError, getattr(module, 'ZstdError', RuntimeError)) as e:
+        # errors of corrupt frames are raised as ValueError like those of the other payload formats
+        raise ValueError(f"Corrupt {codec} frame: {e}") from e
+    if received != size:
+        raise ValueError(f"Compressed payload holds {received} bytes instead of {size}")
+    return payload
+
+
+def _import(codec):
+    if codec == 'zstd':
+        import zstandard
+        return zstandard
+    import lz4.frame
+    return lz4.frame
@@ -0,0 +1,4 @@
+ALTER TABLE task_data
+  ADD COLUMN flavor           VARCHAR(64)   DEFAULT NULL     COMMENT 'Hash of dependencies installed on raboshka' AFTER task_id,
+  ADD COLUMN redundancy_options BLOB        DEFAULT NULL     COMMENT 'Serialized task_service_pb2.RedundancyOptions' AFTER compare_valid_func,
+  ADD INDEX idx_task_status_created_at (task_status, created_at);
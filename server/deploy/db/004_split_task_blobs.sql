@@ -0,0 +1,20 @@
+-- Large payloads live apart from task_data, so that status lookups and updates touch only small rows
+CREATE TABLE task_blob (
+  task_id                     VARCHAR(32)   NOT NULL         COMMENT 'task_data.task_id',
+  call_spec                   LONGBLOB      NOT NULL         COMMENT 'Serialized python function and arguments',
+  init_valid_func             LONGBLOB      NOT NULL         COMMENT 'Serialized initial validation function',
+  compare_valid_func          LONGBLOB      NOT NULL         COMMENT 'Serialized comparative validation function',
+  returned                    LONGBLOB      DEFAULT NULL     COMMENT 'Serialized returned object, fetched only for FINISHED tasks',
+  PRIMARY KEY (task_id)
+) COMMENT = 'Task payloads for gRPC task service';
+
+INSERT INTO task_blob (task_id, call_spec, init_valid_func, compare_valid_func, returned)
+SELECT task_id, call_spec, init_valid_func, compare_valid_func, returned
+FROM task_data;
+
+ALTER TABLE task_data
+  DROP COLUMN call_spec,
+  DROP COLUMN init_valid_func,
+  DROP COLUMN compare_valid_func,
+  DROP COLUMN returned,
+  ADD INDEX idx_created_at (created_at);
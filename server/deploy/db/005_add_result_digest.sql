@@ -0,0 +1,4 @@
+-- Results are kept in the content-addressed blob store, task_data holds only their digests.
+-- task_blob.returned remains for the results stored before this migration
+ALTER TABLE task_data
+  ADD COLUMN result_digest    CHAR(64)      DEFAULT NULL     COMMENT 'sha256 of the result file in the blob store' AFTER result_status;
@@ -0,0 +1,8 @@
+-- call_spec may be uploaded to the blob store with UploadBlob and referenced by its digest,
+-- results larger than the inline limit are fetched with FetchResult, so their size is kept next to the digest
+ALTER TABLE task_blob
+  MODIFY COLUMN call_spec     LONGBLOB      DEFAULT NULL     COMMENT 'Serialized python function and arguments, NULL if call_spec_digest is set',
+  ADD COLUMN call_spec_digest CHAR(64)      DEFAULT NULL     COMMENT 'sha256 of call_spec in the blob store' AFTER call_spec;
+
+ALTER TABLE task_data
+  ADD COLUMN result_size      BIGINT        DEFAULT NULL     COMMENT 'Size of the result file in the blob store' AFTER result_digest;
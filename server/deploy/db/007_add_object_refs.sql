@@ -0,0 +1,3 @@
+-- Objects uploaded once (Connection.put) and referenced by many tasks are staged as shared BOINC input files
+ALTER TABLE task_blob
+  ADD COLUMN object_digests   TEXT          DEFAULT NULL     COMMENT 'Space separated sha256 of objects referenced in call_spec, the i-th is the ref_<i> input' AFTER call_spec_digest;
@@ -0,0 +1,6 @@
+-- Tasks of a fused group run in one work unit named by group_id, each task keeps its own row and result
+ALTER TABLE task_data
+  ADD COLUMN group_id         VARCHAR(32)   DEFAULT NULL     COMMENT 'Work unit name of the fused group, NULL if the task has its own work unit' AFTER flavor,
+  ADD COLUMN group_index      INT           DEFAULT NULL     COMMENT 'Position of the task in its fused group' AFTER group_id,
+  ADD COLUMN runtime          DOUBLE        DEFAULT NULL     COMMENT 'Seconds the function ran on the worker, known for fused tasks' AFTER result_size,
+  ADD INDEX idx_group_id_group_index (group_id, group_index);
@@ -0,0 +1,3 @@
+-- Time spent in user validation functions, which run sandboxed with a timeout
+ALTER TABLE task_data
+  ADD COLUMN validation_time  DOUBLE        DEFAULT NULL     COMMENT 'Seconds spent in the validation functions of the task' AFTER runtime;
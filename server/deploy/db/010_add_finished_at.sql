@@ -0,0 +1,3 @@
+-- When the assimilator finished the task, finished_at - created_at is the end-to-end latency of the task
+ALTER TABLE task_data
+  ADD COLUMN finished_at      DATETIME(3)   DEFAULT NULL     COMMENT 'When the task was set to FINISHED by the assimilator' AFTER created_at;
@@ -0,0 +1,11 @@
+-- Outbox of finished tasks, written by the assimilator in the transaction that finishes the tasks
+-- and consumed incrementally by id by the work generator
+DROP TABLE IF EXISTS task_event;
+
+CREATE TABLE task_event (
+  id                          BIGINT        NOT NULL AUTO_INCREMENT COMMENT 'Monotonically increasing, consumers remember the last one seen',
+  task_id                     VARCHAR(32)   NOT NULL         COMMENT 'The task set to FINISHED',
+  created_at                  DATETIME(3)   NOT NULL DEFAULT CURRENT_TIMESTAMP(3),
+  PRIMARY KEY (id),
+  INDEX idx_created_at (created_at)
+) COMMENT = 'Task finished events for the task service';
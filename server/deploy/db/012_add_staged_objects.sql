@@ -0,0 +1,10 @@
+-- Uploaded objects staged as shared BOINC input files (obj_<digest>), BOINC never deletes them (<no_delete/>),
+-- the work generator unstages them once no unfinished task references them
+DROP TABLE IF EXISTS staged_object;
+
+CREATE TABLE staged_object (
+  digest                      VARCHAR(64)   NOT NULL         COMMENT 'sha256 of the object, the digest in task_blob.object_digests',
+  used_at                     DATETIME(3)   NOT NULL DEFAULT CURRENT_TIMESTAMP(3) COMMENT 'Last time work units referencing it were created',
+  PRIMARY KEY (digest),
+  INDEX idx_used_at (used_at)
+) COMMENT = 'Object files in the download directory of the project';
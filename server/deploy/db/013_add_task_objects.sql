@@ -0,0 +1,21 @@
+-- Objects referenced by unfinished tasks, one row per (task, object), so that the work generator finds
+-- unused staged objects by an index lookup instead of scanning task_blob.object_digests of the whole queue.
+-- Rows are inserted with the task and deleted when the task is set to FINISHED
+DROP TABLE IF EXISTS task_object;
+
+CREATE TABLE task_object (
+  task_id                     VARCHAR(32)   NOT NULL         COMMENT 'task_data.task_id of a PENDING or RUNNING task',
+  digest                      VARCHAR(64)   NOT NULL         COMMENT 'sha256 of an object in task_blob.object_digests of the task',
+  PRIMARY KEY (task_id, digest),
+  INDEX idx_digest (digest)
+) COMMENT = 'Objects referenced by unfinished tasks';
+
+INSERT IGNORE INTO task_object (task_id, digest)
+SELECT task_blob.task_id, objects.digest
+FROM task_blob
+  JOIN task_data ON task_data.task_id = task_blob.task_id
+  JOIN JSON_TABLE(
+    CONCAT('["', REPLACE(task_blob.object_digests, ' ', '","'), '"]'),
+    '$[*]' COLUMNS (digest VARCHAR(64) PATH '$')
+  ) AS objects
+WHERE task_data.task_status IN (0, 1) AND task_blob.object_digests IS NOT NULL;
@@ -0,0 +1,13 @@
+-- call_spec and result blobs of finished tasks are deleted from the blob store BLOB_RETENTION seconds after
+-- the task finished, blobs_released_at marks the tasks whose blobs were released. The digest indexes serve
+-- the check that no other task still references a blob before it is deleted
+ALTER TABLE task_data
+  ADD COLUMN blobs_released_at DATETIME(3) DEFAULT NULL     COMMENT 'When the blobs of the finished task were released from the blob store' AFTER finished_at,
+  ADD INDEX idx_result_digest (result_digest),
+  ADD INDEX idx_task_status_blobs_released_at_finished_at (task_status, blobs_released_at, finished_at);
+
+ALTER TABLE task_blob
+  ADD INDEX idx_call_spec_digest (call_spec_digest);
+
+-- tasks failed by the work generator before it recorded finished_at
+UPDATE task_data SET finished_at = updated_at WHERE task_status = 2 AND finished_at IS NULL;
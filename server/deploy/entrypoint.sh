@@ -30,9 +30,6 @@ if [ ! -d "$PROJECT_DIR" ]; then
     --no_query \
     "$PROJECT_NAME"
   
-  cp "$PROJECT_DIR"/bin/script_validator "$PROJECT_DIR"/bin/script_validator_2
-  cp "$PROJECT_DIR"/bin/script_assimilator "$PROJECT_DIR"/bin/script_assimilator_2
-
   echo "[Project] Project created!"
 
 
@@ -82,12 +79,14 @@ EOF
     raboshka_assimilator
     raboshka_validator_init
     raboshka_validator_compare
+    raboshka_validator_daemon
+    raboshka_assimilator_daemon
   )
   for name in "${LINKS[@]}"; do
-    if [[ $name == raboshka_validator_* ]]; then
-      module="raboshka_validator"
-      # extract “init” or “compare” from the link name
-      args="--${name#raboshka_validator_}"
+    if [[ $name == raboshka_validator_* || $name == raboshka_assimilator_* ]]; then
+      module="${name%_*}"
+      # extract “init”, “compare” or “daemon” from the link name
+      args="--${name##*_}"
     else
       module="$name"
       args=""
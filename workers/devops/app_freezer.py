@@ -4,22 +4,59 @@ import hashlib
 import logging
 import os
 import re
+import platform
 import subprocess
 import sys
 import shutil
-import venv
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import string
 import yaml
 
 logger = logging.getLogger(__name__)
 
+# wrappers in supplied_wrappers by BOINC platform
+WRAPPERS = {
+    'x86_64-pc-linux-gnu': 'wrapper_26014_x86_64-pc-linux-gnu',
+    'i686-pc-linux-gnu': 'wrapper_26014_i686-pc-linux-gnu',
+    'aarch64-unknown-linux-gnu': 'wrapper_26018_linux_arm64',
+    'x86_64-apple-darwin': 'wrapper_26014_x86_64-apple-darwin',
+    'i686-apple-darwin': 'wrapper_26014_i686-apple-darwin',
+    'windows_x86_64': 'wrapper_26016_windows_x86_64.exe',
+    'windows_intelx86': 'wrapper_26016_windows_intelx86.exe',
+}
+
+# platforms with wheels in the PyTorch CPU index, requirements pinned to a +cpu local version
+# (e.g. torch==2.7.0+cpu) do not resolve on the others: macOS wheels have no local version, 32-bit ones do not exist
+CPU_INDEX_PLATFORMS = {'x86_64-pc-linux-gnu', 'aarch64-unknown-linux-gnu', 'windows_x86_64'}
+
+JOB_XML = """<job_desc>
+    <task>
+        <application>{app_name}</application>
+        <command_line>call_spec_file result_file</command_line>
+    </task>
+</job_desc>
+"""
+
 def parse_args():
-    parser = argparse.ArgumentParser(description='Freezes an executable file from raboshka using PyInstaller')
+    parser = argparse.ArgumentParser(description='Freezes executable files from raboshka using PyInstaller')
     parser.add_argument('--app-name', default='raboshka', help='App name')
-    parser.add_argument('--version', default='1.0', help='App version for BOINC')
-    parser.add_argument('--platform', default='x86_64-pc-linux-gnu', help='BOINC platform identifier')
+    parser.add_argument('--version', nargs='+', default=['1.0'], help='App versions for BOINC')
+    parser.add_argument('--platform', nargs='+', default=['x86_64-pc-linux-gnu'], choices=sorted(WRAPPERS),
+                        help='BOINC platform identifiers, every version is built for every platform')
+    parser.add_argument('--builder', action='append', default=[], metavar='PLATFORM=PYTHON',
+                        help='Python interpreter of the platform to build it with, PyInstaller does not cross-compile. '
+                             'It must run on this host, natively or emulated through binfmt (e.g. an i686 or '
+                             'an aarch64 Python on a Linux host), as the venv it creates is used by host paths, '
+                             'so only platforms of the host OS can be built. '
+                             'The interpreter running app_freezer builds the host platform')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(), help='Builds running in parallel')
+    parser.add_argument('--cache-dir', default=str(Path(__file__).resolve().parent / 'cache'),
+                        help='Directory of the venvs (by flavor and platform) and of the pip wheel cache')
     parser.add_argument('--pyinstaller-version', default='==6.13.0', help='PyInstaller version in the format (>=/==/<=)a.b.c')
+    parser.add_argument('--mode', choices=['onefile', 'onedir'], default='onefile',
+                        help='onefile: a single executable, unpacked into a temporary directory on every run; '
+                             'onedir: an archive of the bundle and a launcher extracting it once per host')
     return parser.parse_args()
 
 
@@ -50,19 +87,190 @@ def get_dependencies_hash(dependencies_path):
         blob = f.read()
     return  hashlib.md5(blob).hexdigest()
 
-def create_venv(venv_dir):
-    logger.info("Creating virtual environment...")
-    venv.create(venv_dir, with_pip=True)
 
-    if os.name == 'nt':  # Windows
-        python_exe = venv_dir / "Scripts" / "python.exe"
-        pip_exe = venv_dir / "Scripts" / "pip.exe"
-    else:  # Unix/Linux/Mac
-        python_exe = venv_dir / "bin" / "python"
-        pip_exe = venv_dir / "bin" / "pip"
-    
-    logger.info(f"venv created at {venv_dir}\n")
-    return python_exe, pip_exe
+def host_platform():
+    """BOINC platform of the interpreter running app_freezer, None if it is not in WRAPPERS."""
+    machine = platform.machine().lower()
+    if sys.platform.startswith('linux'):
+        return {'x86_64': 'x86_64-pc-linux-gnu', 'aarch64': 'aarch64-unknown-linux-gnu'}.get(machine)
+    if sys.platform == 'darwin':
+        return {'x86_64': 'x86_64-apple-darwin'}.get(machine)
+    if sys.platform == 'win32':
+        return {'amd64': 'windows_x86_64', 'x86': 'windows_intelx86'}.get(machine)
+    return None
+
+
+def platform_os(boinc_platform):
+    """sys.platform of the OS of the BOINC platform."""
+    if boinc_platform.startswith('windows'):
+        return 'win32'
+    if boinc_platform.endswith('apple-darwin'):
+        return 'darwin'
+    return 'linux'
+
+
+def parse_builders(builder_args):
+    """
+    Builders by platform. A builder must run on the host, so its platform must be of the host OS:
+    the venv is created by the builder and PyInstaller is then run from the venv by its host path.
+    """
+    builders = {}
+    host = host_platform()
+    if host is not None:
+        builders[host] = sys.executable
+    for builder in builder_args:
+        boinc_platform, sep, python = builder.partition('=')
+        if not sep or boinc_platform not in WRAPPERS:
+            raise ValueError(f"Invalid builder {builder}, expected PLATFORM=PYTHON with a platform of {sorted(WRAPPERS)}")
+        if not sys.platform.startswith(platform_os(boinc_platform)):
+            raise ValueError(f"Invalid builder {builder}, {boinc_platform} can not be built on {sys.platform}, "
+                             f"run app_freezer on a {platform_os(boinc_platform)} host")
+        builders[boinc_platform] = python
+    return builders
+
+
+def unsupported_requirements(requirements, boinc_platform):
+    """Requirements of the flavor that have no wheels for the platform."""
+    if boinc_platform in CPU_INDEX_PLATFORMS:
+        return []
+    return [requirement for requirement in requirements if requirement.endswith('+cpu')]
+
+
+def venv_executables(venv_dir, boinc_platform):
+    if boinc_platform.startswith('windows'):
+        return venv_dir / "Scripts" / "python.exe", venv_dir / "Scripts" / "pip.exe"
+    return venv_dir / "bin" / "python", venv_dir / "bin" / "pip"
+
+
+def prepare_venv(cache_dir, flavor, boinc_platform, base_python, packages, index_args, pyinstaller_version):
+    """
+    The venv of the flavor on the platform with PyInstaller and all requirements, created once and reused
+    by later builds: it is keyed by the dependencies hash (the flavor), the platform and the PyInstaller version.
+    All packages are installed by a single pip install, so the resolver sees all of them at once,
+    wheels are kept in the pip cache of cache_dir for the venvs of the next flavors.
+    """
+    key = re.sub(r'[^A-Za-z0-9_.-]', '', f"{flavor}_{boinc_platform}_pyinstaller{pyinstaller_version}")
+    venv_dir = Path(cache_dir) / "venvs" / key
+    python_exe, pip_exe = venv_executables(venv_dir, boinc_platform)
+    complete_marker = venv_dir / ".complete"
+    if complete_marker.exists():
+        logger.info(f"Reusing venv {venv_dir}")
+        return python_exe
+
+    if venv_dir.exists():
+        shutil.rmtree(venv_dir)
+    logger.info(f"Creating venv {venv_dir} with {base_python}...")
+    subprocess.run([base_python, "-m", "venv", str(venv_dir)], check=True)
+    # pyyaml is for flavor_report.py, raboshka does not import it, so it is not bundled
+    cmd = [str(pip_exe), "install", f"pyinstaller{pyinstaller_version}", "pyyaml"] + packages + index_args
+    logger.info(f"Installing: {' '.join(cmd)}")
+    env = dict(os.environ, PIP_CACHE_DIR=str(Path(cache_dir) / "pip"))
+    subprocess.run(cmd, check=True, env=env)
+    complete_marker.touch()
+    return python_exe
+
+
+def package_onedir(bundle_dir, output_dir, app_name, binary_name):
+    """
+    Pack the onedir bundle into binary_name.tar.gz and write the launcher as binary_name,
+    so the app version keeps the physical name of a onefile build.
+    """
+    logger.info(f"Packing {bundle_dir}...")
+    shutil.make_archive(str(output_dir / binary_name), "gztar", root_dir=bundle_dir)
+
+    template = (Path(__file__).resolve().parent / "onedir_launcher.sh").read_text()
+    launcher_path = output_dir / binary_name
+    launcher_path.write_text(template.replace("@APP_NAME@", app_name).replace("@BINARY_NAME@", binary_name))
+    launcher_path.chmod(0o755)
+
+
+def report_flavor(python_exe, worker_path, report_path):
+    """Write the size, startup and memory report of the built worker, log the budget violations."""
+    logger.info(f"Reporting {worker_path.name}...")
+    cmd = [
+        str(python_exe), str(Path(__file__).resolve().parent / "flavor_report.py"), str(worker_path),
+        "--spec", "dependencies.yaml", "--budget", "budget.yaml", "--output", str(report_path),
+    ]
+    completed = subprocess.run(cmd, capture_output=True, text=True)
+    logger.info(f"Report:\n{completed.stdout}")
+    if completed.returncode != 0:
+        logger.warning(f"{worker_path.name} does not fit its budget:\n{completed.stderr}")
+
+
+def write_version_xml(output_dir, app_name, binary_name, binary_file, boinc_platform, mode):
+    """
+    Put the wrapper of the platform and the job.xml next to the binary and write version.xml of the app version:
+    the wrapper is the main program running the binary (the launcher for onedir builds, shipped with the archive).
+    """
+    wrapper = WRAPPERS[boinc_platform]
+    shutil.copy(Path(__file__).resolve().parent.parent / "supplied_wrappers" / wrapper, output_dir / wrapper)
+    job_xml = f"jobxml_{binary_name}.xml"
+    with open(output_dir / job_xml, "w") as f:
+        f.write(JOB_XML.format(app_name=app_name))
+
+    files = [
+        f"      <physical_name>{wrapper}</physical_name>\n      <main_program/>",
+        f"      <physical_name>{binary_file}</physical_name>\n      <logical_name>{app_name}</logical_name>",
+    ]
+    if mode == "onedir":
+        files.append(f"      <physical_name>{binary_file}.tar.gz</physical_name>")
+    files.append(f"      <physical_name>{job_xml}</physical_name>\n      <logical_name>job.xml</logical_name>")
+    with open(output_dir / "version.xml", "w") as f:
+        f.write("<version>\n" + "".join(f"   <file>\n{file}\n   </file>\n" for file in files) + "</version>\n")
+
+
+def build(args, python_exe, building_root, flavor, version, boinc_platform, modules, pruning):
+    """Freeze the app version of the flavor for the platform, write its version.xml and the report."""
+    binary_name = f"{args.app_name}_{flavor}_{version}_{boinc_platform}"
+    binary_file = binary_name + (".exe" if boinc_platform.startswith("windows") and args.mode == "onefile" else "")
+    apps_dir = Path(__file__).resolve().parent.parent
+    output_dir = apps_dir / "apps" / f"{args.app_name}_{flavor}" / version / boinc_platform
+    os.makedirs(output_dir, exist_ok=True)
+    building_dir = building_root / binary_name
+    if building_dir.exists():
+        shutil.rmtree(building_dir)
+
+    try:
+        shutil.copytree(apps_dir / "src" / args.app_name, building_dir / args.app_name)
+        hidden_imports = []
+        for module in modules:
+            hidden_imports.append(f"--hidden-import={module}")
+        if "cloudpickle" not in modules:
+            hidden_imports.append("--hidden-import=cloudpickle")
+
+        cmd = [
+            str(python_exe),
+            "-m",
+            "PyInstaller",
+            f"--{args.mode}",
+            "--clean",
+            "--name", binary_name,
+            "--paths", str(building_dir / args.app_name),
+            f"--collect-all={args.app_name}",
+            "--distpath", str(output_dir if args.mode == "onefile" else building_dir / "dist"),
+            "--workpath", str(building_dir / "build"),
+            "--specpath", str(building_dir / "spec"),
+        ] + hidden_imports + pruning + [
+            str(building_dir / args.app_name / "__main__.py")
+        ]
+
+        logger.info(f"Running PyInstaller: {' '.join(cmd)}\n")
+        # builds running in parallel must not share the PyInstaller cache
+        env = dict(os.environ, PYINSTALLER_CONFIG_DIR=str(building_dir / "config"))
+        subprocess.run(cmd, check=True, env=env)
+        if args.mode == "onedir":
+            package_onedir(building_dir / "dist" / binary_name, output_dir, args.app_name, binary_name)
+        write_version_xml(output_dir, args.app_name, binary_name, binary_file, boinc_platform, args.mode)
+        logger.info(f"Successfully freezed {binary_name}")
+    finally:
+        if building_dir.exists():
+            shutil.rmtree(building_dir)
+
+    if boinc_platform == host_platform():
+        report_flavor(python_exe, output_dir / binary_file,
+                      apps_dir / "flavor_specs" / "reports" / f"{binary_name}.json")
+    else:
+        logger.info(f"{binary_name} does not run on this host, it is not reported")
 
 
 def main():
@@ -76,73 +284,83 @@ def main():
 
     script_dir = Path(__file__).resolve().parent
     apps_dir = script_dir.parent
-    building_dir = script_dir / "building"
+    building_root = script_dir / "building"
 
-    if building_dir.exists():
-        shutil.rmtree(building_dir)
-    
     try:
-        python_exe, pip_exe = create_venv(building_dir / "venv")
+        builders = parse_builders(args.builder)
+    except ValueError as e:
+        logger.error(e)
+        sys.exit(1)
+    args.platform = list(dict.fromkeys(args.platform))
+    args.version = list(dict.fromkeys(args.version))
+    missing = [boinc_platform for boinc_platform in args.platform if boinc_platform not in builders]
+    if missing:
+        logger.error(f"No builder for {missing}, PyInstaller does not cross-compile, pass --builder PLATFORM=PYTHON")
+        sys.exit(1)
+    if args.mode == "onedir" and any(not p.endswith("linux-gnu") for p in args.platform):
+        logger.error("The onedir launcher is a POSIX shell script using GNU mv, only Linux platforms are supported")
+        sys.exit(1)
 
-        shutil.copytree(apps_dir / "src" / args.app_name, building_dir / args.app_name)
+    with open("dependencies.yaml", "r") as file:
+        data = yaml.safe_load(file)
+    requirements = data.get("requirements", [])
+    modules = data.get("modules", [])
+    # modules to leave out of the bundle, e.g. test suites and tooling pulled in by the hooks of big packages
+    excludes = data.get("excludes", [])
+    # e.g. https://download.pytorch.org/whl/cpu for CPU-only torch wheels (torch==x.y.z+cpu)
+    index_args = [arg for url in data.get("extra_index_urls", []) for arg in ("--extra-index-url", url)]
+    pruning = [f"--exclude-module={module}" for module in excludes]
+    if data.get("strip", False):
+        # strips the symbol tables of the bundled shared libraries
+        pruning.append("--strip")
+
+    unsupported = {
+        boinc_platform: unsupported_requirements(requirements, boinc_platform) for boinc_platform in args.platform
+    }
+    unsupported = {boinc_platform: reqs for boinc_platform, reqs in unsupported.items() if reqs}
+    if unsupported:
+        logger.error(f"The flavor can not be built for {sorted(unsupported)}, "
+                     f"there are no wheels of {sorted(set(sum(unsupported.values(), [])))} for them")
+        sys.exit(1)
 
-        with open("dependencies.yaml", "r") as file:
-            data = yaml.safe_load(file)
-        requirements = data.get("requirements", [])
-        modules = data.get("modules", [])
-    
-        flavor = get_dependencies_hash("dependencies.yaml")
-        binary_name = f"{args.app_name}_{flavor}_{args.version}_{args.platform}"
-        output_dir = apps_dir / "apps" / f"{args.app_name}_{flavor}" / args.version / args.platform
-        os.makedirs(output_dir, exist_ok=True)
-        specifications_dir = apps_dir / "flavor_specs"
-        
+    flavor = get_dependencies_hash("dependencies.yaml")
+
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
         try:
-            logger.info(f"Installing PyInstaller...")
-            subprocess.run([str(pip_exe), "install", f"pyinstaller{args.pyinstaller_version}"], check=True)
-            for package in requirements:
-                logger.info(f"Installing: {package}...")
-                subprocess.run([str(pip_exe), "install", package], check=True)
+            pythons = dict(zip(args.platform, executor.map(
+                lambda boinc_platform: prepare_venv(
+                    args.cache_dir, flavor, boinc_platform, builders[boinc_platform],
+                    requirements, index_args, args.pyinstaller_version,
+                ),
+                args.platform,
+            )))
         except Exception as e:
-            logger.error(f"Error installing pip packages: {e}", file=sys.stderr)
+            logger.error(f"Error installing pip packages: {e}")
             sys.exit(1)
         logger.info("pip packages installed successfully!\n\n")
-        
-        try:
-            hidden_imports = []
-            for module in modules:
-                hidden_imports.append(f"--hidden-import={module}")
-            if "cloudpickle" not in modules:
-                hidden_imports.append("--hidden-import=cloudpickle")
-
-            cmd = [
-                str(python_exe),
-                "-m",
-                "PyInstaller",
-                "--onefile",
-                "--clean",
-                "--name", binary_name,
-                "--paths", str(building_dir / args.app_name),
-                f"--collect-all={args.app_name}",
-                "--distpath", str(output_dir),
-                "--workpath", str(building_dir / "build"),
-                "--specpath", str(building_dir / "spec"),
-            ] + hidden_imports + [
-                str(building_dir / args.app_name / "__main__.py")
-            ]
-            
-            logger.info(f"Running PyInstaller: {' '.join(cmd)}\n")
-            subprocess.run(cmd, check=True)
-            shutil.copy("dependencies.yaml", specifications_dir / f"{args.app_name}_{flavor}.yaml")
-            
-            logger.info(f"Successfully freezed {binary_name}")
-            
-        except Exception as e:
-            logger.error(f"Error building executable: {e}", file=sys.stderr)
-            sys.exit(1)
-    finally:
-        if building_dir.exists():
-            shutil.rmtree(building_dir)
+
+        matrix = [(version, boinc_platform) for version in args.version for boinc_platform in args.platform]
+        futures = {
+            (version, boinc_platform): executor.submit(
+                build, args, pythons[boinc_platform], building_root, flavor, version, boinc_platform, modules, pruning
+            )
+            for version, boinc_platform in matrix
+        }
+        failed = []
+        for (version, boinc_platform), future in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"Error building {version} for {boinc_platform}: {e}")
+                failed.append((version, boinc_platform))
+
+    if building_root.exists() and not any(building_root.iterdir()):
+        building_root.rmdir()
+    if len(failed) < len(matrix):
+        shutil.copy("dependencies.yaml", apps_dir / "flavor_specs" / f"{args.app_name}_{flavor}.yaml")
+        shutil.copy("budget.yaml", apps_dir / "flavor_specs" / f"{args.app_name}_{flavor}.budget.yaml")
+    if failed:
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
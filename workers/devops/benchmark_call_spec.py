@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark of loading an array-heavy call_spec in raboshka: a plain cloudpickle (the format before pickle
+containers) against a pickle container with out-of-band buffers mapped into memory.
+Every load runs in a fresh process, which reports its load time and peak RSS.
+
+Run from the repository root with the stoilo library installed (make install-python-lib-dev):
+    python3 workers/devops/benchmark_call_spec.py --size-mb 1024
+With --touch the loaded arrays are also summed, which reads every page of the mapping.
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+
+import cloudpickle
+import numpy
+
+from stoilo.low_level.object_ref import dumps_call_spec
+
+RABOSHKA_SRC = Path(__file__).resolve().parent.parent / "src"
+
+LOADER = """
+import sys, time, json
+sys.path.insert(0, sys.argv[1])
+from raboshka.main import CallSpecUnpickler
+from raboshka import pickle_container
+start = time.perf_counter()
+call_spec = pickle_container.load_file(
+    sys.argv[2], lambda file, buffers: CallSpecUnpickler(file, '.', buffers=buffers)
+)
+load_time = time.perf_counter() - start
+if sys.argv[3] == 'touch':
+    total = sum(float(array.sum()) for array in call_spec["kwargs"]["arrays"])
+total_time = time.perf_counter() - start
+# VmHWM is reset by exec, unlike ru_maxrss which keeps the peak of the forked benchmark process
+with open('/proc/self/status') as status:
+    max_rss_kb = next(int(line.split()[1]) for line in status if line.startswith('VmHWM:'))
+print(json.dumps({"load_time": load_time, "total_time": total_time, "max_rss_mb": max_rss_kb / 1024}))
+"""
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark loading array-heavy call_specs in raboshka")
+    parser.add_argument("--size-mb", type=int, default=1024, help="Total size of the arrays in kwargs")
+    parser.add_argument("--array-mb", type=int, default=64, help="Size of every array")
+    parser.add_argument("--touch", action="store_true", help="Read every array after loading")
+    return parser.parse_args()
+
+
+def measure(path, touch):
+    completed = subprocess.run(
+        [sys.executable, "-c", LOADER, str(RABOSHKA_SRC), path, "touch" if touch else "load"],
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(completed.stdout)
+
+
+def main():
+    args = parse_args()
+    n_values = args.array_mb * 1024 * 1024 // 8
+    arrays = [numpy.full(n_values, float(index)) for index in range(args.size_mb // args.array_mb)]
+    call_spec = {"kwargs": {"arrays": arrays}, "func": lambda kwargs: len(kwargs["arrays"])}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = {
+            "cloudpickle": os.path.join(tmp_dir, "plain"),
+            "container": os.path.join(tmp_dir, "container"),
+        }
+        with open(paths["cloudpickle"], "wb") as f:
+            cloudpickle.dump(call_spec, f)
+        with open(paths["container"], "wb") as f:
+            f.write(dumps_call_spec(call_spec)[0])
+        del arrays, call_spec
+
+        print(f"{'format':<14}{'file MB':>10}{'load s':>10}{'total s':>10}{'peak RSS MB':>14}")
+        for name, path in paths.items():
+            result = measure(path, args.touch)
+            print(f"{name:<14}{os.path.getsize(path) / 2**20:>10.0f}{result['load_time']:>10.3f}"
+                  f"{result['total_time']:>10.3f}{result['max_rss_mb']:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
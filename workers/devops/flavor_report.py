@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Size, startup and memory report of a frozen raboshka worker, and the check of a flavor against its budget.
+
+The report has the size of the binary (of the archive and the extracted bundle for onedir builds),
+cold and warm start times of an empty task, peak RSS of an empty task and the import time of every module
+listed in the flavor spec, each imported by a task in a fresh worker process.
+The budget is a separate file (budget.yaml), not a part of the flavor spec, as the hash of the spec is the flavor id.
+Every key is optional:
+
+    binary_mb: 400
+    cold_start_s: 20
+    warm_start_s: 3
+    noop_rss_mb: 150
+    import_s:
+      torch: 4
+
+Run with the venv of the flavor (it needs cloudpickle):
+    python3 flavor_report.py apps/raboshka_<flavor>/2.0/x86_64-pc-linux-gnu/raboshka_<flavor>_2.0_x86_64-pc-linux-gnu \
+        --spec dependencies.yaml --budget budget.yaml --output report.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+from pathlib import Path
+
+import cloudpickle
+import yaml
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Report size, startup time and memory of a frozen raboshka worker')
+    parser.add_argument('worker_path', help='Frozen executable, or the launcher of a onedir build')
+    parser.add_argument('--spec', help='Flavor spec with the modules to import')
+    parser.add_argument('--budget', help='Budget of the flavor')
+    parser.add_argument('--startup-runs', type=int, default=3, help='Runs of an empty task after the cold start')
+    parser.add_argument('--output', help='Write the report as json to this file')
+    return parser.parse_args()
+
+
+def load_spec(spec_path):
+    with open(spec_path, 'r') as file:
+        return yaml.safe_load(file) or {}
+
+
+def stage_worker(worker_path, host_dir):
+    """
+    Copy the worker into host_dir, as BOINC puts the files of the app version into the project directory
+    of a fresh host. A onedir launcher is copied with its archive (and without the extracted bundle).
+    """
+    staged_path = Path(host_dir) / worker_path.name
+    shutil.copy2(worker_path, staged_path)
+    archive_path = archive_of(worker_path)
+    if archive_path.exists():
+        shutil.copy2(archive_path, staged_path.with_name(archive_path.name))
+    return staged_path
+
+
+def archive_of(worker_path):
+    return worker_path.with_name(worker_path.name + '.tar.gz')
+
+
+def directory_size(path):
+    return sum(file.stat().st_size for file in Path(path).rglob('*') if file.is_file() and not file.is_symlink())
+
+
+def run_task(worker_path, slot_dir, func, kwargs=None):
+    """Run func(kwargs) in the worker, return (seconds the worker ran, the returned object)."""
+    call_spec_path = Path(slot_dir) / 'call_spec_file'
+    returned_path = Path(slot_dir) / 'result_file'
+    with open(call_spec_path, 'wb') as f:
+        cloudpickle.dump({'func': func, 'kwargs': kwargs or {}}, f)
+    start = time.perf_counter()
+    subprocess.run([str(worker_path), str(call_spec_path), str(returned_path)],
+                   cwd=slot_dir, capture_output=True, check=True)
+    elapsed = time.perf_counter() - start
+    with open(returned_path, 'rb') as f:
+        status = f.read(1)
+        payload = f.read()
+    if status != b'0':
+        raise RuntimeError(f"Task returned status {status!r}: {payload.decode('utf-8', errors='replace')}")
+    return elapsed, json.loads(payload)
+
+
+def make_noop_task():
+    """An empty task returning the peak RSS of the worker process in MB."""
+    def noop(kwargs):
+        with open('/proc/self/status') as status:
+            return next(int(line.split()[1]) for line in status if line.startswith('VmHWM:')) / 1024
+    return noop
+
+
+def make_import_task():
+    """A task importing kwargs['module'] and returning the time it took in seconds."""
+    def import_module(kwargs):
+        import importlib
+        import time
+        start = time.perf_counter()
+        importlib.import_module(kwargs['module'])
+        return time.perf_counter() - start
+    return import_module
+
+
+def build_report(worker_path, modules, startup_runs=3):
+    """
+    The report of the worker as a dict. The page cache is not dropped, so the cold start (the first task
+    on a fresh copy of the app files, which extracts a onedir bundle) does not include reading them from disk.
+    A onefile executable unpacks itself on every run, so its warm start is close to the cold one.
+    """
+    worker_path = Path(worker_path)
+    report = {'worker': worker_path.name, 'binary_mb': worker_path.stat().st_size / 2**20}
+    if archive_of(worker_path).exists():
+        report['binary_mb'] += archive_of(worker_path).stat().st_size / 2**20
+
+    with tempfile.TemporaryDirectory() as host_dir:
+        staged_path = stage_worker(worker_path, host_dir)
+        slot_dir = Path(host_dir) / 'slot'
+        slot_dir.mkdir()
+
+        report['cold_start_s'], _ = run_task(staged_path, slot_dir, make_noop_task())
+        runs = [run_task(staged_path, slot_dir, make_noop_task()) for _ in range(startup_runs)]
+        report['warm_start_s'] = min(elapsed for elapsed, _ in runs)
+        report['noop_rss_mb'] = max(rss_mb for _, rss_mb in runs)
+
+        bundle_dir = staged_path.with_name(staged_path.name + '.d')
+        if bundle_dir.exists():
+            report['bundle_mb'] = directory_size(bundle_dir) / 2**20
+
+        report['import_s'] = {}
+        for module in modules:
+            try:
+                _, report['import_s'][module] = run_task(staged_path, slot_dir, make_import_task(), {'module': module})
+            except (RuntimeError, subprocess.CalledProcessError) as e:
+                report['import_s'][module] = None
+                report.setdefault('errors', []).append(f"import {module}: {e}")
+    return report
+
+
+def check_budget(report, budget):
+    """Descriptions of the budget items the report exceeds, empty if the flavor fits its budget."""
+    violations = list(report.get('errors', []))
+    for key in ('binary_mb', 'cold_start_s', 'warm_start_s', 'noop_rss_mb'):
+        if budget.get(key) is not None and report[key] > budget[key]:
+            violations.append(f"{key} {report[key]:.2f} exceeds the budget of {budget[key]}")
+    for module, limit in (budget.get('import_s') or {}).items():
+        import_s = report['import_s'].get(module)
+        if import_s is not None and import_s > limit:
+            violations.append(f"import_s of {module} {import_s:.2f} exceeds the budget of {limit}")
+    return violations
+
+
+def format_report(report):
+    lines = [f"{report['worker']}:", f"  binary            {report['binary_mb']:10.1f} MB"]
+    if 'bundle_mb' in report:
+        lines.append(f"  extracted bundle  {report['bundle_mb']:10.1f} MB")
+    lines += [
+        f"  cold start        {report['cold_start_s']:10.2f} s",
+        f"  warm start        {report['warm_start_s']:10.2f} s",
+        f"  no-op peak RSS    {report['noop_rss_mb']:10.1f} MB",
+    ]
+    for module, import_s in report['import_s'].items():
+        lines.append(f"  import {module:<10} " + ("    failed" if import_s is None else f"{import_s:10.2f} s"))
+    return '\n'.join(lines)
+
+
+def main():
+    args = parse_args()
+    spec = load_spec(args.spec) if args.spec else {}
+    report = build_report(args.worker_path, spec.get('modules', []), args.startup_runs)
+    print(format_report(report))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    violations = check_budget(report, load_spec(args.budget) if args.budget else {})
+    for violation in violations:
+        print(f"Budget violation: {violation}", file=sys.stderr)
+    return 1 if violations else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
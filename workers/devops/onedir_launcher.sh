@@ -0,0 +1,43 @@
+#!/bin/sh
+# Launcher of a onedir @APP_NAME@ bundle, app_freezer.py --mode onedir fills in the names.
+#
+# The launcher and the @BINARY_NAME@.tar.gz archive are files of the app version, BOINC keeps them
+# in the project directory as long as the app version is used. The first task on the host extracts the archive
+# next to them, later tasks only start the extracted executable and pay no unpacking.
+set -e
+
+here=$(cd "$(dirname "$0")" && pwd)
+bundle="$here/@BINARY_NAME@.d"
+
+if [ ! -x "$bundle/@BINARY_NAME@" ]; then
+    # concurrent tasks extract into their own directories, the first rename wins
+    tmp="$bundle.tmp.$$"
+    # BOINC kills tasks on suspend and exit, a partial extraction must not be left behind
+    trap 'rm -rf "$tmp"' EXIT
+    trap 'exit 143' TERM
+    trap 'exit 130' INT
+    rm -rf "$tmp"
+    mkdir -p "$tmp"
+    tar -xzf "$here/@BINARY_NAME@.tar.gz" -C "$tmp"
+    mv -T "$tmp" "$bundle" 2>/dev/null || rm -rf "$tmp"
+    trap - EXIT TERM INT
+
+    # bundles of app versions deleted by BOINC are not needed anymore, nor extractions
+    # of killed launchers (SIGKILL skips the trap), whose process is gone
+    for old in "$here"/@APP_NAME@_*.d "$here"/@APP_NAME@_*.d.tmp.*; do
+        case "$old" in
+            *.d.tmp.*)
+                if [ -d "$old" ] && ! kill -0 "${old##*.tmp.}" 2>/dev/null; then
+                    rm -rf "$old"
+                fi
+                ;;
+            *)
+                if [ -d "$old" ] && [ ! -e "${old%.d}.tar.gz" ]; then
+                    rm -rf "$old"
+                fi
+                ;;
+        esac
+    done
+fi
+
+exec "$bundle/@BINARY_NAME@" "$@"
@@ -2,6 +2,7 @@
 import argparse
 import os
 import sys
+import json
 import cloudpickle
 import tempfile
 import subprocess
@@ -9,6 +10,8 @@ import logging
 import pprint
 from pathlib import Path
 
+from flavor_report import load_spec, build_report, check_budget, format_report
+
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s %(name)s %(levelname)s: %(message)s",
@@ -17,10 +20,11 @@ logging.basicConfig(
 logger = logging.getLogger("raboshka_tester")
 
 def parse_args():
-    parser = argparse.ArgumentParser(description="Test a compiled raboshka worker")
+    parser = argparse.ArgumentParser(description="Test compiled raboshka workers, one per flavor")
     parser.add_argument(
-        "worker_name",
-        help="Name of the compiled worker executable in bin/raboshka directory"
+        "worker_names",
+        nargs="+",
+        help="Names of the compiled worker executables (or launchers of onedir builds) in bin/raboshka directory"
     )
     parser.add_argument(
         "--test-func",
@@ -28,6 +32,31 @@ def parse_args():
         default="all",
         help="Type of test function to run (default: all)"
     )
+    parser.add_argument(
+        "--startup-runs",
+        type=int,
+        default=3,
+        help="Runs of an empty task after the cold start, the best one is the warm start time (default: 3)"
+    )
+    parser.add_argument(
+        "--max-cold-start",
+        type=float,
+        default=None,
+        help="Fail if the first run of an empty task on a fresh host takes longer, in seconds "
+             "(overrides cold_start_s of the flavor budget)"
+    )
+    parser.add_argument(
+        "--max-warm-start",
+        type=float,
+        default=None,
+        help="Fail if the later runs of an empty task take longer, in seconds "
+             "(overrides warm_start_s of the flavor budget)"
+    )
+    parser.add_argument(
+        "--specs-dir",
+        default=str(Path(__file__).resolve().parent.parent / "flavor_specs"),
+        help="Directory of the flavor specs with the modules and the budget of every flavor"
+    )
     return parser.parse_args()
 
 def get_worker_path(worker_name):
@@ -270,17 +299,16 @@ def run_test(worker_path, call_spec):
         if result.stderr:
             logger.warning(f"Worker stderr: {result.stderr}")
         
-        # Load the returned result
+        # Load the returned result: the status digit and the json of the returned object or the error message
         with open(returned_path, "rb") as f:
-            returned = cloudpickle.load(f)
+            status = f.read(1)
+            payload = f.read()
         
-        if isinstance(returned, Exception):
-            logger.error(f"Worker returned exception: {returned}")
-            if hasattr(returned, 'raboshka_traceback'):
-                logger.error(f"Traceback: {returned.raboshka_traceback}")
+        if status != b"0":
+            logger.error(f"Worker returned status {status!r}: {payload.decode('utf-8', errors='replace')}")
             return False, None
         
-        return True, returned
+        return True, json.loads(payload)
     
     except subprocess.CalledProcessError as e:
         logger.error(f"Worker execution failed with code {e.returncode}")
@@ -301,38 +329,90 @@ def run_test(worker_path, call_spec):
             except Exception as e:
                 logger.warning(f"Error cleaning up {path}: {e}")
 
+def test_worker(worker_path, tests_to_run, args):
+    """Run the test functions and the budget checks, return (all passed, (cold, warm) or None)."""
+    test_functions = {
+        "standard": create_standard_test,
+        "numpy": create_numpy_test,
+        "torch": create_torch_test
+    }
+    
+    all_passed = True
+    
+    for test_name in tests_to_run:
+        logger.info(f"Running {test_name} test...")
+        call_spec = test_functions[test_name]()
+        success, result = run_test(worker_path, call_spec)
+        
+        if success:
+            logger.info(f"{test_name} test PASSED!")
+            logger.info("Result:")
+            pprint.pprint(result)
+        else:
+            logger.error(f"{test_name} test FAILED!")
+            all_passed = False
+    
+    spec, budget = find_flavor_spec(worker_path, args.specs_dir)
+    if args.max_cold_start is not None:
+        budget["cold_start_s"] = args.max_cold_start
+    if args.max_warm_start is not None:
+        budget["warm_start_s"] = args.max_warm_start
+    
+    logger.info("Measuring size, startup time and memory...")
+    try:
+        report = build_report(worker_path, spec.get("modules", []), args.startup_runs)
+    except (RuntimeError, subprocess.CalledProcessError) as e:
+        logger.error(f"Empty task failed: {getattr(e, 'stderr', None) or e}")
+        return False, None
+    logger.info(f"Report:\n{format_report(report)}")
+    for violation in check_budget(report, budget):
+        logger.error(f"Budget violation: {violation}")
+        all_passed = False
+    return all_passed, (report["cold_start_s"], report["warm_start_s"])
+
+
+def find_flavor_spec(worker_path, specs_dir):
+    """
+    (spec, budget) of the flavor of the worker named <app>_<flavor>_<version>_<platform>,
+    each empty if there is none.
+    """
+    app_flavor = "_".join(worker_path.name.split("_")[:2])
+    spec_path = Path(specs_dir) / f"{app_flavor}.yaml"
+    budget_path = Path(specs_dir) / f"{app_flavor}.budget.yaml"
+    if not spec_path.exists():
+        logger.warning(f"No flavor spec {spec_path}, no modules are imported")
+    if not budget_path.exists():
+        logger.warning(f"No flavor budget {budget_path}, the worker has no budget")
+    return (
+        load_spec(spec_path) if spec_path.exists() else {},
+        load_spec(budget_path) if budget_path.exists() else {},
+    )
+
+
 def main():
     args = parse_args()
     
     try:
-        worker_path = get_worker_path(args.worker_name)
-        logger.info(f"Testing worker: {worker_path}")
-        
-        test_functions = {
-            "standard": create_standard_test,
-            "numpy": create_numpy_test,
-            "torch": create_torch_test
-        }
-        
         if args.test_func == "all":
-            tests_to_run = list(test_functions.keys())
+            tests_to_run = ["standard", "numpy", "torch"]
         else:
             tests_to_run = [args.test_func]
         
         all_passed = True
-        
-        for test_name in tests_to_run:
-            logger.info(f"Running {test_name} test...")
-            call_spec = test_functions[test_name]()
-            success, result = run_test(worker_path, call_spec)
-            
-            if success:
-                logger.info(f"{test_name} test PASSED!")
-                logger.info("Result:")
-                pprint.pprint(result)
+        startup_times = {}
+        
+        for worker_name in args.worker_names:
+            worker_path = get_worker_path(worker_name)
+            logger.info(f"Testing worker: {worker_path}")
+            passed, startup_times[worker_path.name] = test_worker(worker_path, tests_to_run, args)
+            all_passed = all_passed and passed
+        
+        logger.info("Startup times:")
+        for name, times in startup_times.items():
+            if times is None:
+                logger.info(f"  {name}: failed")
             else:
-                logger.error(f"{test_name} test FAILED!")
-                all_passed = False
+                logger.info(f"  {name}: cold {times[0]:.2f}s, warm {times[1]:.2f}s")
         
         if all_passed:
             logger.info("All tests PASSED!")
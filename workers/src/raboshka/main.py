@@ -1,10 +1,16 @@
 import argparse
+import os
 import sys
+import time
+import pickle
 import logging
-import cloudpickle
-import json
+import importlib.util
+from functools import cache
 from enum import IntEnum, unique
 
+from raboshka.result_codec import FORMAT_JSON, FORMAT_MSGPACK, FORMATS, encode, encode_chunks
+from raboshka import pickle_container, compression
+
 logger = logging.getLogger(__name__)
 
 # must be the same as ResultStatus in the proto/task_service/task_service.proto
@@ -16,36 +22,181 @@ class ResultStatus(IntEnum):
     SYSTEM_ERROR = 2
 
 
+# must be the same as in python_lib/src/stoilo/low_level/object_ref.py
+OBJECT_REF_PID = 'stoilo.ObjectRef'
+# must be the same as in server/daemons/raboshka_work_generator/fusion.py
+FUSED_CALL_SPECS_KEY = 'fused_call_specs'
+# must be the same as in server/daemons/raboshka_validator/validator.py and raboshka_assimilator/assimilator.py
+FUSED_RESULT_MARKER = 'F'
+# must be the same as in python_lib/src/stoilo/low_level/task.py
+RESULT_FORMAT_KEY = 'result_format'
+RESULT_COMPRESSION_KEY = 'result_compression'
+SOFT_LINK_TAG = b"<soft_link>"
+
+
+def resolve_input_path(path):
+    """
+    Path of the actual input file. Input files without <copy_file/> (e.g. sticky shared objects) are not
+    copied into the slot directory, BOINC puts a <soft_link>target</soft_link> file there instead,
+    with the target relative to the slot directory, see boinc_resolve_filename() in BOINC lib/app_ipc.cpp
+    """
+    with open(path, "rb") as infile:
+        head = infile.read(4096)
+    if not head.startswith(SOFT_LINK_TAG):
+        return path
+    target = head[len(SOFT_LINK_TAG):].split(b"</soft_link>")[0].strip().decode()
+    return os.path.join(os.path.dirname(path), target)
+
+
+class CallSpecUnpickler(pickle.Unpickler):
+    """
+    Replaces every ObjectRef in call_spec with its object, which is loaded from the ref_<index> input file
+    (or the file it soft links to) next to the call_spec file. Every object is loaded once, however many
+    times it is referenced. ref_map maps indices of a fused call_spec to the indices of its work unit.
+    buffers are the out-of-band buffers of a pickle container.
+    """
+    def __init__(self, file, refs_dir, objects=None, ref_map=None, buffers=None):
+        super().__init__(file, buffers=buffers)
+        self.refs_dir = refs_dir
+        self.objects = {} if objects is None else objects
+        self.ref_map = ref_map
+
+    def persistent_load(self, pid):
+        kind, index = pid
+        if kind != OBJECT_REF_PID:
+            raise pickle.UnpicklingError(f"Unsupported persistent id: {pid}")
+        if self.ref_map is not None:
+            index = self.ref_map[index]
+        if index not in self.objects:
+            self.objects[index] = pickle_container.load_file(
+                resolve_input_path(os.path.join(self.refs_dir, f"ref_{index}")),
+                lambda file, buffers: pickle.Unpickler(file, buffers=buffers),
+            )
+        return self.objects[index]
+
+
 def execute(call_spec_path):
+    """
+    Run the call_spec, return (status, list of bytes-like chunks of the serialized result).
+    A fused call_spec runs all its calls, the status is then FUSED_RESULT_MARKER and the result is
+    a list of [status, serialized result, runtime in seconds] for every call, in order. The list is json
+    with serialized results as text, unless some call returns a binary payload, then it is encoded
+    in the binary format with serialized results of SUCCESS as bytes.
+    Chunks of SUCCESS (and of a fused result) are a compressed frame if the call_spec asks for it.
+    """
+    refs_dir = os.path.dirname(os.path.abspath(call_spec_path))
     try:
-        with open(call_spec_path, "rb") as infile:
-            call_spec = cloudpickle.load(infile)
+        call_spec = pickle_container.load_file(
+            call_spec_path, lambda file, buffers: CallSpecUnpickler(file, refs_dir, buffers=buffers)
+        )
     except Exception as e:
         error_message = f"Failed to load call_spec from the file: {e}"
-        return ResultStatus.SYSTEM_ERROR, error_message
-
+        return ResultStatus.SYSTEM_ERROR, [error_message.encode('utf-8')]
+
+    if FUSED_CALL_SPECS_KEY not in call_spec:
+        status, chunks, _ = execute_call(call_spec)
+        return status, chunks
+
+    objects = {}
+    results = []
+    result_compressions = []
+    for fused in call_spec[FUSED_CALL_SPECS_KEY]:
+        try:
+            # unpickled arrays are views of the member call_spec, it is copied to keep them writable
+            member_call_spec = pickle_container.loads(
+                bytearray(fused["call_spec"]),
+                lambda file, buffers: CallSpecUnpickler(file, refs_dir, objects, fused["refs"], buffers)
+            )
+        except Exception as e:
+            error_message = f"Failed to load call_spec from the file: {e}"
+            results.append([ResultStatus.SYSTEM_ERROR, error_message.encode('utf-8'), 0.0, FORMAT_JSON])
+            continue
+        results.append([*execute_call(member_call_spec, fused=True), result_format_of(member_call_spec)])
+        result_compressions.append(result_compression_of(member_call_spec))
+
+    # results of the calls are compressed together, with the codec of the first call asking for one
+    result_compression = next(filter(None, result_compressions), None)
+    if all(result_format == FORMAT_JSON for *_, result_format in results):
+        fused_results = [[status, b''.join(chunks).decode('utf-8'), runtime] for status, chunks, runtime, _ in results]
+        return FUSED_RESULT_MARKER, compress_result(encode_chunks(fused_results, FORMAT_JSON), result_compression)
+    fused_results = [
+        [status, b''.join(chunks) if status == ResultStatus.SUCCESS else b''.join(chunks).decode('utf-8'), runtime]
+        for status, chunks, runtime, _ in results
+    ]
+    return FUSED_RESULT_MARKER, compress_result([encode(fused_results, FORMAT_MSGPACK)], result_compression)
+
+
+def result_format_of(call_spec):
+    """Format the call_spec asks for, json if it is unknown or msgpack is not installed in this flavor."""
+    result_format = call_spec.get(RESULT_FORMAT_KEY, FORMAT_JSON)
+    if result_format not in FORMATS:
+        logger.warning(f"Unknown result format {result_format}, falling back to {FORMAT_JSON}")
+        return FORMAT_JSON
+    if result_format == FORMAT_MSGPACK and not msgpack_installed():
+        logger.warning(f"msgpack is not installed, falling back to {FORMAT_JSON}")
+        return FORMAT_JSON
+    return result_format
+
+
+def result_compression_of(call_spec):
+    """(codec, level) the call_spec asks to compress its result with, None if the result is not compressed."""
+    result_compression = call_spec.get(RESULT_COMPRESSION_KEY)
+    if not result_compression:
+        return None
+    codec, level = result_compression
+    if codec not in compression.CODECS or not compression.available(codec):
+        logger.warning(f"Compression codec {codec} is not available, the result is not compressed")
+        return None
+    return codec, level
+
+
+def compress_result(chunks, result_compression):
+    """Chunks of the frame of the result, or the chunks themselves if result_compression is None."""
+    if result_compression is None:
+        return chunks
+    codec, level = result_compression
+    return compression.compress_chunks(chunks, codec, level)
+
+
+@cache
+def msgpack_installed():
+    return importlib.util.find_spec('msgpack') is not None
+
+
+def execute_call(call_spec, fused=False):
+    """
+    Run one call, return (status, chunks of the serialized result, runtime of the function in seconds).
+    Results of SUCCESS are compressed if the call_spec asks for it, unless the call is fused.
+    """
     kwargs = call_spec["kwargs"]
     func = call_spec["func"]
+    result_format = result_format_of(call_spec)
 
+    start = time.perf_counter()
     try:
         returned = func(kwargs)
     except Exception as e:
         error_message = f"Exception is thrown in user function: {e}"
-        return ResultStatus.USER_ERROR, error_message
+        return ResultStatus.USER_ERROR, [error_message.encode('utf-8')], time.perf_counter() - start
+    runtime = time.perf_counter() - start
 
     try:
-        serialized_returned = json.dumps(returned)
+        # Replicas returning the same value usually write identical bytes, which the validator
+        # accepts by their digest without running compare_valid_func
+        chunks = encode_chunks(returned, result_format)
     except Exception as e:
-        error_message = f"Failed to serialize returned value to json: {e}"
-        return ResultStatus.USER_ERROR, error_message
+        error_message = f"Failed to serialize returned value to {result_format}: {e}"
+        return ResultStatus.USER_ERROR, [error_message.encode('utf-8')], runtime
+    if not fused:
+        chunks = compress_result(chunks, result_compression_of(call_spec))
 
-    return ResultStatus.SUCCESS, serialized_returned
+    return ResultStatus.SUCCESS, chunks, runtime
 
 
-def save_result(result_path, status, serialized_result):
-    with open(result_path, "w") as outfile:
-        outfile.write(str(status))
-        outfile.write(serialized_result)
+def save_result(result_path, status, chunks):
+    with open(result_path, "wb") as outfile:
+        outfile.write(str(status).encode('ascii'))
+        outfile.writelines(chunks)
 
 
 def parse_args():
@@ -73,8 +224,8 @@ def main():
     args = parse_args()
 
     try:
-        status, serialized_result = execute(args.call_spec_path)
-        save_result(args.result_path, status, serialized_result)
+        status, chunks = execute(args.call_spec_path)
+        save_result(args.result_path, status, chunks)
     except Exception as e:
         logger.critical(f"Unexpected raboshka error: {e}")
         sys.exit(1)